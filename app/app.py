@@ -1,5 +1,7 @@
 import os
 import sys
+import threading
+import uuid
 import streamlit as st
 from audiorecorder import audiorecorder
 
@@ -16,47 +18,46 @@ from src.convert import *
 st.set_page_config(page_title="AI Markdown Manager", page_icon="✍🏼", layout="wide")
 st.title("✍🏼 AI Markdown Manager")
 
+@st.cache_resource
+def load_whisper_registry():
+    # Il registro è condiviso da tutte le sessioni e sopravvive ai rerun dello script.
+    # Il warm-up avviene in background, così l'avvio dell'app non attende il caricamento del modello
+    warmup_models = [m.strip() for m in os.getenv("WHISPER_WARMUP_MODELS", "").split(",") if m.strip()]
+    if warmup_models:
+        threading.Thread(target=whisper_registry.warm_up, args=(warmup_models,), daemon=True).start()
+    return whisper_registry
+
+load_whisper_registry()
+
 def get_agent_response(prompt):
     return f"Risposta dell'agente per: '{prompt}'"
 
-def export_chat(history, format_type):
+def chat_to_markdown(history):
     content_markdown = ""
     for msg in history:
         content_markdown += f"**{msg['role'].capitalize()}**: {msg['content']}\n\n"
+    return content_markdown
+
+def export_download_button(label, content_markdown, format_type, key):
+    """
+    Mostra il pulsante di download di un contenuto. Le esportazioni sono memorizzate nella cache
+    condivisa (hash del contenuto, formato), quindi i rerun con contenuto invariato non rigenerano nulla.
+    PDF e DOCX vengono generati solo quando l'utente li richiede con il pulsante "Prepara".
+    """
+    data = export_cache.get(content_markdown, format_type)
+    if data is None and format_type in SLOW_EXPORT_FORMATS:
+        if not st.button(f"Prepara {label.lower()}", key=f"prepare_{key}"):
+            return
+        with st.spinner(f"Generazione del file {format_type}..."):
+            data = export_cache.export(content_markdown, format_type)
+    elif data is None:
+        data = export_cache.export(content_markdown, format_type)
+    if data is None:
+        st.error(f"Errore durante la generazione del file {format_type}.")
+        return
 
-    if format_type == "Markdown":
-        return content_markdown.encode("utf-8")
-
-    elif format_type == "DOCX":
-        return convert_md_to_docx_in_memory(content_markdown)
-
-    elif format_type == "HTML":
-        html_string = convert_md_to_html_in_memory(content_markdown)
-        return html_string.encode("utf-8")
-
-    elif format_type == "PDF":
-        return convert_md_to_pdf_in_memory(content_markdown)
-
-    st.warning(f"Formato '{format_type}' non gestito. Restituisco Markdown codificato.")
-    return content_markdown.encode("utf-8")
-
-def export_file(content_markdown, format_type):
-    
-    if format_type == "Markdown":
-        return content_markdown.encode("utf-8")
-
-    elif format_type == "DOCX":
-        return convert_md_to_docx_in_memory(content_markdown)
-
-    elif format_type == "HTML":
-        html_string = convert_md_to_html_in_memory(content_markdown)
-        return html_string.encode("utf-8")
-
-    elif format_type == "PDF":
-        return convert_md_to_pdf_in_memory(content_markdown)
-
-    st.warning(f"Formato '{format_type}' non gestito. Restituisco Markdown codificato.")
-    return content_markdown.encode("utf-8")
+    if st.download_button(label=f"Esporta {label} come {format_type}", data=data, file_name=f"file_esportato.{format_type.lower()}", key=f"download_{key}"):
+        st.success(f"Esportazione in formato {format_type} completata con successo!")
 
 
 # --- 2. INIZIALIZZAZIONE E LOGICA DI STATO ---
@@ -70,9 +71,14 @@ if "audio_to_process" not in st.session_state:
     st.session_state.audio_to_process = None
 if "user_input" not in st.session_state:
     st.session_state.user_input = ""
+if "pending_prompt" not in st.session_state:
+    st.session_state.pending_prompt = None
     
 if "ai_manager" not in st.session_state:
-    st.session_state.ai_manager = ReportManager()
+    # La sessione è indicata nell'URL (?sessione=...), così da poterla riprendere dopo un riavvio
+    if "sessione" not in st.query_params:
+        st.query_params["sessione"] = uuid.uuid4().hex[:12]
+    st.session_state.ai_manager = ReportManager(session_id=st.query_params["sessione"])
 
 #Logica di conversione audio (va fatta qui)
 if st.session_state.processing_audio:
@@ -80,11 +86,9 @@ if st.session_state.processing_audio:
         # Recupera l'audio salvato
         audio_to_process = st.session_state.audio_to_process
         
-        # Esporta e converti
-        os.makedirs("tmp", exist_ok=True)
-        audio_to_process.export("tmp/audio.wav", format="wav")
-        transcript = convert_audio_to_text("tmp/audio.wav")
-        os.remove("tmp/audio.wav")
+        # Converte i campioni PCM del registratore e li trascrive in memoria, senza file temporanei
+        samples = pcm_to_samples(audio_to_process.raw_data, audio_to_process.sample_width, audio_to_process.channels)
+        transcript = transcribe_samples(samples, audio_to_process.frame_rate)
         
         st.session_state.user_input = transcript
         
@@ -99,6 +103,43 @@ with chat_container:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
 
+    # Esegue il prompt inviato mostrando piano, passi e token man mano che arrivano
+    if st.session_state.pending_prompt:
+        prompt = st.session_state.pending_prompt
+        st.session_state.pending_prompt = None
+
+        with st.chat_message("user"):
+            st.markdown(prompt)
+
+        with st.chat_message("assistant"):
+            status = st.status("L'agente sta pensando...")
+            preview = st.empty()
+            streamed_agent, streamed_text = None, ""
+
+            for event in st.session_state.ai_manager.stream(input=prompt):
+                if event["type"] == "planner":
+                    status.write("Piano: " + ", ".join(step.get("tool_name", "?") for step in event["plan"]))
+                elif event["type"] == "step":
+                    status.write("Eseguito: " + ", ".join(
+                        step.get("tool_name", "?") + (f" (percorso {step['path']})" if step.get("path") else "") for step in event["steps"]
+                    ))
+                elif event["type"] == "token" and event["agent"] != "Planner":
+                    # Anteprima live della risposta (o del documento) dell'agente corrente
+                    if event["agent"] != streamed_agent:
+                        streamed_agent, streamed_text = event["agent"], ""
+                        status.update(label=f"{streamed_agent} sta scrivendo...")
+                    streamed_text += event["content"]
+                    preview.markdown(streamed_text)
+                elif event["type"] == "end":
+                    response = event["answer"]
+
+            status.update(label="Completato", state="complete")
+            preview.markdown("".join(["\n", response]))
+
+        # Aggiungi il messaggio utente e la risposta alla cronologia
+        st.session_state.messages.append({"role": "user", "content": prompt})
+        st.session_state.messages.append({"role": "assistant", "content": "".join(["\n", response])})
+
 # --- 4. FUNZIONE CALLBACK PER PROCESSARE L'INPUT CON IL TASTO INVIO ---
 def process_input():
     # Prende il testo dalla chiave di session_state associata al text_input
@@ -107,17 +148,11 @@ def process_input():
         return
 
 
-    # Ottieni la risposta dell'agente
-    with st.spinner("L'agente sta pensando..."):
-        st.session_state.ai_manager.run(input=prompt)
-        response = st.session_state.ai_manager.get_answer()
-        
-        # Aggiungi il messaggio utente e la risposta alla cronologia
-        st.session_state.messages.append({"role": "user", "content": prompt})
-        st.session_state.messages.append({"role": "assistant", "content": "".join(["\n", response])})
-        
-        # Svuota la casella di testo dopo l'invio
-        st.session_state.user_input = ""
+    # La risposta viene generata e mostrata in streaming nella sezione della chat
+    st.session_state.pending_prompt = prompt
+
+    # Svuota la casella di testo dopo l'invio
+    st.session_state.user_input = ""
     
 
 # --- 5. SEZIONE DI INPUT PERSISTENTE IN BASSO ---
@@ -163,12 +198,15 @@ with input_container:
 
 # --- 6. SIDEBAR PER L'ESPORTAZIONE ---
 with st.sidebar:
+    documents = st.session_state.ai_manager.workspace.describe()
+    if documents:
+        st.header("Documenti aperti")
+        for document in documents:
+            marker = " (attivo)" if document["active"] else ""
+            st.caption(f"{'📄' if document['in_memory'] else '💾'} {document['name']}{marker}")
+
     st.header("Esporta")
     export_format = st.selectbox("Scegli formato", ["Markdown", "HTML", "PDF", "DOCX"])
     
-    if st.download_button(label=f"Esporta chat come {export_format}", data=export_chat(st.session_state.messages,export_format), file_name=f"file_esportato.{export_format.lower()}"):
-        st.success(f"Chat esportata con successo in formato {export_format}!")
-        
-    if st.download_button(label=f"Esporta documento come {export_format}", data=export_file(st.session_state.ai_manager.get_md_document(),export_format), file_name=f"file_esportato.{export_format.lower()}"):
-        st.success(f"Documento esportato con successo in formato {export_format}!")
-    
\ No newline at end of file
+    export_download_button("chat", chat_to_markdown(st.session_state.messages), export_format, "chat")
+    export_download_button("documento", st.session_state.ai_manager.get_md_document(), export_format, "document")
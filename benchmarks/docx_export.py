@@ -0,0 +1,108 @@
+"""
+Benchmark dell'esportazione DOCX: writer nativo (albero Markdown -> python-docx, in memoria)
+contro il percorso precedente Markdown -> HTML -> PDF -> pdf2docx.
+
+Senza argomenti viene usato un documento di esempio con titoli, liste, tabelle e codice,
+ripetuto --repeat volte per simulare un documento lungo.
+
+Esempio:
+    poetry run python benchmarks/docx_export.py --runs 3 --repeat 1 10
+    poetry run python benchmarks/docx_export.py report.md --runs 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.convert import convert_md_to_docx_in_memory, convert_md_to_docx_via_pdf
+
+SAMPLE_DOCUMENT = """# Relazione trimestrale
+
+Questo documento riassume **i risultati** del trimestre e le *attività* previste.
+
+## Obiettivi
+
+- Ridurre i tempi di risposta
+- Migliorare la qualità dei documenti
+    - Revisione dei modelli
+    - Nuovi stili di esportazione
+- Ampliare i test
+
+1. Analisi
+2. Sviluppo
+3. Rilascio
+
+## Risultati
+
+| Indicatore | Valore | Variazione |
+|------------|--------|------------|
+| Utenti     | 1250   | +12%       |
+| Documenti  | 8400   | +30%       |
+
+> Nota: i valori sono provvisori.
+
+## Configurazione
+
+Il parametro `MODIFIER_MODE` seleziona la modalità del modificatore:
+
+```python
+MODIFIER_MODE = os.getenv("MODIFIER_MODE", "patch")
+```
+
+---
+"""
+
+CONVERTERS = {
+    "nativo": convert_md_to_docx_in_memory,
+    "pdf2docx": convert_md_to_docx_via_pdf,
+}
+
+def run_benchmark(markdown_content, runs, repeats):
+    results = []
+    for repeat in repeats:
+        content = "\n".join([markdown_content] * repeat)
+        for name, converter in CONVERTERS.items():
+            timings = []
+            size = 0
+            for _ in range(runs):
+                start = time.perf_counter()
+                data = converter(content)
+                timings.append(time.perf_counter() - start)
+                size = len(data or b"")
+
+            results.append({
+                "converter": name,
+                "repeat": repeat,
+                "markdown_chars": len(content),
+                "median_s": round(statistics.median(timings), 4),
+                "min_s": round(min(timings), 4),
+                "docx_bytes": size
+            })
+            print(f"{name:<9} ripetizioni={repeat:<4} mediana={statistics.median(timings):8.4f}s  "
+                  f"min={min(timings):8.4f}s  dimensione={size} byte")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Confronto tra writer DOCX nativo e conversione tramite PDF.")
+    parser.add_argument("markdown", nargs="?", help="File .md da esportare (default: documento di esempio).")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--repeat", nargs="+", type=int, default=[1, 10])
+    parser.add_argument("--output", default="benchmarks/docx_export.json")
+    args = parser.parse_args()
+
+    if args.markdown:
+        with open(args.markdown, encoding="utf-8") as f:
+            markdown_content = f.read()
+    else:
+        markdown_content = SAMPLE_DOCUMENT
+
+    results = run_benchmark(markdown_content, args.runs, args.repeat)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Risultati salvati in '{args.output}'.")
@@ -0,0 +1,155 @@
+"""
+Modello di chat locale e deterministico che sostituisce Mistral nei benchmark (tramite `set_model`).
+
+Le risposte sono costruite a partire dall'input di ciascun agente (es. il modificatore restituisce
+il documento ricevuto con una riga in più, il planner restituisce il piano previsto per il comando),
+con una latenza iniziale e una velocità di generazione (token al secondo) configurabili.
+Il modello conta chiamate, token in ingresso e in uscita e tempo speso per ogni agente.
+"""
+import os
+import re
+import sys
+import json
+import time
+import threading
+from collections import defaultdict
+from pydantic import PrivateAttr
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk
+from langchain_core.runnables.config import ensure_config
+from langchain_core.outputs import ChatResult, ChatGeneration, ChatGenerationChunk
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+from src.patches import estimate_tokens
+
+EXPLANATION = "Posso creare e aprire documenti, aggiungere, modificare, rinominare ed eliminare sezioni, mostrarle e salvare il file."
+
+def between(text: str, start: str, end: str | None = None) -> str:
+    """
+    Restituisce il testo compreso tra due marcatori dell'input di un agente (vuoto se manca il primo).
+    """
+    if start not in text:
+        return ""
+    text = text.split(start, 1)[1]
+    if end and end in text:
+        text = text.split(end, 1)[0]
+    return text
+
+class FakeChatModel(BaseChatModel):
+    """
+    Modello di chat finto con latenza (`latency_s`, prima del primo token) e velocità
+    di generazione (`tokens_per_s`) configurabili.
+    I piani del planner vengono letti da `plans` (comando -> piano); per i comandi sconosciuti
+    il planner sceglie "explain_capabilities".
+    """
+    model: str = "fake-local"
+    latency_s: float = 0.2
+    tokens_per_s: float = 200.0
+    plans: dict = {}
+
+    _stats: dict = PrivateAttr(default_factory=lambda: defaultdict(lambda: defaultdict(float)))
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-local"
+
+    def bind_tools(self, tools, **kwargs):
+        # Gli agenti non usano tool: il modello non deve fare nulla
+        return self
+
+    # --- Risposte ---
+
+    def agent_name(self, messages, run_manager) -> str:
+        # In streaming LangChain chiama `_stream` senza run_manager: i metadati si leggono dalla configurazione corrente
+        metadata = run_manager.metadata if run_manager is not None else ensure_config().get("metadata", {})
+        if metadata.get("agent_name"):
+            return metadata["agent_name"]
+        # Il planner chiama direttamente model.stream, senza metadati disponibili al modello
+        return "Planner" if "# RICHIESTA REALE" in messages[-1].content else "Sconosciuto"
+
+    def respond(self, agent_name: str, text: str) -> str:
+        if agent_name == "Planner":
+            command = re.findall(r'Richiesta: "(.*)"\nOutput:', text)[-1]
+            plan = self.plans.get(command, [{"tool_name": "explain_capabilities", "args": {"conversation": command}}])
+            return json.dumps(plan, ensure_ascii=False)
+
+        command = between(text, "COMANDO:\n") or between(text, "COMANDO:")
+        if agent_name == "PatchAgent":
+            return json.dumps([{"op": "insert_after", "heading": "", "content": f"Paragrafo aggiunto: {command.strip()}"}], ensure_ascii=False)
+        if agent_name == "ModifierAgent":
+            return between(text, "DOCUMENTO ATTUALE:\n", "\n\nCOMANDO").rstrip() + f"\n\nParagrafo aggiunto: {command.strip()}\n"
+        if agent_name == "SectionModifierAgent":
+            return between(text, "SEZIONE DA MODIFICARE:\n", "\n\nCOMANDO").rstrip() + f"\n\nParagrafo aggiunto: {command.strip()}\n"
+        if agent_name == "IngestionAgent":
+            return json.dumps({"heading": "", "content": between(text, "TESTO:\n").strip()}, ensure_ascii=False)
+        if agent_name == "OrganizerAgent":
+            return "# Testo organizzato\n\n" + between(text, "TESTO:\n").strip()
+        if agent_name == "RetrievalAgent":
+            return between(text, "DOCUMENTO ATTUALE:\n", "\n\nRICHIESTA")[:500]
+        if agent_name == "ExplainerAgent":
+            return EXPLANATION
+        # CleaningAgent e agenti sconosciuti: il testo viene restituito invariato
+        return text
+
+    def record(self, agent_name: str, tokens_in: int, tokens_out: int, elapsed: float):
+        with self._lock:
+            stats = self._stats[agent_name]
+            stats["calls"] += 1
+            stats["tokens_in"] += tokens_in
+            stats["tokens_out"] += tokens_out
+            stats["time_s"] += elapsed
+
+    def stats(self) -> dict:
+        """
+        Restituisce, per ogni agente, chiamate, token in ingresso e in uscita e tempo speso.
+        """
+        with self._lock:
+            return {name: dict(values) for name, values in self._stats.items()}
+
+    def reset_stats(self):
+        with self._lock:
+            self._stats.clear()
+
+    # --- Interfaccia di BaseChatModel ---
+
+    def _prepare(self, messages, run_manager):
+        agent_name = self.agent_name(messages, run_manager)
+        text = "\n".join(str(m.content) for m in messages)
+        return agent_name, estimate_tokens(text), self.respond(agent_name, messages[-1].content)
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        start = time.perf_counter()
+        agent_name, tokens_in, response = self._prepare(messages, run_manager)
+        tokens_out = estimate_tokens(response)
+        time.sleep(self.latency_s + tokens_out / self.tokens_per_s)
+        self.record(agent_name, tokens_in, tokens_out, time.perf_counter() - start)
+
+        message = AIMessage(content=response, usage_metadata={
+            "input_tokens": tokens_in, "output_tokens": tokens_out, "total_tokens": tokens_in + tokens_out
+        })
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        start = time.perf_counter()
+        agent_name, tokens_in, response = self._prepare(messages, run_manager)
+        time.sleep(self.latency_s)
+
+        # Frammenti di circa 4 token, emessi alla velocità di generazione configurata;
+        # l'ultimo frammento riporta i token usati, come fa Mistral in streaming
+        tokens_out = estimate_tokens(response)
+        for i in range(0, len(response), 16):
+            piece = response[i:i + 16]
+            time.sleep(estimate_tokens(piece) / self.tokens_per_s)
+            usage = None
+            if i + 16 >= len(response):
+                usage = {"input_tokens": tokens_in, "output_tokens": tokens_out, "total_tokens": tokens_in + tokens_out}
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager is not None:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+
+        self.record(agent_name, tokens_in, tokens_out, time.perf_counter() - start)
@@ -0,0 +1,127 @@
+"""
+Test di carico dell'API HTTP (src/server.py) con il modello locale finto (benchmarks/fake_model.py).
+
+Il server viene avviato nello stesso processo su una porta libera; più client concorrenti,
+distribuiti su diversi tenant e sessioni, inviano i comandi del corpus del benchmark offline.
+Vengono riportati throughput, latenze (p50, p95, p99) e richieste rifiutate (429/503).
+
+Esempio:
+    poetry run python benchmarks/load_test.py --requests 400 --concurrency 64 --tenants 4 --latency-s 0.2
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import statistics
+from collections import Counter
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Nessun rate limit, nessuna cache e nessuna sessione su disco per il modello locale (vanno impostati prima degli import)
+os.environ.setdefault("MISTRAL_RATE_LIMITS", "fake-local=1000:1000")
+os.environ["AGENT_CACHE_PATH"] = ""
+os.environ["CHECKPOINT_PATH"] = ""
+
+import aiohttp
+from aiohttp import web
+from benchmarks.fake_model import FakeChatModel
+from benchmarks.offline_graph import DEFAULT_CORPUS
+from src.agents import set_model
+from src.server import create_app
+
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+async def client(session, base_url: str, jobs: asyncio.Queue, results: list):
+    while True:
+        try:
+            tenant, session_id, command = jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            async with session.post(f"{base_url}/sessions/{session_id}/run", json={"input": command},
+                                    headers={"X-Tenant-Id": tenant}) as response:
+                await response.read()
+                status = response.status
+        except aiohttp.ClientError as e:
+            status = type(e).__name__
+        results.append((status, time.perf_counter() - start, tenant))
+
+async def run_load_test(requests: int, concurrency: int, tenants: int, sessions_per_tenant: int, seed: int = 0) -> dict:
+    app = create_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    rng = random.Random(seed)
+    jobs = asyncio.Queue()
+    for _ in range(requests):
+        tenant = f"tenant{rng.randrange(tenants)}"
+        session_id = f"sessione{rng.randrange(sessions_per_tenant)}"
+        jobs.put_nowait((tenant, session_id, rng.choice(DEFAULT_CORPUS)["command"]))
+
+    results = []
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=300)) as session:
+        start = time.perf_counter()
+        await asyncio.gather(*(client(session, base_url, jobs, results) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+        async with session.get(f"{base_url}/health") as response:
+            health = await response.json()
+    await runner.cleanup()
+
+    statuses = Counter(status for status, _, _ in results)
+    latencies = [seconds for status, seconds, _ in results if status == 200]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "tenants": tenants,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "statuses": {str(status): count for status, count in statuses.items()},
+        "latency_s": {
+            "mean": round(statistics.mean(latencies), 4) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(max(latencies, default=0.0), 4)
+        },
+        "sessions": health["sessions"]
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Test di carico dell'API HTTP con un modello locale finto.")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=32, help="Client concorrenti.")
+    parser.add_argument("--tenants", type=int, default=4)
+    parser.add_argument("--sessions-per-tenant", type=int, default=8)
+    parser.add_argument("--latency-s", type=float, default=0.2, help="Latenza del modello prima del primo token.")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="Velocità di generazione del modello.")
+    parser.add_argument("--output", help="File JSON in cui salvare i risultati.")
+    args = parser.parse_args()
+
+    plans = {item["command"]: item["plan"] for item in DEFAULT_CORPUS if "plan" in item}
+    set_model(FakeChatModel(latency_s=args.latency_s, tokens_per_s=args.tokens_per_s, plans=plans))
+
+    result = asyncio.run(run_load_test(args.requests, args.concurrency, args.tenants, args.sessions_per_tenant))
+    print(f"{result['requests']} richieste, {result['concurrency']} client, {result['tenants']} tenant: "
+          f"{result['throughput_rps']} richieste/s completate in {result['elapsed_s']}s")
+    print(f"Latenza: media={result['latency_s']['mean']}s  p50={result['latency_s']['p50']}s  "
+          f"p95={result['latency_s']['p95']}s  p99={result['latency_s']['p99']}s")
+    print(f"Esiti: {result['statuses']}")
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2, ensure_ascii=False)
+        print(f"Risultati salvati in '{args.output}'.")
@@ -0,0 +1,189 @@
+"""
+Benchmark offline del grafo planner/executor, senza accesso a Mistral.
+
+Il modello viene sostituito (con `set_model`) da un modello locale deterministico
+(benchmarks/fake_model.py) con latenza e velocità di generazione configurabili.
+Un corpus di comandi viene eseguito su documenti sintetici di dimensioni diverse; per ogni
+comando vengono misurati la latenza di ciascun nodo, il numero di chiamate all'LLM,
+i token in ingresso e in uscita e il picco di memoria (tracemalloc).
+I risultati vengono salvati in JSON, insieme al commit corrente, per il confronto tra versioni.
+
+Esempio:
+    poetry run python benchmarks/offline_graph.py --sections 5 50 200 --latency-s 0.2 --tokens-per-s 200
+    poetry run python benchmarks/offline_graph.py --corpus comandi.json --runs 3
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+import tracemalloc
+from collections import defaultdict
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Nessun rate limit, nessuna cache e nessuna sessione su disco per il modello locale (vanno impostati prima degli import)
+os.environ.setdefault("MISTRAL_RATE_LIMITS", "fake-local=1000:1000")
+os.environ["AGENT_CACHE_PATH"] = ""
+os.environ["CHECKPOINT_PATH"] = ""
+
+from benchmarks.fake_model import FakeChatModel
+from src.agents import set_model
+from src.report_manager import ReportManager
+from src.agent_cache import agent_cache
+from src.intents import plan_cache
+
+# Comandi di esempio: quelli con un piano passano dal planner LLM, gli altri sono riconosciuti localmente
+DEFAULT_CORPUS = [
+    {"command": "elenca le sezioni"},
+    {"command": "mostrami la sezione Sezione 2"},
+    {"command": "rinomina la sezione Sezione 3 in Risultati"},
+    {
+        "command": "aggiungi alla Sezione 1 una frase sui tempi di risposta",
+        "plan": [{"tool_name": "modify_document", "args": {"command": "Aggiungi alla Sezione 1 una frase sui tempi di risposta"}}]
+    },
+    {
+        "command": "correggi la punteggiatura in tutto il documento",
+        "plan": [{"tool_name": "modify_document", "args": {"command": "Correggi la punteggiatura in tutto il documento"}}]
+    },
+    {
+        "command": "che cosa dice il documento sui tempi di risposta?",
+        "plan": [{"tool_name": "retrieve_document", "args": {"query": "che cosa dice il documento sui tempi di risposta?", "mode": "agente"}}]
+    },
+    {
+        "command": "aggiungi questi appunti: il sistema risponde in meno di un secondo e scala bene",
+        "plan": [{"tool_name": "organize_text", "args": {"text_to_add": "il sistema risponde in meno di un secondo e scala bene"}}]
+    },
+    {
+        "command": "mostrami la Sezione 1 e la Sezione 2",
+        "plan": [
+            {"tool_name": "show_section", "args": {"section_title": "Sezione 1"}},
+            {"tool_name": "show_section", "args": {"section_title": "Sezione 2"}}
+        ]
+    },
+    {
+        "command": "ciao, cosa sai fare?",
+        "plan": [{"tool_name": "explain_capabilities", "args": {"conversation": "ciao, cosa sai fare?"}}]
+    },
+]
+
+PARAGRAPH = ("Il sistema elabora le richieste degli utenti e aggiorna il documento in modo incrementale. "
+             "Ogni modifica viene applicata solo alle sezioni interessate, riducendo i tempi di risposta. ") * 3
+
+def make_document(sections: int) -> str:
+    """
+    Documento sintetico con un titolo principale e `sections` sezioni di due paragrafi.
+    """
+    parts = ["# Documento di prova"]
+    for i in range(1, sections + 1):
+        parts.append(f"## Sezione {i}\n\n{PARAGRAPH.strip()}\n\n{PARAGRAPH.strip()}")
+    return "\n\n".join(parts) + "\n"
+
+def current_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_root, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def run_command(model: FakeChatModel, document: str, command: str, warm_cache: bool) -> dict:
+    """
+    Esegue un comando su un ReportManager nuovo e misura nodi, chiamate all'LLM, token e memoria.
+    """
+    if not warm_cache:
+        agent_cache.clear()
+        plan_cache.clear()
+    model.reset_stats()
+
+    manager = ReportManager()
+    manager.current_state["document_content"] = document
+    manager.current_state["input"] = command
+
+    node_s = defaultdict(float)
+    tracemalloc.start()
+    start = time.perf_counter()
+    last = start
+    # Con stream_mode "updates" ogni evento arriva alla fine di un nodo: il tempo dall'evento precedente è la sua durata
+    for update in manager.app.stream(manager.current_state, manager.config, stream_mode="updates"):
+        now = time.perf_counter()
+        for node in update:
+            node_s[node] += now - last
+        last = now
+    total_s = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    agents = model.stats()
+    return {
+        "total_s": total_s,
+        "node_s": dict(node_s),
+        "llm_calls": int(sum(a["calls"] for a in agents.values())),
+        "tokens_in": int(sum(a["tokens_in"] for a in agents.values())),
+        "tokens_out": int(sum(a["tokens_out"] for a in agents.values())),
+        "agents": {name: int(a["calls"]) for name, a in agents.items()},
+        "peak_mb": peak / 2**20
+    }
+
+def run_benchmark(corpus, section_counts, runs, latency_s, tokens_per_s, warm_cache=False):
+    plans = {item["command"]: item["plan"] for item in corpus if "plan" in item}
+    model = FakeChatModel(latency_s=latency_s, tokens_per_s=tokens_per_s, plans=plans)
+    set_model(model)
+
+    results = []
+    for sections in section_counts:
+        document = make_document(sections)
+        for item in corpus:
+            measures = [run_command(model, document, item["command"], warm_cache) for _ in range(runs)]
+            nodes = sorted({node for m in measures for node in m["node_s"]})
+            result = {
+                "sections": sections,
+                "document_chars": len(document),
+                "command": item["command"],
+                "total_s": round(statistics.median(m["total_s"] for m in measures), 4),
+                "node_s": {node: round(statistics.median(m["node_s"].get(node, 0.0) for m in measures), 4) for node in nodes},
+                "llm_calls": measures[-1]["llm_calls"],
+                "tokens_in": measures[-1]["tokens_in"],
+                "tokens_out": measures[-1]["tokens_out"],
+                "agents": measures[-1]["agents"],
+                "peak_mb": round(max(m["peak_mb"] for m in measures), 2)
+            }
+            results.append(result)
+            print(f"sezioni={sections:<4} {item['command'][:45]:<45} totale={result['total_s']:7.3f}s  "
+                  f"llm={result['llm_calls']:<2} token in/out={result['tokens_in']}/{result['tokens_out']}  "
+                  f"picco={result['peak_mb']:.1f}MB")
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark offline del grafo con un modello locale finto.")
+    parser.add_argument("--corpus", help="File JSON con una lista di {\"command\": ..., \"plan\": [...]} (default: corpus di esempio).")
+    parser.add_argument("--sections", nargs="+", type=int, default=[5, 50, 200])
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--latency-s", type=float, default=0.2, help="Latenza del modello prima del primo token.")
+    parser.add_argument("--tokens-per-s", type=float, default=200.0, help="Velocità di generazione del modello.")
+    parser.add_argument("--warm-cache", action="store_true", help="Non svuota le cache di piani e agenti tra i comandi.")
+    parser.add_argument("--output", default="benchmarks/offline_graph.json")
+    args = parser.parse_args()
+
+    corpus = DEFAULT_CORPUS
+    if args.corpus:
+        with open(args.corpus, encoding="utf-8") as f:
+            corpus = json.load(f)
+
+    results = run_benchmark(corpus, args.sections, args.runs, args.latency_s, args.tokens_per_s, args.warm_cache)
+    output = {
+        "commit": current_commit(),
+        "config": {
+            "sections": args.sections,
+            "runs": args.runs,
+            "latency_s": args.latency_s,
+            "tokens_per_s": args.tokens_per_s,
+            "warm_cache": args.warm_cache
+        },
+        "results": results
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(output, f, indent=2, ensure_ascii=False)
+    print(f"Risultati salvati in '{args.output}'.")
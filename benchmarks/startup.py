@@ -0,0 +1,80 @@
+"""
+Benchmark dei tempi di avvio: tempo di import dei moduli dell'applicazione e tempo
+per la prima risposta di un ReportManager appena creato.
+
+Ogni misura viene eseguita in un processo Python nuovo, così da misurare un avvio a freddo.
+La prima risposta usa un comando riconosciuto localmente dal planner ("elenca le sezioni"),
+quindi non richiede la rete né la chiave di Mistral: misura il costo di avvio dell'applicazione,
+non la latenza del modello.
+
+Esempio:
+    poetry run python benchmarks/startup.py --runs 5 --max-import-s 3
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Codice eseguito nel processo figlio: stampa un dizionario JSON con le misure
+CHILD_SCRIPT = """
+import json, os, sys, time
+os.environ["CHECKPOINT_PATH"] = ""  # ogni avvio parte da una sessione nuova
+start = time.perf_counter()
+from src.report_manager import ReportManager
+import src.transcribe
+import src.convert
+import_s = time.perf_counter() - start
+
+start = time.perf_counter()
+manager = ReportManager()
+manager.run("elenca le sezioni")
+manager.get_answer()
+first_response_s = time.perf_counter() - start
+
+print(json.dumps({
+    "import_s": import_s,
+    "first_response_s": first_response_s,
+    "heavy_modules_loaded": sorted(m for m in ("transformers", "torch", "tensorflow", "langchain_mistralai") if m in sys.modules)
+}))
+"""
+
+def measure_once() -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        cwd=project_root,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Tempi di avvio dell'applicazione.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-import-s", type=float, default=None, help="Soglia oltre la quale il benchmark fallisce.")
+    parser.add_argument("--output", default="benchmarks/startup.json")
+    args = parser.parse_args()
+
+    runs = [measure_once() for _ in range(args.runs)]
+    summary = {
+        "runs": args.runs,
+        "import_s_median": statistics.median(r["import_s"] for r in runs),
+        "first_response_s_median": statistics.median(r["first_response_s"] for r in runs),
+        "heavy_modules_loaded": runs[-1]["heavy_modules_loaded"]
+    }
+
+    print(f"Import dei moduli:  {summary['import_s_median']:.3f} s (mediana su {args.runs} avvii)")
+    print(f"Prima risposta:     {summary['first_response_s_median']:.3f} s")
+    print(f"Moduli pesanti caricati all'avvio: {summary['heavy_modules_loaded'] or 'nessuno'}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    print(f"Risultati salvati in '{args.output}'.")
+
+    if args.max_import_s is not None and summary["import_s_median"] > args.max_import_s:
+        print(f"Regressione: import oltre la soglia di {args.max_import_s} s.")
+        sys.exit(1)
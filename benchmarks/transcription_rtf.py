@@ -0,0 +1,78 @@
+"""
+Benchmark del real-time factor (RTF) della trascrizione a blocchi su CPU.
+
+RTF = tempo di trascrizione / durata dell'audio: valori minori di 1 indicano
+una trascrizione più veloce del tempo reale. Il caricamento del modello viene misurato
+a parte (`load_s`): con un solo processo è il warm-up del modello nel processo corrente,
+con più processi l'avvio del pool e il caricamento del modello in ogni processo.
+`rtf` esclude il caricamento, `rtf_cold` lo include (prima trascrizione a freddo).
+
+Esempio:
+    poetry run python benchmarks/transcription_rtf.py registrazione.wav --models base small --workers 1 2
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+os.environ.setdefault("CUDA_VISIBLE_DEVICES", "")  # forza l'esecuzione su CPU
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+import soundfile as sf
+from src.transcribe import transcribe_long_audio, whisper_registry, warm_up_process_pool, shutdown_process_pools
+
+def run_benchmark(audio_filepath, whisper_models, batch_size, workers_list):
+    duration = sf.info(audio_filepath).duration
+    results = []
+
+    for whisper_model in whisper_models:
+        for workers in workers_list:
+            start = time.perf_counter()
+            if workers <= 1:
+                whisper_registry.warm_up([whisper_model])
+            else:
+                warm_up_process_pool(whisper_model, workers)
+            load_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            first_chunk_s = None
+            for _ in transcribe_long_audio(audio_filepath, whisper_model, batch_size=batch_size, workers=workers):
+                if first_chunk_s is None:
+                    first_chunk_s = time.perf_counter() - start
+            elapsed = time.perf_counter() - start
+
+            results.append({
+                "model": whisper_model,
+                "workers": workers,
+                "batch_size": batch_size,
+                "audio_s": round(duration, 2),
+                "elapsed_s": round(elapsed, 2),
+                "first_chunk_s": round(first_chunk_s or 0.0, 2),
+                "load_s": round(load_s, 2),
+                "rtf": round(elapsed / duration, 3),
+                "rtf_cold": round((load_s + elapsed) / duration, 3)
+            })
+            print(f"whisper-{whisper_model:<6} workers={workers:<2} batch={batch_size:<2} caricamento={load_s:6.2f}s "
+                  f"tempo={elapsed:7.2f}s  primo blocco={first_chunk_s or 0.0:6.2f}s  RTF={elapsed / duration:.3f}")
+        whisper_registry.clear()
+        shutdown_process_pools()
+
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Real-time factor della trascrizione Whisper su CPU.")
+    parser.add_argument("audio", help="File .wav da trascrivere (meglio se lungo qualche minuto).")
+    parser.add_argument("--models", nargs="+", default=["base", "small"])
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--workers", nargs="+", type=int, default=[1])
+    parser.add_argument("--output", default="benchmarks/transcription_rtf.json")
+    args = parser.parse_args()
+
+    results = run_benchmark(args.audio, args.models, args.batch_size, args.workers)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"Risultati salvati in '{args.output}'.")
@@ -0,0 +1,145 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict, Counter
+
+def cache_key(agent_name: str, prompt_version: str, model_name: str, content: str) -> str:
+    """
+    Chiave di una chiamata: hash di agente, versione del prompt, modello e input.
+    """
+    payload = json.dumps([agent_name, prompt_version, model_name, content], ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class AgentCache:
+    """
+    Cache a due livelli delle risposte degli agenti, indicizzata sulla chiave della chiamata:
+    - in memoria, LRU con al più `max_entries` risposte;
+    - su disco, in un database SQLite condiviso tra i riavvii, con al più `max_rows` risposte.
+    Le risposte più vecchie di `ttl_s` secondi vengono ignorate e rimosse.
+    I contatori distinguono le risposte servite dalla memoria, dal disco e le chiamate al modello.
+    """
+    def __init__(self, path: str | None = None, max_entries: int | None = None, max_rows: int | None = None, ttl_s: float | None = None):
+        if path is None:
+            path = os.getenv("AGENT_CACHE_PATH", ".cache/agent_cache.sqlite")
+        if max_entries is None:
+            max_entries = int(os.getenv("AGENT_CACHE_SIZE", "512"))
+        if max_rows is None:
+            max_rows = int(os.getenv("AGENT_CACHE_MAX_ROWS", "10000"))
+        if ttl_s is None:
+            ttl_s = float(os.getenv("AGENT_CACHE_TTL_S", str(7 * 24 * 3600)))
+        self.path = path # vuoto per disattivare il livello su disco
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl_s = ttl_s
+        self.counts = Counter()
+        self._memory = OrderedDict() # chiave -> (risposta, istante di creazione)
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def _db(self) -> sqlite3.Connection | None:
+        # Il database viene aperto al primo utilizzo, per non rallentare l'avvio
+        if not self.path:
+            return None
+        if self._connection is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, agent TEXT, response TEXT, created_at REAL, accessed_at REAL)"
+            )
+            self._connection.commit()
+        return self._connection
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_s > 0 and time.time() - created_at > self.ttl_s
+
+    def get(self, key: str) -> str | None:
+        """
+        Restituisce la risposta salvata, cercandola prima in memoria e poi su disco.
+        """
+        with self._lock:
+            if key in self._memory:
+                response, created_at = self._memory[key]
+                if not self._expired(created_at):
+                    self._memory.move_to_end(key)
+                    self.counts["memory_hits"] += 1
+                    return response
+                del self._memory[key]
+
+            db = self._db()
+            if db is not None:
+                row = db.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+                    db.commit()
+                    self._remember(key, row[0], row[1])
+                    self.counts["disk_hits"] += 1
+                    return row[0]
+                if row is not None:
+                    db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                    db.commit()
+
+            self.counts["misses"] += 1
+            return None
+
+    def put(self, key: str, agent_name: str, response: str):
+        """
+        Salva una risposta in memoria e su disco, rimuovendo le voci scadute o in eccesso.
+        """
+        with self._lock:
+            now = time.time()
+            self._remember(key, response, now)
+
+            db = self._db()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, agent, response, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, agent_name, response, now, now)
+            )
+            if self.ttl_s > 0:
+                db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_s,))
+            db.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_rows,)
+            )
+            db.commit()
+
+    def _remember(self, key: str, response: str, created_at: float):
+        self._memory[key] = (response, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Restituisce i contatori della cache e la percentuale di chiamate al modello risparmiate.
+        """
+        with self._lock:
+            hits = self.counts["memory_hits"] + self.counts["disk_hits"]
+            total = hits + self.counts["misses"]
+            return {
+                "memory_hits": self.counts["memory_hits"],
+                "disk_hits": self.counts["disk_hits"],
+                "misses": self.counts["misses"],
+                "hit_rate": hits / total if total else 0.0,
+                "memory_entries": len(self._memory)
+            }
+
+    def clear(self):
+        """
+        Svuota entrambi i livelli della cache e azzera i contatori.
+        """
+        with self._lock:
+            self._memory.clear()
+            self.counts.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+agent_cache = AgentCache()
@@ -1,7 +1,10 @@
 from langgraph.prebuilt import create_react_agent
-from langchain_mistralai import ChatMistralAI
 from dotenv import load_dotenv
 import os
+import hashlib
+import threading
+
+load_dotenv(".env")
 
 def create_modifier_agent(model):
     SYSTEM_PROMPT = """Sei un editor AI avanzato, specializzato nella manipolazione di documenti in formato Markdown. Il tuo compito è applicare una modifica richiesta dall'utente a un documento esistente.
@@ -34,6 +37,58 @@ def create_modifier_agent(model):
     
     return modifier_agent
 
+def create_section_modifier_agent(model):
+    SYSTEM_PROMPT = """Sei un editor AI avanzato, specializzato nella manipolazione di documenti in formato Markdown. Il tuo compito è applicare una modifica richiesta dall'utente a una porzione di un documento esistente.
+    Riceverai tre input: l'"Indice del Documento", la "Sezione da Modificare" e il "Comando Utente".
+
+    **Regola Fondamentale: Devi restituire SEMPRE l'INTERA sezione da modificare aggiornata, e solo quella. Le parti della sezione non interessate dalla modifica devono rimanere INVARIATE e presenti nell'output finale.**
+
+    - L'"Indice del Documento" serve solo come contesto: NON riportarlo nell'output.
+    - Se il comando chiede di aggiungere nuove sezioni prima o dopo la sezione da modificare, includile nell'output nella posizione richiesta.
+    - Se il comando chiede di eliminare l'intera sezione, restituisci una stringa vuota.
+    - Non aggiungere più sezioni di quanto ti sia stato detto di fare.
+
+    L'output deve essere solo ed esclusivamente il testo Markdown della sezione aggiornata. Non includere commenti o spiegazioni.""".replace("    ", "")
+
+    section_modifier_agent = create_react_agent(
+        model = model,
+        prompt = SYSTEM_PROMPT,
+        name = "SectionModifierAgent",
+        tools = []
+    )
+
+    return section_modifier_agent
+
+def create_patch_agent(model):
+    SYSTEM_PROMPT = """Sei un editor AI avanzato, specializzato nella manipolazione di documenti in formato Markdown. Il tuo compito è descrivere la modifica richiesta dall'utente come una lista di operazioni da applicare al documento, SENZA riscrivere il documento.
+    Riceverai due input: il "Documento Attuale" e il "Comando Utente".
+
+    Restituisci una lista JSON valida `[ ]` di operazioni. Ogni operazione è un dizionario con la chiave "op" e gli argomenti indicati:
+    - {"op": "replace_section", "heading": "Titolo", "content": "..."}: sostituisce l'intera sezione (titolo e sotto-sezioni compresi) con "content", che deve includere anche la riga del titolo.
+    - {"op": "insert_after", "heading": "Titolo", "content": "..."}: inserisce "content" dopo la sezione indicata. Con "heading" vuoto inserisce in fondo al documento.
+    - {"op": "insert_before", "heading": "Titolo", "content": "..."}: inserisce "content" prima della sezione indicata. Con "heading" vuoto inserisce all'inizio del documento.
+    - {"op": "delete_section", "heading": "Titolo"}: elimina la sezione e le sue sotto-sezioni.
+    - {"op": "replace_text", "old": "...", "new": "..."}: sostituisce un frammento di testo, copiato ESATTAMENTE dal documento e presente una sola volta.
+    - {"op": "delete_text", "old": "..."}: elimina un frammento di testo, copiato ESATTAMENTE dal documento e presente una sola volta.
+    - {"op": "replace_document", "content": "..."}: SOLO per creare un nuovo documento, sostituisce l'intero contenuto.
+
+    **Regole:**
+    1.  Usa le operazioni più piccole possibili: preferisci "replace_text" per modifiche a frasi o paragrafi.
+    2.  Il testo non interessato dalla modifica non deve comparire nell'output.
+    3.  Non aggiungere più sezioni di quanto ti sia stato detto di fare.
+    4.  Se ricevi anche l'"Indice del Documento", il documento attuale è solo una parte del documento: non usare "replace_document".
+
+    L'output deve essere solo ed esclusivamente la lista JSON. Non includere commenti o spiegazioni.""".replace("    ", "")
+
+    patch_agent = create_react_agent(
+        model = model,
+        prompt = SYSTEM_PROMPT,
+        name = "PatchAgent",
+        tools = []
+    )
+
+    return patch_agent
+
 def create_organizer_agent(model):
     SYSTEM_PROMPT = """Sei un assistente AI esperto nella strutturazione di documenti tecnici in formato Markdown. Il tuo compito è organizzare un blocco di testo pulito in un report chiaro e logico.
 
@@ -60,6 +115,28 @@ def create_organizer_agent(model):
     
     return organizer_agent
 
+def create_ingestion_agent(model):
+    SYSTEM_PROMPT = """Sei un assistente AI esperto nella correzione e nella strutturazione di testi tecnici in formato Markdown. Il tuo compito è preparare un nuovo blocco di testo da aggiungere a un documento esistente.
+    Riceverai due input: l'"Indice del Documento" (i titoli delle sezioni esistenti) e il "Testo" da aggiungere.
+
+    Regole di esecuzione:
+    1.  **Correzione:** correggi solo errori di battitura, ortografia, grammatica e punteggiatura. NON alterare il significato, il gergo tecnico, i nomi propri o il codice.
+    2.  **Strutturazione:** se il testo è breve e tratta un solo argomento, restituiscilo come paragrafo senza titoli. Se tratta argomenti distinti, suddividilo in sezioni con titoli descrittivi (`##`).
+    3.  **Posizione:** se il testo riguarda chiaramente una sezione già presente nell'indice, indica il titolo ESATTO di quella sezione; altrimenti lascia il titolo vuoto e il testo verrà aggiunto in fondo al documento. Se l'indice è vuoto, aggiungi un titolo principale (`#`) al testo.
+    4.  NON riportare il resto del documento.
+
+    Restituisci unicamente un dizionario JSON valido, senza commenti o spiegazioni:
+    {"heading": "Titolo della sezione esistente oppure stringa vuota", "content": "testo Markdown corretto e organizzato"}""".replace("    ", "")
+
+    ingestion_agent = create_react_agent(
+        model = model,
+        prompt = SYSTEM_PROMPT,
+        name = "IngestionAgent",
+        tools = []
+    )
+
+    return ingestion_agent
+
 def create_retrieval_agent(model):
     SYSTEM_PROMPT = """Sei un assistente AI specializzato nell'analizzare documenti tecnici in formato Markdown e nel recuperare informazioni specifiche per l'utente.
 
@@ -73,6 +150,8 @@ def create_retrieval_agent(model):
     2.  **Gestione Errori:**
         * Se il documento corrente è vuoto oppure una sezione non esiste, NON INVENTARE NULLA. Rispondi con un messaggio cortese che informa l'utente e, se possibile, elenca le sezioni che sono effettivamente disponibili. Esempio: "Non ho trovato la sezione 'Conclusioni'. Le sezioni disponibili sono: Introduzione, Metodologia."
 
+    3.  **Documenti Parziali:** Se ricevi anche un "Indice del Documento", il "Documento Attuale" contiene solo le sezioni più pertinenti alla richiesta e `[...]` indica il testo omesso. Rispondi usando queste sezioni e l'indice.
+
     L'output deve essere solo la stringa di testo con l'informazione richiesta. Non aggiungere commenti o spiegazioni, a meno che non sia per segnalare un errore.
     """.replace("    ", "")
     
@@ -132,11 +211,59 @@ def create_explainer_agent(model):
     
     return explainer_agent
  
+# Modello e agenti sono creati al primo utilizzo e condivisi da tutto il processo
+_model = None
+_agents = {}
+_lock = threading.RLock()
+
 def get_model():
-    load_dotenv(".env")
-    MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
-    model = ChatMistralAI(temperature=0.7, model_name="mistral-small-latest", api_key = MISTRAL_API_KEY)
-    
-    return model
+    """
+    Restituisce il modello condiviso da planner e agenti, creandolo alla prima chiamata.
+    """
+    global _model
+    with _lock:
+        if _model is None:
+            from langchain_mistralai import ChatMistralAI
+
+            MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY")
+            _model = ChatMistralAI(temperature=0.7, model_name="mistral-small-latest", api_key = MISTRAL_API_KEY)
+
+        return _model
+
+def set_model(model):
+    """
+    Sostituisce il modello condiviso (es. con un modello locale per i benchmark).
+    Gli agenti già creati vengono scartati e ricreati con il nuovo modello al prossimo utilizzo.
+    """
+    global _model
+    with _lock:
+        _model = model
+        _agents.clear()
 
-model = get_model()
\ No newline at end of file
+AGENT_FACTORIES = {
+    "modifier": create_modifier_agent,
+    "section_modifier": create_section_modifier_agent,
+    "patch": create_patch_agent,
+    "organizer": create_organizer_agent,
+    "ingestion": create_ingestion_agent,
+    "retrieval": create_retrieval_agent,
+    "cleaning": create_cleaning_agent,
+    "explainer": create_explainer_agent,
+}
+
+def get_agent(name: str):
+    """
+    Restituisce l'agente indicato (es. "modifier"), creandolo al primo utilizzo.
+    """
+    with _lock:
+        if name not in _agents:
+            _agents[name] = AGENT_FACTORIES[name](model=get_model())
+        return _agents[name]
+
+def prompt_version(name: str) -> str:
+    """
+    Versione del prompt dell'agente indicato: hash delle costanti della sua funzione di creazione
+    (tra cui il prompt di sistema), quindi cambia automaticamente quando il prompt viene modificato.
+    """
+    constants = AGENT_FACTORIES[name].__code__.co_consts
+    return hashlib.sha256(repr(constants).encode("utf-8")).hexdigest()[:12]
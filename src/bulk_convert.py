@@ -0,0 +1,169 @@
+"""
+Conversione in blocco di una cartella di file Markdown (ricorsiva) in HTML, PDF e/o DOCX.
+
+I file vengono convertiti in un pool di processi. Un manifest con l'hash del contenuto di ogni file
+(salvato nella cartella di destinazione) permette di saltare i file non modificati dall'ultima esecuzione.
+Per ogni file viene stampato l'avanzamento con i tempi di conversione; alla fine il throughput complessivo.
+
+Esempio:
+    poetry run python -m src.bulk_convert reports/ export/ --formats html pdf docx --workers 4
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from src.convert import render_export, content_hash
+
+# Estensione del file di destinazione -> formato di esportazione
+FORMATS = {"html": "HTML", "pdf": "PDF", "docx": "DOCX"}
+MANIFEST_NAME = ".convert_manifest.json"
+
+def find_markdown_files(source_dir: str) -> list[str]:
+    """
+    Restituisce i percorsi (relativi a `source_dir`) dei file .md, in ordine alfabetico.
+    """
+    paths = []
+    for root, _, files in os.walk(source_dir):
+        for name in files:
+            if name.lower().endswith(".md"):
+                paths.append(os.path.relpath(os.path.join(root, name), source_dir))
+    return sorted(paths)
+
+def output_path(output_dir: str, relative_path: str, extension: str) -> str:
+    return os.path.join(output_dir, os.path.splitext(relative_path)[0] + f".{extension}")
+
+def load_manifest(output_dir: str) -> dict:
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_manifest(output_dir: str, manifest: dict):
+    # Scrittura atomica: un'interruzione non lascia un manifest a metà
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+def is_up_to_date(manifest: dict, relative_path: str, digest: str, output_dir: str, extension: str) -> bool:
+    """
+    Un'esportazione è aggiornata se il contenuto del file non è cambiato e il file di destinazione esiste ancora.
+    """
+    entry = manifest.get(relative_path, {})
+    return entry.get(extension) == digest and os.path.exists(output_path(output_dir, relative_path, extension))
+
+def convert_file(source_dir: str, output_dir: str, relative_path: str, extensions: list[str]) -> dict:
+    """
+    Converte un file Markdown nei formati indicati. Eseguita nei processi del pool.
+
+    Returns:
+        dict: Percorso del file, byte letti, tempo per formato ed eventuali errori.
+    """
+    with open(os.path.join(source_dir, relative_path), encoding="utf-8") as f:
+        markdown_content = f.read()
+
+    timings = {}
+    errors = {}
+    for extension in extensions:
+        start = time.perf_counter()
+        data = render_export(markdown_content, FORMATS[extension])
+        timings[extension] = time.perf_counter() - start
+        if data is None:
+            errors[extension] = "conversione non riuscita"
+            continue
+        destination = output_path(output_dir, relative_path, extension)
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        with open(destination, "wb") as f:
+            f.write(data)
+
+    return {
+        "path": relative_path,
+        "digest": content_hash(markdown_content),
+        "bytes": len(markdown_content.encode("utf-8")),
+        "timings": timings,
+        "errors": errors
+    }
+
+def bulk_convert(source_dir: str, output_dir: str, extensions: list[str], workers: int = 1, force: bool = False) -> dict:
+    """
+    Converte tutti i file Markdown di `source_dir` nei formati indicati, saltando quelli già aggiornati.
+
+    Returns:
+        dict: Riepilogo con file convertiti, saltati, falliti, tempo totale e throughput.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = {} if force else load_manifest(output_dir)
+
+    # Per ogni file, i soli formati da rigenerare
+    jobs = {}
+    skipped = 0
+    for relative_path in find_markdown_files(source_dir):
+        with open(os.path.join(source_dir, relative_path), "rb") as f:
+            digest = content_hash(f.read().decode("utf-8"))
+        pending = [ext for ext in extensions if not is_up_to_date(manifest, relative_path, digest, output_dir, ext)]
+        if pending:
+            jobs[relative_path] = pending
+        else:
+            skipped += 1
+
+    print(f"{len(jobs)} file da convertire, {skipped} già aggiornati.")
+
+    converted = 0
+    failed = 0
+    total_bytes = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(convert_file, source_dir, output_dir, path, pending): path for path, pending in jobs.items()}
+            for done, future in enumerate(as_completed(futures), start=1):
+                path = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    failed += 1
+                    print(f"[{done}/{len(jobs)}] {path}: errore ({e})")
+                    continue
+
+                entry = manifest.setdefault(path, {})
+                for extension in result["timings"]:
+                    if extension not in result["errors"]:
+                        entry[extension] = result["digest"]
+                timings = "  ".join(f"{ext}={seconds:.2f}s" for ext, seconds in result["timings"].items())
+                if result["errors"]:
+                    failed += 1
+                    print(f"[{done}/{len(jobs)}] {path}: {timings}  errori: {result['errors']}")
+                else:
+                    converted += 1
+                    total_bytes += result["bytes"]
+                    print(f"[{done}/{len(jobs)}] {path}: {timings}")
+    finally:
+        # Il manifest viene salvato anche se la conversione viene interrotta
+        save_manifest(output_dir, manifest)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        "converted": converted,
+        "skipped": skipped,
+        "failed": failed,
+        "elapsed_s": round(elapsed, 2),
+        "files_per_s": round(converted / elapsed, 2) if elapsed else 0.0,
+        "mb_per_s": round(total_bytes / 2**20 / elapsed, 3) if elapsed else 0.0
+    }
+    print(f"Convertiti {converted} file ({failed} falliti, {skipped} saltati) in {elapsed:.2f}s: "
+          f"{summary['files_per_s']} file/s, {summary['mb_per_s']} MB/s.")
+    return summary
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Converte una cartella di file Markdown in HTML, PDF e/o DOCX.")
+    parser.add_argument("source", help="Cartella con i file .md (anche in sottocartelle).")
+    parser.add_argument("output", help="Cartella di destinazione (stessa struttura della sorgente).")
+    parser.add_argument("--formats", nargs="+", choices=sorted(FORMATS), default=["pdf"])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--force", action="store_true", help="Riconverte tutti i file ignorando il manifest.")
+    args = parser.parse_args()
+
+    summary = bulk_convert(args.source, args.output, args.formats, workers=args.workers, force=args.force)
+    sys.exit(1 if summary["failed"] else 0)
@@ -0,0 +1,159 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextvars import copy_context
+from src.sections import *
+from src.patches import estimate_tokens
+from src.metrics import metrics
+
+# Oltre questa dimensione (token stimati) i comandi sull'intero documento vengono elaborati a blocchi
+LARGE_DOCUMENT_TOKENS = int(os.getenv("LARGE_DOCUMENT_TOKENS", "8000"))
+# Dimensione massima di un blocco (token stimati) e numero massimo di blocchi elaborati in parallelo
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "3000"))
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", "4"))
+
+PARAGRAPH_BREAK = re.compile(r"\n[ \t]*\n")
+
+# Trasformazioni che si applicano in modo uniforme a ogni parte del documento (traduzione, stile, revisione):
+# solo queste possono essere eseguite blocco per blocco. Vengono riconosciute dal verbo all'imperativo
+# con cui inizia il comando, non dai nomi che contiene (es. "aggiungi una sezione Traduzioni" non lo è).
+DOCUMENT_WIDE_TRANSFORM = re.compile(r"^\s*(?:per favore,?\s+)?(traduci|riscrivi|correggi|rivedi|rileggi|revisiona|uniforma)\b", re.IGNORECASE)
+# Comandi che aggiungono testo alla fine del documento: basta l'ultimo blocco
+APPEND_COMMAND = re.compile(r"in fondo|alla fine|in coda|come ultim", re.IGNORECASE)
+
+def is_large_document(document: str) -> bool:
+    return estimate_tokens(document) > LARGE_DOCUMENT_TOKENS
+
+def is_document_wide_transform(command: str) -> bool:
+    return DOCUMENT_WIDE_TRANSFORM.match(command) is not None
+
+def split_paragraphs(document: str, start: int, end: int, max_tokens: int) -> list[tuple[int, int]]:
+    """
+    Divide la porzione [start, end) in blocchi di paragrafi consecutivi entro `max_tokens`.
+    Un singolo paragrafo più grande del limite resta un blocco a sé.
+    """
+    breaks = [m.end() for m in PARAGRAPH_BREAK.finditer(document, start, end)]
+    chunks = []
+    chunk_start = start
+    for position in breaks + [end]:
+        if position > chunk_start and estimate_tokens(document[chunk_start:position]) > max_tokens:
+            # Il blocco corrente si chiude all'ultima interruzione di paragrafo che rientra nel limite
+            previous = max((b for b in breaks if chunk_start < b < position), default=None)
+            if previous is not None:
+                chunks.append((chunk_start, previous))
+                chunk_start = previous
+    if chunk_start < end:
+        chunks.append((chunk_start, end))
+    return chunks
+
+def split_into_chunks(document: str, max_tokens: int | None = None) -> list[tuple[int, int]]:
+    """
+    Divide il documento in blocchi contigui di sezioni intere, ciascuno entro `max_tokens` (token stimati).
+    Le sezioni troppo grandi vengono divise nelle loro sotto-sezioni e, se non bastano, per paragrafi.
+    I blocchi coprono tutto il documento: concatenandoli si ottiene di nuovo il documento originale.
+
+    Returns:
+        list[tuple[int, int]]: Gli offset (inizio, fine) dei blocchi, in ordine.
+    """
+    if max_tokens is None:
+        max_tokens = CHUNK_MAX_TOKENS
+    sections = build_section_index(document)
+
+    def units(start: int, end: int, level: int) -> list[tuple[int, int]]:
+        """
+        Parti indivisibili della porzione [start, end): le sezioni di livello più alto in essa contenute
+        (ricorsivamente divise se superano il limite), con l'eventuale testo che precede la prima.
+        """
+        if estimate_tokens(document[start:end]) <= max_tokens:
+            return [(start, end)]
+        children = [s for s in sections if start <= s.start and s.end <= end and s.level > level]
+        if not children:
+            return split_paragraphs(document, start, end, max_tokens)
+        top = min(s.level for s in children)
+        children = [s for s in children if s.level == top]
+
+        parts = []
+        if children[0].start > start:
+            parts += split_paragraphs(document, start, children[0].start, max_tokens)
+        for i, child in enumerate(children):
+            # Il titolo della sezione resta unito all'inizio del suo contenuto
+            child_end = children[i + 1].start if i + 1 < len(children) else end
+            child_units = units(child.body_start, child_end, child.level)
+            if child_units:
+                child_units[0] = (child.start, child_units[0][1])
+            else:
+                child_units = [(child.start, child_end)]
+            parts += child_units
+        return parts
+
+    # Le parti consecutive vengono raggruppate finché il blocco resta entro il limite
+    chunks = []
+    for start, end in units(0, len(document), 0):
+        if chunks and estimate_tokens(document[chunks[-1][0]:end]) <= max_tokens:
+            chunks[-1] = (chunks[-1][0], end)
+        else:
+            chunks.append((start, end))
+    return chunks
+
+def map_chunks(function, chunks: list[str], label: str, workers: int | None = None) -> list:
+    """
+    Applica `function` a ogni blocco, con al più `workers` blocchi in parallelo, e restituisce
+    i risultati nell'ordine dei blocchi. Ogni blocco completato viene segnalato con l'avanzamento.
+    Le chiamate all'LLM passano comunque dal rate limiter condiviso.
+    """
+    if workers is None:
+        workers = CHUNK_WORKERS
+    results = [None] * len(chunks)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(chunks)))) as pool:
+        # Ogni blocco viene eseguito in una copia del contesto (workspace della sessione, callback di streaming)
+        futures = {pool.submit(copy_context().run, function, chunk): i for i, chunk in enumerate(chunks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            print(f"{label}: blocco {done}/{len(chunks)} completato ({time.perf_counter() - start:.1f}s).")
+
+    metrics.increment("chunks_processed_total", len(chunks), operation=label)
+    metrics.event("map_reduce", operation=label, chunks=len(chunks), seconds=time.perf_counter() - start)
+    return results
+
+def map_reduce_edit(edit, command: str, document: str) -> str:
+    """
+    Applica un comando che riguarda l'intero documento (es. traduzione, revisione, cambio di stile)
+    blocco per blocco e riassembla il risultato. `edit(command, chunk, outline)` modifica un singolo
+    blocco sapendo, tramite l'indice dei titoli, in quale punto del documento si trova.
+    """
+    spans = split_into_chunks(document)
+    outline = format_outline(build_section_index(document))
+    print(f"Documento di ~{estimate_tokens(document)} token: modifica in {len(spans)} blocchi.")
+
+    new_chunks = map_chunks(lambda chunk: edit(command, chunk, outline), [document[s:e] for s, e in spans], "modifica")
+
+    # Dal fondo verso l'inizio, così gli offset dei blocchi precedenti restano validi
+    for (start, end), new_chunk in reversed(list(zip(spans, new_chunks))):
+        document = splice(document, start, end, new_chunk)
+    return document
+
+def edit_last_chunk(edit, command: str, document: str) -> str:
+    """
+    Applica un comando che aggiunge testo in fondo al documento al solo ultimo blocco,
+    insieme all'indice dei titoli, con una sola chiamata al modificatore.
+    """
+    start, end = split_into_chunks(document)[-1]
+    outline = format_outline(build_section_index(document))
+    print(f"Documento di ~{estimate_tokens(document)} token: modifica dell'ultimo blocco.")
+    return splice(document, start, end, edit(command, document[start:end], outline))
+
+def map_reduce_answer(answer, query: str, document: str) -> str:
+    """
+    Risponde a una domanda sull'intero documento (es. un riassunto): `answer(query, text)` viene
+    applicata a ogni blocco e poi, un'ultima volta, all'insieme delle risposte parziali.
+    """
+    spans = split_into_chunks(document)
+    print(f"Documento di ~{estimate_tokens(document)} token: risposta in {len(spans)} blocchi.")
+    if len(spans) == 1:
+        return answer(query, document)
+
+    partial = map_chunks(lambda chunk: answer(query, chunk), [document[s:e] for s, e in spans], "risposta")
+    combined = "\n\n".join(f"## Estratto {i} di {len(partial)}\n\n{text.strip()}" for i, text in enumerate(partial, start=1))
+    return answer(query, combined)
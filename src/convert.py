@@ -1,9 +1,11 @@
 import os
 import io
+import hashlib
+import tempfile
+import threading
 import markdown
-from xhtml2pdf import pisa
-from docx import Document
-from pdf2docx import Converter # Per ora manteniamo, ma vedremo limiti
+from collections import OrderedDict
+from src.docx_writer import markdown_to_docx
 
 def read_file_in_byte(percorso_file: str) -> bytes | None:
     
@@ -29,7 +31,7 @@ def read_file_in_byte(percorso_file: str) -> bytes | None:
         return None
 
 
-def convert_md_to_html_in_memory(markdown_content: str) -> str:
+def convert_md_to_html_in_memory(markdown_content: str) -> str | None:
     
     """
     Converte il contenuto Markdown (stringa) in HTML (stringa) direttamente in memoria.
@@ -38,20 +40,22 @@ def convert_md_to_html_in_memory(markdown_content: str) -> str:
         markdown_content (str): Il contenuto Markdown da convertire.
     
     Returns:
-        str: Il contenuto HTML ottenuto, oppure una stringa di errore se si verifica un problema.
+        str | None: Il contenuto HTML ottenuto, oppure None se si verifica un problema.
     """
     try:
         html_content = markdown.markdown(markdown_content, extensions=['extra', 'codehilite'])
         return html_content
     except Exception as e:
         print(f"Errore durante la conversione Markdown a HTML in memoria: {e}")
-        return "<html><body><p>Errore nella conversione HTML.</p></body></html>"
+        return None
 
 def convert_html_to_pdf_in_memory(html_content: str) -> bytes | None:
     """
     Converte il contenuto HTML (stringa) in PDF (bytes) direttamente in memoria.
     """
     try:
+        from xhtml2pdf import pisa # import lento, fatto solo alla prima esportazione
+
         # Usa BytesIO per catturare l'output PDF senza salvare su disco
         result_buffer = io.BytesIO()
         pisa_status = pisa.CreatePDF(
@@ -81,47 +85,135 @@ def convert_md_to_pdf_in_memory(markdown_content: str) -> bytes | None:
 def convert_md_to_docx_in_memory(markdown_content: str) -> bytes | None:
     """
     Converte il contenuto Markdown (stringa) in DOCX (bytes) direttamente in memoria.
-    Questo è un po' più complesso perché python-docx non ha un parser Markdown integrato.
-    Il modo migliore sarebbe convertire Markdown a un formato intermedio che python-docx possa capire,
-    o costruire il DOCX paragrafo per paragrafo.
-
-    Data la tua precedente implementazione che passava per PDF, qui simuleremo un percorso analogo:
-    Markdown -> PDF (in memoria) -> DOCX (ATTENZIONE: pdf2docx richiede file su disco, questo è un limite)
+    L'albero del documento Markdown viene scritto con python-docx (titoli, liste, tabelle,
+    blocchi di codice ed enfasi), senza passare da PDF e senza file temporanei.
     """
     try:
-        
-        temp_pdf_path = "tmp/temp_export.pdf"
-        temp_docx_path = "tmp/temp_export.docx"
+        return markdown_to_docx(markdown_content)
+    except ImportError:
+        print("Errore: Libreria 'python-docx' non installata. Per l'esportazione DOCX, esegui 'pip install python-docx'.")
+        return None
+    except Exception as e:
+        print(f"Errore generale durante la conversione Markdown a DOCX: {e}")
+        return None
 
-        # Crea la directory tmp se non esiste
-        os.makedirs("tmp", exist_ok=True)
+def convert_md_to_docx_via_pdf(markdown_content: str) -> bytes | None:
+    """
+    Conversione Markdown -> PDF -> DOCX con pdf2docx, usata prima del writer nativo.
+    Resta disponibile solo come riferimento per il benchmark (benchmarks/docx_export.py).
+    """
+    try:
+        from pdf2docx import Converter # import lento, fatto solo alla prima esportazione
 
         pdf_bytes = convert_md_to_pdf_in_memory(markdown_content)
-        if pdf_bytes:
+        if not pdf_bytes:
+            return None
+
+        # pdf2docx richiede file su disco: una cartella temporanea per chiamata evita conflitti tra sessioni
+        with tempfile.TemporaryDirectory() as temp_dir:
+            temp_pdf_path = os.path.join(temp_dir, "export.pdf")
+            temp_docx_path = os.path.join(temp_dir, "export.docx")
             with open(temp_pdf_path, "wb") as f:
                 f.write(pdf_bytes)
 
-            try:
-                cv = Converter(temp_pdf_path)
-                cv.convert(temp_docx_path, start=0, end=None) # Converte l'intero PDF
-                cv.close()
+            cv = Converter(temp_pdf_path)
+            cv.convert(temp_docx_path, start=0, end=None) # Converte l'intero PDF
+            cv.close()
 
-                docx_bytes = read_file_in_byte(temp_docx_path)
-                return docx_bytes
-            except Exception as e:
-                print(f"Errore durante la conversione PDF a DOCX: {e}")
-                return None
-            finally:
-                # Pulizia dei file temporanei
-                if os.path.exists(temp_pdf_path):
-                    os.remove(temp_pdf_path)
-                if os.path.exists(temp_docx_path):
-                    os.remove(temp_docx_path)
-        return None
-    except ImportError:
-        print("Errore: Libreria 'pdf2docx' non installata. Per l'esportazione DOCX, esegui 'pip install pdf2docx'.")
-        # Fornisci un fallback in byte per Streamlit
-        return b"Errore: Libreria pdf2docx non trovata."
+            return read_file_in_byte(temp_docx_path)
     except Exception as e:
-        print(f"Errore generale durante la conversione Markdown a DOCX: {e}")
-        return b"Errore nella conversione DOCX."
\ No newline at end of file
+        print(f"Errore durante la conversione PDF a DOCX: {e}")
+        return None
+
+# Formati il cui rendering è costoso e va fatto solo su richiesta dell'utente
+SLOW_EXPORT_FORMATS = ("PDF", "DOCX")
+
+def render_export(markdown_content: str, format_type: str) -> bytes | None:
+    """
+    Converte il contenuto Markdown nel formato di esportazione richiesto.
+    I formati non gestiti vengono esportati come Markdown.
+
+    Returns:
+        bytes | None: Il file esportato, oppure None se la conversione non è riuscita.
+    """
+    if format_type == "DOCX":
+        return convert_md_to_docx_in_memory(markdown_content)
+    if format_type == "HTML":
+        html_content = convert_md_to_html_in_memory(markdown_content)
+        return html_content.encode("utf-8") if html_content is not None else None
+    if format_type == "PDF":
+        return convert_md_to_pdf_in_memory(markdown_content)
+    return markdown_content.encode("utf-8")
+
+def content_hash(markdown_content: str) -> str:
+    return hashlib.sha256(markdown_content.encode("utf-8")).hexdigest()
+
+class ExportCache:
+    """
+    Cache LRU delle esportazioni già generate, indicizzata su (hash del contenuto, formato).
+    Il limite è sia sul numero di voci sia sulla memoria occupata; le voci usate meno di recente
+    vengono scartate per prime. Le conversioni fallite (None) non vengono salvate.
+    """
+    def __init__(self, max_entries: int | None = None, max_mb: float | None = None):
+        if max_entries is None:
+            max_entries = int(os.getenv("EXPORT_CACHE_SIZE", "32"))
+        if max_mb is None:
+            max_mb = float(os.getenv("EXPORT_CACHE_MB", "64"))
+        self.max_entries = max_entries
+        self.max_bytes = int(max_mb * 2**20)
+        self._exports = OrderedDict() # (hash, formato) -> bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, markdown_content: str, format_type: str) -> bytes | None:
+        """
+        Restituisce l'esportazione salvata, oppure None se non è ancora stata generata.
+        """
+        key = (content_hash(markdown_content), format_type)
+        with self._lock:
+            if key not in self._exports:
+                return None
+            self._exports.move_to_end(key)
+            return self._exports[key]
+
+    def export(self, markdown_content: str, format_type: str) -> bytes | None:
+        """
+        Restituisce l'esportazione del contenuto nel formato indicato, generandola solo se non è in cache.
+        """
+        key = (content_hash(markdown_content), format_type)
+        with self._lock:
+            if key in self._exports:
+                self._exports.move_to_end(key)
+                self.hits += 1
+                return self._exports[key]
+            self.misses += 1
+
+        # Il rendering avviene fuori dal lock, così le altre sessioni non restano in attesa
+        data = render_export(markdown_content, format_type)
+        if data is None:
+            return None
+
+        with self._lock:
+            self._exports[key] = data
+            self._exports.move_to_end(key)
+            self._evict()
+        return data
+
+    def _evict(self):
+        """
+        Scarta le esportazioni meno recenti finché la cache rientra nei limiti.
+        L'esportazione appena inserita non viene mai scartata.
+        """
+        while len(self._exports) > 1 and (
+            len(self._exports) > self.max_entries
+            or sum(len(data) for data in self._exports.values()) > self.max_bytes
+        ):
+            key, _ = self._exports.popitem(last=False)
+            print(f"Esportazione {key[1]} ({key[0][:8]}) rimossa dalla cache.")
+
+    def clear(self):
+        with self._lock:
+            self._exports.clear()
+
+export_cache = ExportCache()
@@ -0,0 +1,198 @@
+import io
+import re
+import html
+import xml.etree.ElementTree as etree
+import markdown
+from markdown.treeprocessors import Treeprocessor
+from markdown.extensions import Extension
+
+# Segnaposto con cui Python-Markdown sostituisce i blocchi HTML (compresi i blocchi di codice recintati)
+STASH_PLACEHOLDER = re.compile("\x02wzxhzdk:(\\d+)\x03")
+CODE_BLOCK = re.compile(r"^<pre[^>]*><code[^>]*>(.*)</code></pre>\s*$", re.DOTALL)
+HTML_TAG = re.compile(r"<[^>]+>")
+
+CODE_FONT = "Courier New"
+HEADINGS = {"h1": 1, "h2": 2, "h3": 3, "h4": 4, "h5": 5, "h6": 6}
+
+class CaptureTreeprocessor(Treeprocessor):
+    """
+    Salva l'albero del documento prodotto da Python-Markdown, dopo l'elaborazione degli elementi inline.
+    """
+    def run(self, root):
+        self.md.captured_tree = root
+
+class CaptureTreeExtension(Extension):
+    def extendMarkdown(self, md):
+        # Priorità minima: l'albero viene catturato dopo tutti gli altri treeprocessor
+        md.treeprocessors.register(CaptureTreeprocessor(md), "capture_tree", -10)
+
+def parse_markdown_tree(markdown_content: str) -> tuple[etree.Element, list[str]]:
+    """
+    Restituisce l'albero (AST) del documento Markdown e i blocchi HTML messi da parte dal parser.
+    """
+    md = markdown.Markdown(extensions=["tables", "fenced_code", "sane_lists", CaptureTreeExtension()])
+    md.convert(markdown_content)
+    return md.captured_tree, [str(block) for block in md.htmlStash.rawHtmlBlocks]
+
+def stashed_text(text: str, stash: list[str]) -> str:
+    """
+    Sostituisce i segnaposto dei blocchi HTML con il loro testo, senza tag.
+    """
+    return STASH_PLACEHOLDER.sub(lambda m: html.unescape(HTML_TAG.sub("", stash[int(m.group(1))])), text)
+
+class DocxWriter:
+    """
+    Scrive l'albero di un documento Markdown in un documento python-docx.
+    Gestisce titoli, paragrafi, enfasi, codice (inline e a blocchi), liste annidate, tabelle,
+    citazioni e linee orizzontali.
+    """
+    def __init__(self, stash: list[str]):
+        from docx import Document # import lento, fatto solo alla prima esportazione
+
+        self.document = Document()
+        self.stash = stash
+
+    # --- Elementi di blocco ---
+
+    def write_blocks(self, parent: etree.Element, list_level: int = 0):
+        for element in parent:
+            self.write_block(element, list_level)
+
+    def write_block(self, element: etree.Element, list_level: int = 0):
+        tag = element.tag
+
+        if tag in HEADINGS:
+            self.write_inline(self.document.add_heading("", HEADINGS[tag]), element)
+        elif tag == "p":
+            self.write_paragraph(element)
+        elif tag in ("ul", "ol"):
+            self.write_list(element, list_level)
+        elif tag == "table":
+            self.write_table(element)
+        elif tag == "pre":
+            self.write_code_block("".join(element.itertext()))
+        elif tag == "blockquote":
+            for child in element:
+                paragraph = self.document.add_paragraph(style="Quote")
+                self.write_inline(paragraph, child)
+        elif tag == "hr":
+            self.document.add_paragraph("_" * 40)
+        elif tag == "div":
+            self.write_blocks(element, list_level)
+        else:
+            self.write_inline(self.document.add_paragraph(), element)
+
+    def write_paragraph(self, element: etree.Element, style: str | None = None):
+        # Un paragrafo che contiene solo un segnaposto è un blocco HTML (es. un blocco di codice recintato)
+        match = STASH_PLACEHOLDER.fullmatch((element.text or "").strip()) if len(element) == 0 else None
+        if match is not None:
+            block = self.stash[int(match.group(1))]
+            code = CODE_BLOCK.match(block)
+            if code is not None:
+                self.write_code_block(html.unescape(code.group(1)))
+            else:
+                self.document.add_paragraph(html.unescape(HTML_TAG.sub("", block)).strip(), style=style)
+            return
+        self.write_inline(self.document.add_paragraph(style=style), element)
+
+    def write_code_block(self, code: str):
+        paragraph = self.document.add_paragraph()
+        lines = code.rstrip("\n").split("\n")
+        for i, line in enumerate(lines):
+            run = paragraph.add_run(line)
+            run.font.name = CODE_FONT
+            if i < len(lines) - 1:
+                run.add_break()
+
+    def write_list(self, element: etree.Element, list_level: int):
+        base_style = "List Number" if element.tag == "ol" else "List Bullet"
+        # Il modello di default di python-docx definisce gli stili delle liste fino al terzo livello
+        style = base_style if list_level == 0 else f"{base_style} {min(list_level + 1, 3)}"
+
+        for item in element:
+            paragraph = self.document.add_paragraph(style=style)
+            nested = []
+            # Testo dell'elemento: diretto (lista compatta) oppure nei paragrafi figli (lista con righe vuote)
+            self.append_text(paragraph, item.text)
+            for child in item:
+                if child.tag in ("ul", "ol"):
+                    nested.append(child)
+                elif child.tag == "p":
+                    if paragraph.text:
+                        paragraph.add_run().add_break()
+                    self.write_inline(paragraph, child)
+                else:
+                    self.write_run(paragraph, child)
+                    self.append_text(paragraph, child.tail)
+            for child in nested:
+                self.write_list(child, list_level + 1)
+
+    def write_table(self, element: etree.Element):
+        rows = [row for row in element.iter("tr")]
+        if not rows:
+            return
+        columns = max(len(row) for row in rows)
+        table = self.document.add_table(rows=len(rows), cols=columns)
+        table.style = "Table Grid"
+
+        for r, row in enumerate(rows):
+            for c, cell in enumerate(row):
+                paragraph = table.cell(r, c).paragraphs[0]
+                self.write_inline(paragraph, cell, bold=cell.tag == "th")
+
+    # --- Elementi inline ---
+
+    def write_inline(self, paragraph, element: etree.Element, **formatting):
+        """
+        Scrive il testo e i figli inline di un elemento nel paragrafo, accumulando la formattazione.
+        """
+        self.append_text(paragraph, element.text, **formatting)
+        for child in element:
+            self.write_run(paragraph, child, **formatting)
+            self.append_text(paragraph, child.tail, **formatting)
+
+    def write_run(self, paragraph, element: etree.Element, **formatting):
+        tag = element.tag
+        if tag in ("strong", "b"):
+            self.write_inline(paragraph, element, **formatting, bold=True)
+        elif tag in ("em", "i"):
+            self.write_inline(paragraph, element, **formatting, italic=True)
+        elif tag == "code":
+            self.append_text(paragraph, "".join(element.itertext()), **formatting, code=True)
+        elif tag == "a":
+            self.write_inline(paragraph, element, **formatting, underline=True)
+        elif tag == "br":
+            paragraph.add_run().add_break()
+        elif tag == "img":
+            self.append_text(paragraph, element.get("alt", ""), **formatting, italic=True)
+        else:
+            self.write_inline(paragraph, element, **formatting)
+
+    def append_text(self, paragraph, text: str | None, bold=False, italic=False, underline=False, code=False):
+        if not text:
+            return
+        text = stashed_text(text, self.stash)
+        # Gli a capo dentro un paragrafo Markdown sono spazi
+        text = text.replace("\n", " ")
+        if not text.strip() and not paragraph.text:
+            return
+        run = paragraph.add_run(text)
+        run.bold = bold or None
+        run.italic = italic or None
+        run.underline = underline or None
+        if code:
+            run.font.name = CODE_FONT
+
+    def to_bytes(self) -> bytes:
+        buffer = io.BytesIO()
+        self.document.save(buffer)
+        return buffer.getvalue()
+
+def markdown_to_docx(markdown_content: str) -> bytes:
+    """
+    Converte il contenuto Markdown in DOCX (bytes) direttamente in memoria, senza passare da PDF o da file su disco.
+    """
+    tree, stash = parse_markdown_tree(markdown_content)
+    writer = DocxWriter(stash)
+    writer.write_blocks(tree)
+    return writer.to_bytes()
@@ -0,0 +1,97 @@
+import os
+import difflib
+
+# Numero massimo di modifiche annullabili per documento
+HISTORY_MAX_STEPS = int(os.getenv("HISTORY_MAX_STEPS", "100"))
+
+def make_delta(old: str, new: str) -> list:
+    """
+    Differenza compatta tra due versioni del documento: solo i blocchi di righe cambiati,
+    ciascuno come [inizio nella versione nuova, righe precedenti, righe nuove].
+    La stessa differenza permette di passare da una versione all'altra in entrambe le direzioni.
+    """
+    old_lines = old.splitlines(keepends=True)
+    new_lines = new.splitlines(keepends=True)
+
+    # Le righe iniziali e finali comuni vengono escluse dal confronto, che è quadratico nel caso peggiore
+    prefix = 0
+    while prefix < min(len(old_lines), len(new_lines)) and old_lines[prefix] == new_lines[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < min(len(old_lines), len(new_lines)) - prefix and old_lines[-1 - suffix] == new_lines[-1 - suffix]:
+        suffix += 1
+    old_middle = old_lines[prefix:len(old_lines) - suffix]
+    new_middle = new_lines[prefix:len(new_lines) - suffix]
+
+    # Con autojunk le righe molto ripetute non vengono usate come ancore: la differenza può essere
+    # un po' meno compatta, ma il confronto resta veloce anche su documenti lunghi e ripetitivi
+    delta = []
+    matcher = difflib.SequenceMatcher(None, old_middle, new_middle)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag != "equal":
+            delta.append([prefix + j1, old_middle[i1:i2], new_middle[j1:j2]])
+    return delta
+
+def revert_delta(document: str, delta: list) -> str:
+    """
+    Riporta il documento alla versione precedente la modifica descritta da `delta`.
+    """
+    lines = document.splitlines(keepends=True)
+    # Dal fondo verso l'inizio, così le posizioni dei blocchi precedenti restano valide
+    for start, old_lines, new_lines in reversed(delta):
+        lines[start:start + len(new_lines)] = old_lines
+    return "".join(lines)
+
+def reapply_delta(document: str, delta: list) -> str:
+    """
+    Riapplica al documento la modifica descritta da `delta` (dopo un `revert_delta`).
+    """
+    lines = document.splitlines(keepends=True)
+    # Dall'inizio verso il fondo: i blocchi già riapplicati sono nella versione nuova, a cui si riferiscono le posizioni
+    for start, old_lines, new_lines in delta:
+        lines[start:start + len(old_lines)] = new_lines
+    return "".join(lines)
+
+def empty_history() -> dict:
+    return {"undo": [], "redo": []}
+
+def record_edit(history: dict, old: str, new: str) -> dict:
+    """
+    Aggiunge alla cronologia la modifica da `old` a `new`; le modifiche annullate non sono più ripristinabili.
+    """
+    if old == new:
+        return history
+    undo = (history["undo"] + [make_delta(old, new)])[-HISTORY_MAX_STEPS:]
+    return {"undo": undo, "redo": []}
+
+def undo_edits(document: str, history: dict, steps: int = 1) -> tuple[str, dict, int]:
+    """
+    Annulla le ultime `steps` modifiche.
+
+    Returns:
+        tuple: Il documento risultante, la nuova cronologia e il numero di modifiche annullate.
+    """
+    undo, redo = list(history["undo"]), list(history["redo"])
+    count = 0
+    while undo and count < steps:
+        delta = undo.pop()
+        document = revert_delta(document, delta)
+        redo.append(delta)
+        count += 1
+    return document, {"undo": undo, "redo": redo}, count
+
+def redo_edits(document: str, history: dict, steps: int = 1) -> tuple[str, dict, int]:
+    """
+    Ripristina le ultime `steps` modifiche annullate.
+
+    Returns:
+        tuple: Il documento risultante, la nuova cronologia e il numero di modifiche ripristinate.
+    """
+    undo, redo = list(history["undo"]), list(history["redo"])
+    count = 0
+    while redo and count < steps:
+        delta = redo.pop()
+        document = reapply_delta(document, delta)
+        undo.append(delta)
+        count += 1
+    return document, {"undo": undo, "redo": redo}, count
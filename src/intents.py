@@ -0,0 +1,122 @@
+import os
+import re
+import json
+import threading
+from collections import OrderedDict, Counter
+
+# Un nome di file o un titolo, tra virgolette (anche con spazi) oppure senza
+QUOTED = r"['\"“‘](?P<{0}>[^'\"”’]+)['\"”’]"
+FILENAME = r"(?:{}|(?P<{}_bare>\S+))"
+
+def name_pattern(group: str) -> str:
+    return FILENAME.format(QUOTED.format(group), group)
+
+# Comandi frequenti riconosciuti senza chiamare l'LLM; il comando deve coincidere con l'intero input
+INTENT_PATTERNS = [
+    ("open_file", re.compile(
+        rf"^(?:apri|carica)(?: il)?(?: file| documento)? {name_pattern('filename')}$", re.IGNORECASE)),
+    ("save_file", re.compile(
+        rf"^salva(?: il documento| il file| tutto)?(?: come| in| su| nel file)? {name_pattern('filename')}$", re.IGNORECASE)),
+    ("switch_document", re.compile(
+        rf"^(?:passa|torna|vai)(?: al| a)?(?: documento| file)? {name_pattern('document_name')}$", re.IGNORECASE)),
+    ("list_documents", re.compile(
+        r"^(?:elenca|mostra(?:mi)?|quali sono) (?:i|tutti i) documenti(?: aperti)?$", re.IGNORECASE)),
+    ("undo", re.compile(
+        r"^annulla(?: l'ultima modifica| le ultime (?P<steps>\d+) modifiche)?$", re.IGNORECASE)),
+    ("redo", re.compile(
+        r"^(?:ripristina|rifai)(?: l'ultima modifica| le ultime (?P<steps>\d+) modifiche)?$", re.IGNORECASE)),
+    ("list_sections", re.compile(
+        r"^(?:elenca|mostra(?:mi)?|visualizza|quali sono)(?: tutte)? le sezioni(?: del documento)?$", re.IGNORECASE)),
+    ("show_section", re.compile(
+        r"^(?:mostra(?:mi)?|visualizza|leggi|fammi vedere) (?:la sezione|il capitolo) ['\"“‘]?(?P<section_title>.+?)['\"”’]?$", re.IGNORECASE)),
+    ("rename_section", re.compile(
+        r"^rinomina (?:la sezione |il capitolo )?['\"“‘]?(?P<section_title>.+?)['\"”’]? (?:in|come) ['\"“‘]?(?P<new_title>.+?)['\"”’]?$", re.IGNORECASE)),
+    ("delete_section", re.compile(
+        r"^(?:elimina|cancella|rimuovi) (?:la sezione|il capitolo) ['\"“‘]?(?P<section_title>.+?)['\"”’]?$", re.IGNORECASE)),
+]
+
+# Input con più comandi concatenati (es. "elimina la sezione X e salva") o con più sezioni
+# (es. "mostrami la sezione 1 e la sezione 2"): vanno pianificati dall'LLM
+COMPOUND_PATTERN = re.compile(
+    r"(,|;| e | poi | quindi )\s*(poi )?(apri|carica|passa|salva|elimina|cancella|rimuovi|rinomina|mostra|visualizza|leggi|aggiungi|crea|scrivi|sposta|modifica|elenca|riassumi|traduci)"
+    r"| e (la|il|le|i) (sezion[ei]|capitol[oi])\b",
+    re.IGNORECASE
+)
+
+def match_intent(user_input: str) -> list | None:
+    """
+    Riconosce localmente i comandi più frequenti (apri, salva, cambio ed elenco dei documenti,
+    annulla/ripristina, elenca/mostra sezioni, rinomina, elimina)
+    e ne costruisce il piano senza chiamare l'LLM.
+
+    Returns:
+        list | None: Il piano (lista di passi), oppure None se l'input non corrisponde a nessun comando noto.
+    """
+    text = " ".join(user_input.split()).rstrip(".!?;")
+    if COMPOUND_PATTERN.search(text):
+        return None
+    for tool_name, pattern in INTENT_PATTERNS:
+        match = pattern.match(text)
+        if match is None:
+            continue
+        args = {}
+        for key, value in match.groupdict().items():
+            if value is not None:
+                args[key.removesuffix("_bare")] = value.strip()
+        return [{"tool_name": tool_name, "args": args}]
+    return None
+
+def normalize_input(user_input: str) -> str:
+    """
+    Chiave di cache per un input: spazi compattati. Maiuscole e minuscole restano distinte,
+    perché i nomi di file e i titoli degli argomenti del piano vengono copiati dall'input.
+    """
+    return " ".join(user_input.split())
+
+class PlanCache:
+    """
+    Cache LRU dei piani generati dall'LLM, indicizzata sull'input normalizzato.
+    I piani vengono salvati come JSON, così ogni lettura restituisce una copia indipendente
+    (l'executor consuma il piano rimuovendone i passi).
+    """
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self._plans = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_input: str) -> list | None:
+        with self._lock:
+            key = normalize_input(user_input)
+            if key not in self._plans:
+                return None
+            self._plans.move_to_end(key)
+            return json.loads(self._plans[key])
+
+    def put(self, user_input: str, plan: list):
+        with self._lock:
+            self._plans[normalize_input(user_input)] = json.dumps(plan)
+            self._plans.move_to_end(normalize_input(user_input))
+            while len(self._plans) > self.max_size:
+                self._plans.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+plan_cache = PlanCache(max_size=int(os.getenv("PLANNER_CACHE_SIZE", "256")))
+
+# Contatori di come è stato ottenuto ciascun piano: "regola", "cache" oppure "llm"
+planner_counts = Counter()
+
+def planner_stats() -> dict:
+    """
+    Restituisce i contatori del planner e la percentuale di chiamate all'LLM risparmiate.
+    """
+    total = sum(planner_counts.values())
+    saved = planner_counts["regola"] + planner_counts["cache"]
+    return {
+        "regola": planner_counts["regola"],
+        "cache": planner_counts["cache"],
+        "llm": planner_counts["llm"],
+        "hit_rate": saved / total if total else 0.0
+    }
@@ -0,0 +1,169 @@
+import os
+import json
+import time
+import threading
+import functools
+from collections import deque, defaultdict
+from contextlib import contextmanager
+
+class Metrics:
+    """
+    Raccolta delle metriche dell'applicazione: contatori, durate (conteggio, somma e massimo)
+    ed eventi strutturati, con etichette (es. nodo del grafo, tool, agente).
+    Le metriche possono essere esportate come JSON lines (un evento per riga)
+    oppure come istantanea nel formato testuale di Prometheus.
+    """
+    def __init__(self, max_events: int | None = None):
+        if max_events is None:
+            max_events = int(os.getenv("METRICS_MAX_EVENTS", "10000"))
+        self.events = deque(maxlen=max_events) # solo gli eventi più recenti
+        self._counters = defaultdict(float)    # (nome, etichette) -> valore
+        self._durations = {}                   # (nome, etichette) -> [conteggio, somma, massimo]
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += amount
+
+    def observe(self, name: str, seconds: float, **labels):
+        """
+        Registra una durata (in secondi) per la metrica e le etichette indicate.
+        """
+        with self._lock:
+            stats = self._durations.setdefault(self._key(name, labels), [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def event(self, kind: str, **fields):
+        """
+        Aggiunge un evento strutturato (es. una chiamata a un agente con latenza e token).
+        """
+        with self._lock:
+            self.events.append({"ts": time.time(), "kind": kind, **fields})
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        """
+        Restituisce contatori e durate aggregate come dizionario.
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                "durations": [
+                    {"name": name, "labels": dict(labels), "count": count, "sum": total, "max": maximum}
+                    for (name, labels), (count, total, maximum) in self._durations.items()
+                ]
+            }
+
+    def to_json_lines(self) -> str:
+        """
+        Esporta gli eventi registrati, uno per riga in formato JSON.
+        """
+        with self._lock:
+            return "".join(json.dumps(event, ensure_ascii=False, default=str) + "\n" for event in self.events)
+
+    def to_prometheus(self) -> str:
+        """
+        Esporta contatori e durate nel formato testuale di Prometheus.
+        Le durate diventano metriche di tipo summary (`_count` e `_sum`) più un gauge `_max`.
+        """
+        def format_labels(labels: tuple) -> str:
+            if not labels:
+                return ""
+            # Nei valori delle etichette vanno rappresentati con escape barra rovesciata, virgolette e a capo
+            escaped = (f'{k}="{escape_label_value(v)}"' for k, v in labels)
+            return "{" + ",".join(escaped) + "}"
+
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self._counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (metric, labels), value in self._counters.items():
+                    if metric == name:
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+            for name in sorted({name for name, _ in self._durations}):
+                lines.append(f"# TYPE {name} summary")
+                for (metric, labels), (count, total, _) in self._durations.items():
+                    if metric == name:
+                        lines.append(f"{name}_count{format_labels(labels)} {count}")
+                        lines.append(f"{name}_sum{format_labels(labels)} {total:.6f}")
+                lines.append(f"# TYPE {name}_max gauge")
+                for (metric, labels), (_, _, maximum) in self._durations.items():
+                    if metric == name:
+                        lines.append(f"{name}_max{format_labels(labels)} {maximum:.6f}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str, format: str = "jsonl"):
+        """
+        Salva le metriche su file, come JSON lines ("jsonl") o nel formato di Prometheus ("prometheus").
+        """
+        content = self.to_prometheus() if format == "prometheus" else self.to_json_lines()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    def clear(self):
+        with self._lock:
+            self.events.clear()
+            self._counters.clear()
+            self._durations.clear()
+
+metrics = Metrics()
+
+def escape_label_value(value) -> str:
+    """
+    Valore di un'etichetta nel formato testuale di Prometheus: barra rovesciata, virgolette e a capo
+    vengono preceduti da una barra rovesciata (l'a capo diventa la sequenza "\\n").
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def timed_node(node_name: str):
+    """
+    Decoratore per i nodi del grafo: ne misura la durata e conta le esecuzioni fallite.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            except Exception as e:
+                metrics.increment("graph_node_failures_total", node=node_name, reason=type(e).__name__)
+                raise
+            finally:
+                elapsed = time.perf_counter() - start
+                metrics.observe("graph_node_seconds", elapsed, node=node_name)
+                metrics.event("node", node=node_name, seconds=elapsed)
+        return wrapper
+    return decorator
+
+def record_llm_call(agent_name: str, model_name: str, seconds: float, message=None, cached: bool = False):
+    """
+    Registra una chiamata a un agente: latenza, token usati (dai metadati della risposta, se presenti) e origine.
+    """
+    usage = getattr(message, "usage_metadata", None) or {}
+    tokens_in = usage.get("input_tokens", 0)
+    tokens_out = usage.get("output_tokens", 0)
+    source = "cache" if cached else "llm"
+
+    metrics.increment("llm_calls_total", agent=agent_name, source=source)
+    if not cached:
+        metrics.observe("llm_call_seconds", seconds, agent=agent_name)
+        metrics.increment("llm_tokens_total", tokens_in, agent=agent_name, direction="in")
+        metrics.increment("llm_tokens_total", tokens_out, agent=agent_name, direction="out")
+    metrics.event("llm_call", agent=agent_name, model=model_name, seconds=seconds,
+                  tokens_in=tokens_in, tokens_out=tokens_out, source=source)
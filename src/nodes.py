@@ -1,47 +1,90 @@
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
 from src.agents import *
 from src.tools import *
+from src.rate_limit import stream_with_rate_limit
+from src.plan_parser import IncrementalPlanParser
+from src.intents import *
+from src.metrics import metrics, timed_node, record_llm_call
+from src.history import empty_history, record_edit
+from src.workspace import get_workspace, UNTITLED_DOCUMENT
 from langgraph.graph import StateGraph, END
-import time
 
 tool_list = get_tools()
 
+# Il prompt finale per il nostro Planner (i tool non cambiano, quindi viene costruito una sola volta)
+PLANNER_PROMPT_TEMPLATE = f"""
+Sei un pianificatore di task esperto. Il tuo compito è analizzare la richiesta dell'utente e scomporla in una sequenza di passi da eseguire usando i tool a tua disposizione.
+
+# TOOL DISPONIBILI
+{format_tools_for_prompt(tools=tool_list)}
+# ISTRUZIONI
+- Analizza la richiesta e crea un piano step-by-step.
+- Ogni passo del piano deve essere una chiamata a uno dei tool disponibili.
+- Restituisci il piano come una lista JSON valida `[ ]`. IMPORTANTE: non inserire nulla prima e dopo le parentesi quadre. Ogni elemento della lista è un dizionario con due chiavi: "tool_name" (il nome del tool da usare) e "args" (un dizionario con gli argomenti per quel tool).
+- Estrai gli argomenti direttamente dalla richiesta dell'utente.
+- Se un passo usa il risultato di un passo precedente che non modifica il documento, puoi aggiungere a entrambi una chiave "id" (un numero) e al passo dipendente una chiave "depends_on" con la lista degli "id" da cui dipende. I passi indipendenti vengono eseguiti in parallelo.
+- Per rinominare, eliminare o spostare intere sezioni usa i tool "rename_section", "delete_section" e "move_section" invece di "modify_document": modificano il documento direttamente, senza riscriverlo.
+- Per elencare le sezioni o mostrare una sezione per titolo preferisci i tool "list_sections" e "show_section": non richiedono l'LLM e rispondono immediatamente. Usa "retrieve_document" per le domande sul contenuto del documento.
+- Si possono tenere aperti più documenti: "open_file" apre un file come nuovo documento attivo, "switch_document" passa a un documento già aperto, "list_documents" li elenca e "close_document" ne chiude uno. Gli altri tool lavorano sempre sul documento attivo.
+- Per annullare o ripristinare le ultime modifiche al documento usa i tool "undo" e "redo".
+- Se non riesci a capire quale tool usare, usa il tool "explain_capabilities".
+
+# ESEMPIO
+Richiesta: "Apri 'report_vecchio.md', cancella la sezione 'Note' e salva tutto come 'report_nuovo.md'."
+Output:
+[
+    {{"tool_name": "open_file", "args": {{"filename": "report_vecchio.md"}}}},
+    {{"tool_name": "delete_section", "args": {{"section_title": "Note"}}}},
+    {{"tool_name": "save_file", "args": {{"filename": "report_nuovo.md"}}}}
+]
+""".replace("    ", "")
+
+@timed_node("planner")
 def planner_node(state) -> dict:
     """
     Questo nodo genera il piano d'azione.
     """
     print("--- NODO: Planner ---")
 
-    # Il prompt finale per il nostro Planner
-    PLANNER_PROMPT_TEMPLATE = f"""
-    Sei un pianificatore di task esperto. Il tuo compito è analizzare la richiesta dell'utente e scomporla in una sequenza di passi da eseguire usando i tool a tua disposizione.
-
-    # TOOL DISPONIBILI
-    {format_tools_for_prompt(tools=tool_list)}
-    # ISTRUZIONI
-    - Analizza la richiesta e crea un piano step-by-step.
-    - Ogni passo del piano deve essere una chiamata a uno dei tool disponibili.
-    - Restituisci il piano come una lista JSON valida `[ ]`. IMPORTANTE: non inserire nulla prima e dopo le parentesi quadre. Ogni elemento della lista è un dizionario con due chiavi: "tool_name" (il nome del tool da usare) e "args" (un dizionario con gli argomenti per quel tool).
-    - Estrai gli argomenti direttamente dalla richiesta dell'utente.
-    - Se non riesci a capire quale tool usare, usa il tool "explain_capabilities".
-
-    # ESEMPIO
-    Richiesta: "Apri 'report_vecchio.md', cancella la sezione 'Note' e salva tutto come 'report_nuovo.md'."
-    Output:
-    [
-        {{"tool_name": "open_file", "args": {{"filename": "report_vecchio.md"}}}},
-        {{"tool_name": "modify_document", "args": {{"command": "cancella la sezione 'Note'"}}}},
-        {{"tool_name": "save_file", "args": {{"filename": "report_nuovo.md"}}}}
-    ]
-    """.replace("    ", "")
-
+    # I comandi più frequenti vengono riconosciuti localmente, senza chiamare l'LLM
+    plan = match_intent(state['input'])
+    source = "regola"
+    if plan is None:
+        plan = plan_cache.get(state['input'])
+        source = "cache"
+    if plan is not None:
+        planner_counts[source] += 1
+        record_plan(source, plan)
+        print(f"Piano ottenuto da {source} (LLM evitato nel {planner_stats()['hit_rate']:.0%} delle richieste): {plan}")
+        return {"plan": plan}
+    planner_counts["llm"] += 1
+    planner_start = time.perf_counter()
+    last_chunk = None
 
     # Combiniamo il template del prompt con l'input specifico dell'utente
     prompt = PLANNER_PROMPT_TEMPLATE + f"\n\n# RICHIESTA REALE\nRichiesta: \"{state['input']}\"\nOutput:"
 
-    # Chiamiamo l'LLM per generare il piano
-    response = model.invoke(prompt)
-    llm_output = response.content
+    # Chiamiamo l'LLM in streaming per generare il piano: appena il primo passo è completo
+    # lo eseguiamo in anticipo, mentre il modello genera il resto del piano
+    parser = IncrementalPlanParser()
+    prefetched_step, prefetched_result = None, None
+    llm_output = ""
+    with ThreadPoolExecutor(max_workers=1) as prefetch_pool:
+        model = get_model()
+        chunks = stream_with_rate_limit(model.stream, prompt, config={"metadata": {"agent_name": "Planner"}}, model_name=model.model)
+        for chunk in chunks:
+            llm_output += chunk.content
+            last_chunk = chunk if last_chunk is None else last_chunk + chunk
+            for step in parser.feed(chunk.content):
+                if prefetched_result is None and can_prefetch(step):
+                    print(f"Esecuzione anticipata del primo passo: {step}")
+                    prefetched_step = step
+                    tool_to_call, kwargs = prepare_step(step, state.get("document_content", ""), document_history(state))
+                    prefetched_result = prefetch_pool.submit(copy_context().run, run_tool, tool_to_call, kwargs)
+        record_llm_call("Planner", model.model, time.perf_counter() - planner_start, last_chunk)
 
     try:
         # Validiamo e carichiamo l'output JSON in una lista Python
@@ -52,40 +95,69 @@ def planner_node(state) -> dict:
         plan = json.loads(llm_output)
 
         if not isinstance(plan, list):
+            metrics.increment("plan_failures_total", reason="not_a_list")
             print("Errore: Il piano generato non è una lista.")
             print("Piano generato: ", plan)
             
             return {"plan": []} # Piano vuoto in caso di formato non valido
 
         print(f"Piano generato: {plan}")
+        record_plan("llm", plan)
+        plan_cache.put(state['input'], plan)
+
+        # Se il primo passo è già stato eseguito, ne applichiamo il risultato come farebbe l'executor
+        if prefetched_result is not None and plan and plan[0] == prefetched_step:
+            step = plan.pop(0)
+            return apply_step_results(state, [step], [prefetched_result.result()], plan)
+
         # Aggiorniamo lo stato del grafo con il nuovo piano
         return {"plan": plan}
     except json.JSONDecodeError:
+        metrics.increment("plan_failures_total", reason="invalid_json")
         print(f"Errore di decodifica JSON: L'LLM ha restituito un output malformato.\n{llm_output}")
         return {"plan": [], "response": llm_output} # Piano vuoto in caso di errore
     
     
+def record_plan(source: str, plan: list):
+    """
+    Registra nelle metriche l'origine del piano (regola, cache o llm) e il numero di passi.
+    """
+    metrics.increment("plans_total", source=source)
+    metrics.increment("plan_steps_total", len(plan), source=source)
+    metrics.event("plan", source=source, steps=len(plan), tools=[step.get("tool_name") for step in plan if isinstance(step, dict)])
+
 # Creiamo un dizionario per un accesso rapido ai tool tramite il loro nome
 
 tool_map = {tool.name: tool for tool in tool_list}
 
-def executor_node(state) -> dict:
+# Tool che restituiscono il nuovo contenuto del documento
+DOCUMENT_TOOLS = ["modify_document", "rename_section", "delete_section", "move_section", "organize_text", "open_file", "switch_document", "close_document"]
+
+# Tool che cambiano il documento attivo: dopo di loro si salva nello stato anche il contenuto degli altri documenti aperti
+WORKSPACE_TOOLS = ["open_file", "switch_document", "close_document"]
+
+# Tool che modificano il documento attivo: le loro modifiche vengono registrate nella cronologia (annullabili)
+EDIT_TOOLS = ["modify_document", "rename_section", "delete_section", "move_section", "organize_text"]
+
+# Tool che annullano o ripristinano modifiche: restituiscono il documento e la nuova cronologia
+HISTORY_TOOLS = ["undo", "redo"]
+
+def active_document_name() -> str:
+    return get_workspace().active or UNTITLED_DOCUMENT
+
+def document_history(state) -> dict:
     """
-    Questo nodo esegue un singolo passo del piano.
+    Restituisce la cronologia delle modifiche (differenze annullabili e ripristinabili) del documento attivo.
     """
-    print("--- NODO: Executor ---")
-    
-    #per evitare un "too many requests"
-    time.sleep(1)
+    return state.get("history", {}).get(active_document_name(), empty_history())
 
-    # Se il piano è vuoto, non fare nulla
-    if not state['plan']:
-        print("Il piano è vuoto. Nessuna azione da eseguire.")
-        return {}
+def prepare_step(step, document_content, history=None):
+    """
+    Cerca il tool di un passo del piano e ne assembla gli argomenti.
 
-    # Prendi il primo passo dal piano
-    plan = state['plan']
-    step = plan.pop(0)
+    Returns:
+        tuple: Il tool da chiamare (None se non esiste) e gli argomenti.
+    """
     tool_name = step.get("tool_name")
     args = step.get("args", {})
 
@@ -93,8 +165,7 @@ def executor_node(state) -> dict:
 
     # Cerca il tool corrispondente
     if tool_name not in tool_map:
-        result = f"Errore: Tool '{tool_name}' non trovato."
-        return {"past_steps": [(step, result)]}
+        return None, args
 
     # Prepara gli argomenti per il tool
     tool_to_call = tool_map[tool_name]
@@ -104,41 +175,178 @@ def executor_node(state) -> dict:
     # Controlla se il tool ha bisogno del contenuto del documento e glielo fornisce
     # leggendolo dallo stato del grafo.
     if "current_document" in tool_to_call.args:
-        kwargs["current_document"] = state.get("document_content", "")
+        kwargs["current_document"] = document_content
 
     if "content" in tool_to_call.args and "content" not in kwargs:
-        kwargs["content"] = state.get("document_content", "")
+        kwargs["content"] = document_content
+    if "history" in tool_to_call.args:
+        kwargs["history"] = history or empty_history()
 
+    return tool_to_call, kwargs
+
+def run_tool(tool_to_call, kwargs):
+    """
+    Esegue un tool restituendo il risultato, oppure l'eccezione sollevata.
+    Restituisce None se il tool non esiste.
+    """
+    if tool_to_call is None:
+        metrics.increment("tool_failures_total", tool="unknown", reason="not_found")
+        return None
+    start = time.perf_counter()
     try:
-        # Esegui il tool con gli argomenti assemblati
         result = tool_to_call.invoke(kwargs)
     except Exception as e:
-        result = f"Errore durante l'esecuzione della richiesta: '{e}'"
-        return {
-            "plan": [],
-            "past_steps": [(step, result)],
-            "document_content": state.get("document_content", ""),
-            "response": result
-        }
-    
-    print(result)
-
-    # Aggiorna lo stato del documento se il tool lo modifica
-    new_document_content = state.get("document_content", "")
-    if tool_name in ["modify_document", "organize_text", "open_file", "save_file"]:
-        # Questi tool restituiscono il nuovo contenuto del documento
-        new_document_content = result
-        response = "markdown"
+        result = e
+    record_tool_call(tool_to_call.name, time.perf_counter() - start, result)
+    return result
+
+def record_tool_call(tool_name: str, seconds: float, result):
+    """
+    Registra nelle metriche la durata di un tool e, se è fallito, il motivo.
+    """
+    metrics.observe("tool_seconds", seconds, tool=tool_name)
+    if isinstance(result, Exception):
+        metrics.increment("tool_failures_total", tool=tool_name, reason=type(result).__name__)
+        metrics.event("tool", tool=tool_name, seconds=seconds, error=str(result))
     else:
-        response = result
-        
-    # Salva il risultato per la cronologia
-    return {
-        "plan": plan, # Aggiorna il piano (abbiamo rimosso un elemento)
-        "past_steps": [(step, result)],
+        metrics.event("tool", tool=tool_name, seconds=seconds)
+
+# Tool con effetti esterni al grafo (file su disco, documenti aperti nel workspace)
+SIDE_EFFECT_TOOLS = ["save_file", "open_file", "switch_document", "close_document"]
+
+def can_prefetch(step) -> bool:
+    """
+    Indica se un passo può essere eseguito prima che il piano sia completo:
+    il tool deve esistere e non avere effetti esterni al grafo (come il salvataggio di un file o il cambio di documento attivo).
+    """
+    return step.get("tool_name") in tool_map and step.get("tool_name") not in SIDE_EFFECT_TOOLS and not step.get("depends_on")
+
+def next_batch_size(plan) -> int:
+    """
+    Restituisce quanti passi iniziali del piano sono indipendenti e possono essere eseguiti in parallelo.
+    Un passo che modifica il documento (compresi annulla e ripristina) viene sempre eseguito da solo,
+    perché i passi successivi devono leggerne il risultato. Un passo che dichiara "depends_on" (lista di "id" di altri passi)
+    non viene eseguito insieme ai passi da cui dipende.
+    """
+    batch_ids = set()
+    size = 0
+    for step in plan:
+        if step.get("tool_name") in DOCUMENT_TOOLS + HISTORY_TOOLS:
+            return size or 1
+        if batch_ids.intersection(step.get("depends_on", [])):
+            break
+        if "id" in step:
+            batch_ids.add(step["id"])
+        size += 1
+    return max(size, 1)
+
+def run_steps_concurrently(calls):
+    """
+    Esegue in parallelo, in thread separati, le chiamate ai tool, restituendo risultati ed eccezioni
+    nell'ordine del piano. Non crea un event loop: il nodo può essere eseguito anche da chi ne ha
+    già uno in esecuzione (es. `app.ainvoke` o `app.astream`).
+    """
+    with ThreadPoolExecutor(max_workers=len(calls), thread_name_prefix="executor-step") as pool:
+        # Ogni passo viene eseguito in una copia del contesto (workspace della sessione, callback di streaming)
+        futures = [pool.submit(copy_context().run, run_tool, tool_to_call, kwargs) for tool_to_call, kwargs in calls]
+        return [future.result() for future in futures]
+
+@timed_node("executor")
+def executor_node(state) -> dict:
+    """
+    Questo nodo esegue il passo successivo del piano, oppure, se i passi successivi
+    sono indipendenti tra loro (es. più recuperi di sezioni), li esegue in parallelo.
+    """
+    print("--- NODO: Executor ---")
+
+    # Se il piano è vuoto, non fare nulla
+    if not state['plan']:
+        print("Il piano è vuoto. Nessuna azione da eseguire.")
+        return {}
+
+    # Prendi i passi da eseguire dal piano
+    plan = state['plan']
+    steps = [plan.pop(0) for _ in range(next_batch_size(plan))]
+    document_content = state.get("document_content", "")
+
+    calls = [prepare_step(step, document_content, document_history(state)) for step in steps]
+
+    if len(calls) == 1:
+        # Esegui il tool con gli argomenti assemblati
+        results = [run_tool(*calls[0])]
+    else:
+        print(f"Esecuzione in parallelo di {len(calls)} passi indipendenti.")
+        results = run_steps_concurrently(calls)
+
+    return apply_step_results(state, steps, results, plan)
+
+def apply_step_results(state, steps, results, plan) -> dict:
+    """
+    Calcola l'aggiornamento dello stato del grafo a partire dai risultati dei passi eseguiti.
+    """
+    document_content = state.get("document_content", "")
+    past_steps = []
+    responses = []
+    new_document_content = document_content
+    histories = dict(state.get("history", {}))
+    workspace_changed = False
+    for step, result in zip(steps, results):
+        if result is None:
+            # Tool inesistente: il passo viene registrato e saltato
+            past_steps.append((step, f"Errore: Tool '{step.get('tool_name')}' non trovato."))
+            continue
+
+        if isinstance(result, Exception):
+            result = f"Errore durante l'esecuzione della richiesta: '{result}'"
+            return {
+                "plan": [],
+                "past_steps": past_steps + [(step, result)],
+                "document_content": document_content,
+                "response": result
+            }
+
+        tool_name = step.get("tool_name")
+        if isinstance(result, RetrievalAnswer):
+            # Il percorso che ha servito la richiesta (strutturale o agente) viene riportato nel passo eseguito
+            step = {**step, "path": result.path}
+            result = str(result)
+        if tool_name in HISTORY_TOOLS:
+            # Annulla/ripristina: il tool restituisce il documento e la nuova cronologia
+            result, histories[active_document_name()] = result
+        elif tool_name in EDIT_TOOLS:
+            # Nella cronologia si salva solo la differenza rispetto alla versione precedente
+            name = active_document_name()
+            histories[name] = record_edit(histories.get(name, empty_history()), new_document_content, result)
+
+        print(result)
+
+        # Aggiorna lo stato del documento se il tool lo modifica
+        if tool_name in DOCUMENT_TOOLS + HISTORY_TOOLS:
+            # Questi tool restituiscono il nuovo contenuto del documento, che non viene copiato nei passi eseguiti
+            new_document_content = result
+            if tool_name in WORKSPACE_TOOLS:
+                workspace_changed = True
+                past_steps.append((step, f"Documento attivo: '{active_document_name()}' ({len(result)} caratteri)."))
+            else:
+                past_steps.append((step, f"Documento aggiornato ({len(result)} caratteri)."))
+            responses.append("markdown")
+        else:
+            past_steps.append((step, result))
+            responses.append(result)
+
+    # Salva il risultato per la cronologia; le risposte dei passi paralleli vengono unite nell'ordine del piano
+    update = {
+        "plan": plan, # Aggiorna il piano (abbiamo rimosso i passi eseguiti)
+        "past_steps": past_steps,
         "document_content": new_document_content, # Aggiorna il contenuto del documento
-        "response": response
+        "response": "\n\n".join(responses) if responses else state.get("response", ""),
+        "history": histories,
+        "active_document": get_workspace().active or ""
     }
+    if workspace_changed:
+        # Gli altri documenti aperti cambiano solo quando cambia il documento attivo: vengono salvati solo ora
+        update["open_documents"] = get_workspace().inactive_documents()
+    return update
     
 
 def should_continue(state) -> str:
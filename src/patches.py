@@ -0,0 +1,137 @@
+import json
+from src.sections import *
+
+class PatchError(ValueError):
+    """
+    Errore sollevato quando una patch del modificatore non è valida o non può essere applicata.
+    """
+
+# Operazioni supportate e chiavi obbligatorie per ciascuna
+PATCH_OPERATIONS = {
+    "replace_section": ("heading", "content"),
+    "insert_before": ("heading", "content"),
+    "insert_after": ("heading", "content"),
+    "delete_section": ("heading",),
+    "replace_text": ("old", "new"),
+    "delete_text": ("old",),
+    "replace_document": ("content",),
+}
+
+def parse_patch(llm_output: str) -> list[dict]:
+    """
+    Interpreta l'output del modificatore come lista JSON di operazioni e ne valida la struttura.
+
+    Raises:
+        PatchError: Se l'output non è una lista di operazioni valide.
+    """
+    text = llm_output.strip()
+    if text.startswith("```"):
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```")
+
+    try:
+        # strict=False accetta gli a capo non escapati che i modelli inseriscono spesso nelle stringhe
+        operations = json.loads(text, strict=False)
+    except json.JSONDecodeError as e:
+        raise PatchError(f"Patch non in formato JSON: {e}")
+
+    if not isinstance(operations, list):
+        raise PatchError("La patch deve essere una lista di operazioni.")
+    if not operations:
+        # Una patch vuota lascerebbe il documento invariato ignorando il comando
+        raise PatchError("La patch non contiene operazioni.")
+
+    for operation in operations:
+        if not isinstance(operation, dict) or operation.get("op") not in PATCH_OPERATIONS:
+            raise PatchError(f"Operazione non valida: {operation}")
+        missing = [key for key in PATCH_OPERATIONS[operation["op"]] if not isinstance(operation.get(key), str)]
+        if missing:
+            raise PatchError(f"Operazione '{operation['op']}' senza le chiavi {missing}.")
+
+    return operations
+
+def find_patch_section(document: str, heading: str) -> Section:
+    """
+    Restituisce la sezione a cui è ancorata un'operazione; il titolo può includere i '#'.
+    Il titolo deve corrispondere esattamente (dopo la normalizzazione): una patch su un'ancora
+    approssimata modificherebbe una sezione diversa da quella richiesta.
+    """
+    section = find_section(build_section_index(document), heading.lstrip("#").strip(), fuzzy=False)
+    if section is None:
+        raise PatchError(f"Sezione '{heading}' non trovata.")
+    return section
+
+def find_unique_text(document: str, text: str) -> int:
+    """
+    Restituisce la posizione di un frammento di testo, che deve comparire una sola volta nel documento.
+    """
+    if not text:
+        raise PatchError("Il testo da sostituire è vuoto.")
+    position = document.find(text)
+    if position == -1:
+        raise PatchError(f"Testo non trovato nel documento: '{text[:60]}'")
+    if document.find(text, position + 1) != -1:
+        raise PatchError(f"Testo ambiguo, compare più volte nel documento: '{text[:60]}'")
+    return position
+
+def insert_block(document: str, position: int, content: str) -> str:
+    """
+    Inserisce un blocco markdown in una posizione, separandolo con una riga vuota dal testo adiacente.
+    """
+    before = document[:position].rstrip("\n")
+    after = document[position:].lstrip("\n")
+    block = content.strip("\n")
+    parts = [part for part in (before, block, after) if part]
+    result = "\n\n".join(parts)
+    if (after or document.endswith("\n")) and not result.endswith("\n"):
+        result += "\n"
+    return result
+
+def apply_patch(document: str, operations: list[dict], scoped: bool = False) -> str:
+    """
+    Applica in ordine le operazioni di una patch al documento.
+    Con `scoped` il testo è solo una parte del documento (una sezione o un blocco):
+    in quel caso non si può sostituire l'intero documento.
+
+    Raises:
+        PatchError: Se un'operazione non può essere applicata (ancora mancante o ambigua).
+    """
+    for operation in operations:
+        op = operation["op"]
+
+        if op == "replace_document":
+            if scoped:
+                raise PatchError("'replace_document' non è ammessa quando si modifica solo una parte del documento.")
+            document = operation["content"].strip("\n") + "\n"
+
+        elif op == "replace_section":
+            section = find_patch_section(document, operation["heading"])
+            document = splice(document, section.start, section.end, operation["content"])
+
+        elif op == "delete_section":
+            section = find_patch_section(document, operation["heading"])
+            document = remove_section(document, section)
+
+        elif op in ("insert_before", "insert_after"):
+            if not operation["heading"].strip():
+                # Senza titolo di riferimento si aggiunge in fondo (o in testa) al documento
+                position = len(document) if op == "insert_after" else 0
+            else:
+                section = find_patch_section(document, operation["heading"])
+                position = section.end if op == "insert_after" else section.start
+            document = insert_block(document, position, operation["content"])
+
+        elif op == "replace_text":
+            position = find_unique_text(document, operation["old"])
+            document = document[:position] + operation["new"] + document[position + len(operation["old"]):]
+
+        elif op == "delete_text":
+            position = find_unique_text(document, operation["old"])
+            document = document[:position] + document[position + len(operation["old"]):]
+
+    return document
+
+def estimate_tokens(text: str) -> int:
+    """
+    Stima approssimativa del numero di token di un testo (circa 4 caratteri per token).
+    """
+    return max(1, len(text) // 4)
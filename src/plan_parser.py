@@ -0,0 +1,62 @@
+import json
+
+class IncrementalPlanParser:
+    """
+    Parser incrementale di un piano JSON (lista di dizionari) ricevuto in streaming.
+    Ogni volta che un passo del piano viene chiuso, `feed` lo restituisce subito,
+    senza attendere la fine della lista. Il testo prima della '[' (es. "```json") viene ignorato.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.step_start = None
+        self.started = False
+        self.finished = False
+
+    def feed(self, chunk: str) -> list[dict]:
+        """
+        Aggiunge un frammento di testo e restituisce i passi completati al suo interno.
+        I passi che non sono JSON valido vengono ignorati.
+        """
+        self.buffer += chunk
+        steps = []
+
+        while self.position < len(self.buffer) and not self.finished:
+            char = self.buffer[self.position]
+
+            if not self.started:
+                if char == "[":
+                    self.started = True
+                    self.depth = 1
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                if self.depth == 1 and char == "{":
+                    self.step_start = self.position
+                self.depth += 1
+            elif char in "}]":
+                self.depth -= 1
+                if self.depth == 1 and char == "}" and self.step_start is not None:
+                    try:
+                        step = json.loads(self.buffer[self.step_start:self.position + 1])
+                        if isinstance(step, dict):
+                            steps.append(step)
+                    except json.JSONDecodeError:
+                        pass
+                    self.step_start = None
+                elif self.depth == 0:
+                    self.finished = True
+
+            self.position += 1
+
+        return steps
@@ -0,0 +1,190 @@
+import os
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from httpx import HTTPStatusError
+from src.metrics import metrics
+
+# Limiti di default per modello: (richieste al secondo, burst massimo)
+DEFAULT_RATE_LIMIT = (1.0, 5)
+RATE_LIMITS = {
+    "mistral-small-latest": (1.0, 5),
+    "mistral-medium-latest": (1.0, 5),
+    "mistral-large-latest": (1.0, 5),
+}
+
+# Codici HTTP per cui ha senso ritentare la richiesta
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+def parse_rate_limits(value: str) -> dict:
+    """
+    Interpreta la variabile d'ambiente MISTRAL_RATE_LIMITS, nel formato
+    "modello=richieste_al_secondo:burst,modello2=...". Le voci malformate vengono ignorate.
+    """
+    limits = {}
+    for item in value.split(","):
+        name, _, limit = item.partition("=")
+        rate, _, burst = limit.partition(":")
+        try:
+            limits[name.strip()] = (float(rate), int(burst or 1))
+        except ValueError:
+            continue
+    return limits
+
+class TokenBucket:
+    """
+    Token bucket thread-safe con velocità adattiva: la velocità si dimezza a ogni risposta
+    429 e torna gradualmente al valore configurato dopo le richieste andate a buon fine.
+    """
+    def __init__(self, rate: float, capacity: int):
+        self.max_rate = rate
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self):
+        """
+        Attende finché non è disponibile un token, poi lo consuma.
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self.blocked_until - now
+                if wait <= 0 and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(wait, (1 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def throttle(self, pause: float = 0.0):
+        """
+        Riduce la velocità dopo un rifiuto del server e sospende le richieste per `pause` secondi.
+        """
+        with self._lock:
+            self.rate = max(self.max_rate / 16, self.rate / 2)
+            self.tokens = min(self.tokens, 1.0)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + pause)
+
+    def recover(self):
+        """
+        Riporta gradualmente la velocità verso il valore configurato.
+        """
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate * 1.1)
+
+class RetryPolicy:
+    """
+    Politica di retry con backoff esponenziale e jitter; rispetta l'header Retry-After se presente.
+    """
+    def __init__(self, max_retries: int = 5, base_delay: float = 1.0, max_delay: float = 60.0):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def should_retry(self, error: Exception, attempt: int) -> bool:
+        return (
+            attempt < self.max_retries
+            and isinstance(error, HTTPStatusError)
+            and error.response.status_code in RETRYABLE_STATUS_CODES
+        )
+
+    def delay(self, error: HTTPStatusError, attempt: int) -> float:
+        retry_after = parse_retry_after(error.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # "Full jitter": attesa casuale fino al backoff esponenziale
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Converte l'header Retry-After (secondi oppure data HTTP) in secondi di attesa.
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+def get_rate_limiter(model_name: str) -> TokenBucket:
+    """
+    Restituisce il token bucket condiviso per il modello indicato, creandolo alla prima richiesta.
+    """
+    with _buckets_lock:
+        if model_name not in _buckets:
+            limits = {**RATE_LIMITS, **parse_rate_limits(os.getenv("MISTRAL_RATE_LIMITS", ""))}
+            _buckets[model_name] = TokenBucket(*limits.get(model_name, DEFAULT_RATE_LIMIT))
+        return _buckets[model_name]
+
+retry_policy = RetryPolicy(max_retries=int(os.getenv("MISTRAL_MAX_RETRIES", "5")))
+
+def wait_before_retry(error: HTTPStatusError, attempt: int, bucket: TokenBucket, model_name: str):
+    """
+    Attende prima di un nuovo tentativo; dopo un 429 rallenta anche il bucket condiviso.
+    """
+    delay = retry_policy.delay(error, attempt)
+    if error.response.status_code == 429:
+        bucket.throttle(delay)
+    metrics.increment("llm_retries_total", model=model_name, status=error.response.status_code)
+    print(f"Errore {error.response.status_code} da '{model_name}': nuovo tentativo ({attempt + 1}/{retry_policy.max_retries}) tra {delay:.1f} secondi.")
+    time.sleep(delay)
+
+def call_with_rate_limit(function, *args, model_name: str, **kwargs):
+    """
+    Esegue una chiamata al modello rispettando il rate limit condiviso del modello
+    e ritentando in caso di errori 429 o 5xx.
+    """
+    bucket = get_rate_limiter(model_name)
+    attempt = 0
+    while True:
+        bucket.acquire()
+        try:
+            result = function(*args, **kwargs)
+        except Exception as e:
+            if not retry_policy.should_retry(e, attempt):
+                raise
+            wait_before_retry(e, attempt, bucket, model_name)
+            attempt += 1
+            continue
+        bucket.recover()
+        return result
+
+def stream_with_rate_limit(function, *args, model_name: str, **kwargs):
+    """
+    Come `call_with_rate_limit`, ma per le chiamate in streaming: restituisce i frammenti
+    man mano che arrivano. Si ritenta solo se l'errore arriva prima del primo frammento.
+    """
+    bucket = get_rate_limiter(model_name)
+    attempt = 0
+    while True:
+        bucket.acquire()
+        started = False
+        try:
+            for chunk in function(*args, **kwargs):
+                started = True
+                yield chunk
+        except Exception as e:
+            if started or not retry_policy.should_retry(e, attempt):
+                raise
+            wait_before_retry(e, attempt, bucket, model_name)
+            attempt += 1
+            continue
+        bucket.recover()
+        return
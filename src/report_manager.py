@@ -1,5 +1,9 @@
+import os
+import sqlite3
 from typing import TypedDict
 from src.nodes import *
+from src.workspace import Workspace, current_workspace
+from contextvars import copy_context
 
 class ConfigSchema(TypedDict):
     input: str
@@ -7,9 +11,32 @@ class ConfigSchema(TypedDict):
     past_steps: list[str]
     response: str
     document_content: str
-    
+    history: dict          # per documento, le differenze annullabili ("undo") e ripristinabili ("redo")
+    active_document: str   # nome del documento attivo nel workspace
+    open_documents: dict   # gli altri documenti aperti nel workspace: nome -> contenuto
+
+def create_checkpointer(path: str | None = None):
+    """
+    Crea il checkpointer che salva lo stato delle sessioni dopo ogni nodo del grafo.
+    Le sessioni sono salvate in un database SQLite (CHECKPOINT_PATH); con un percorso vuoto,
+    o senza il pacchetto langgraph-checkpoint-sqlite, restano solo in memoria.
+    """
+    if path is None:
+        path = os.getenv("CHECKPOINT_PATH", ".cache/sessions.sqlite")
+    if path:
+        try:
+            from langgraph.checkpoint.sqlite import SqliteSaver
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            return SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+        except ImportError:
+            print("Errore: Libreria 'langgraph-checkpoint-sqlite' non installata. Le sessioni non verranno salvate su disco.")
+
+    from langgraph.checkpoint.memory import InMemorySaver
+    return InMemorySaver()
+
 class ReportManager():
-    def __init__(self):
+    def __init__(self, session_id: str = "default", checkpointer=None):
         # 1. Inizializzare il grafo con il nostro stato personalizzato
         self.workflow = StateGraph(ConfigSchema)
 
@@ -34,8 +61,9 @@ class ReportManager():
             }
         )
 
-        # 5. Compilare il grafo per renderlo eseguibile
-        self.app = self.workflow.compile()
+        # 5. Compilare il grafo per renderlo eseguibile; lo stato di ogni sessione viene salvato dal checkpointer
+        self.app = self.workflow.compile(checkpointer=checkpointer or create_checkpointer())
+        self.config = {"configurable": {"thread_id": session_id}}
 
         # Definiamo lo stato iniziale con il comando e il documento vuoto
         self.current_state: ConfigSchema = {
@@ -43,16 +71,91 @@ class ReportManager():
             "plan": [],
             "past_steps": [],
             "response": "",
-            "document_content": ""
+            "document_content": "",
+            "history": {},
+            "active_document": "",
+            "open_documents": {}
         }
+
+        # Documenti aperti nella sessione; `document_content` è sempre il contenuto del documento attivo
+        self.workspace = Workspace()
+
+        # Se la sessione esiste già, si riprende dall'ultimo stato salvato
+        saved_state = self.app.get_state(self.config).values
+        if saved_state:
+            self.current_state.update(saved_state)
+            self.current_state["plan"] = []
+            for name, content in self.current_state["open_documents"].items():
+                self.workspace.put(name, content)
+            if self.current_state["document_content"] or self.current_state["active_document"]:
+                self.workspace.open(self.current_state["active_document"] or UNTITLED_DOCUMENT, self.current_state["document_content"])
+            print(f"Sessione '{session_id}' ripresa.")
+
+        # Metriche condivise da nodi, tool e agenti (durate, chiamate all'LLM, token, retry, cache)
+        self.metrics = metrics
         
     def run(self, input):
+        token = current_workspace.set(self.workspace)
         try:
             self.current_state["input"] = input
-            self.current_state = self.app.invoke(self.current_state)
+            with metrics.timer("run_seconds"):
+                self.current_state = self.app.invoke(self.current_state, self.config)
         except Exception as e:
+            metrics.increment("run_failures_total", reason=type(e).__name__)
             self.current_state['response'] = str(e)
+        finally:
+            self.workspace.sync_active(self.current_state["document_content"])
+            current_workspace.reset(token)
         
+    def stream(self, input):
+        """
+        Esegue il grafo come `run`, ma restituisce gli eventi man mano che avvengono:
+        - {"type": "planner", "plan": [...]}: piano generato;
+        - {"type": "step", "steps": [...], "response": ...}: passi eseguiti;
+        - {"type": "token", "agent": ..., "content": ...}: token generati da un agente;
+        - {"type": "end", "answer": ..., "document": ...}: fine dell'esecuzione.
+        """
+        # Il grafo viene eseguito in un contesto dedicato, in cui è impostato il workspace della sessione
+        context = copy_context()
+        context.run(current_workspace.set, self.workspace)
+        try:
+            self.current_state["input"] = input
+            stream = context.run(self.app.stream, self.current_state, self.config, stream_mode=["updates", "messages", "values"], subgraphs=True)
+            while (event := context.run(next, stream, None)) is not None:
+                namespace, mode, chunk = event
+                if mode == "messages":
+                    # Token generati dal planner o dagli agenti chiamati dai tool
+                    message, metadata = chunk
+                    if metadata.get("agent_name") and message.content:
+                        yield {"type": "token", "agent": metadata["agent_name"], "content": message.content}
+                elif namespace:
+                    # Aggiornamenti interni degli agenti: non fanno parte dello stato del grafo
+                    continue
+                elif mode == "values":
+                    self.current_state = chunk
+                else:
+                    for node, update in chunk.items():
+                        update = update or {}
+                        if node == "planner":
+                            yield {"type": "planner", "plan": [step for step, _ in update.get("past_steps", [])] + list(update.get("plan", []))}
+                        if update.get("past_steps"):
+                            yield {"type": "step", "steps": [step for step, _ in update["past_steps"]], "response": update.get("response", "")}
+        except Exception as e:
+            metrics.increment("run_failures_total", reason=type(e).__name__)
+            self.current_state['response'] = str(e)
+
+        self.workspace.sync_active(self.current_state["document_content"])
+        yield {"type": "end", "answer": self.get_answer(), "document": self.get_md_document()}
+
+    def export_metrics(self, format: str = "jsonl") -> str:
+        """
+        Restituisce le metriche raccolte: eventi in JSON lines ("jsonl")
+        oppure un'istantanea nel formato testuale di Prometheus ("prometheus").
+        """
+        if format == "prometheus":
+            return self.metrics.to_prometheus()
+        return self.metrics.to_json_lines()
+
     def get_answer(self):
         
         if self.current_state['response'] == "markdown":
@@ -0,0 +1,96 @@
+import re
+from collections import Counter
+from src.sections import *
+
+# Percorsi con cui può essere servita una richiesta di recupero
+STRUCTURAL_PATH = "strutturale"
+AGENT_PATH = "agente"
+
+# Contatori delle richieste servite da ciascun percorso
+retrieval_path_counts = Counter()
+
+class RetrievalAnswer(str):
+    """
+    Risposta di `retrieve_document`: il testo della risposta, con il percorso che l'ha servita (`path`).
+    Il percorso viene riportato nei passi eseguiti del grafo, insieme al passo.
+    """
+    path: str
+
+    def __new__(cls, text: str, path: str):
+        answer = super().__new__(cls, text)
+        answer.path = path
+        return answer
+
+# I pattern lavorano sul testo normalizzato (minuscolo, senza accenti e punteggiatura)
+LIST_SECTIONS_PATTERN = re.compile(
+    r"\b(elenca|elenco|lista|indice|sommario|struttura)\b.*\b(sezion[ie]|capitol[oi]|titol[oi]|paragraf[oi]|documento)\b"
+    r"|\b(quali|che) (sono le )?(sezioni|capitoli|titoli)\b"
+    r"|\b(mostra(mi)?|visualizza|dammi) (tutte )?(le sezioni|i capitoli|i titoli|l indice)\b"
+)
+SHOW_DOCUMENT_PATTERN = re.compile(
+    r"^(mostra(mi)?|visualizza|leggi|fammi vedere|stampa|dammi) (tutto )?(il |l )?(intero )?(documento|report)( intero| completo| corrente| attuale)?$"
+)
+SHOW_SECTION_PATTERN = re.compile(
+    r"^(mostra(mi)?|visualizza|leggi|leggimi|fammi vedere|stampa|dammi) (il contenuto (della|del|di) )?"
+    r"(la |il |l |le |i )?(?P<explicit>(sezione|capitolo|paragrafo) )?(?P<name>.+)$"
+)
+LEADING_ARTICLE_PATTERN = re.compile(r"^(la|il|lo|l|le|i|gli) ")
+
+def list_sections_text(sections: list[Section]) -> str:
+    """
+    Restituisce l'elenco delle sezioni come lista markdown, indentata per livello.
+    """
+    base_level = min(s.level for s in sections)
+    return "\n".join(f"{'  ' * (s.level - base_level)}- {s.title}" for s in sections)
+
+def section_not_found_text(name: str, sections: list[Section]) -> str:
+    """
+    Messaggio di errore per una sezione inesistente, con l'elenco delle sezioni disponibili.
+    """
+    if not sections:
+        return f"Non ho trovato la sezione '{name}': il documento non contiene sezioni."
+    available = ", ".join(s.title for s in sections)
+    return f"Non ho trovato la sezione '{name}'. Le sezioni disponibili sono: {available}."
+
+def answer_structural_query(query: str, document: str) -> str | None:
+    """
+    Risponde in modo deterministico, senza chiamare l'LLM, alle richieste puramente
+    strutturali: elenco delle sezioni, visualizzazione del documento o di una sezione.
+
+    Args:
+        query (str): La richiesta dell'utente.
+        document (str): Il documento markdown corrente.
+
+    Returns:
+        str | None: La risposta, oppure None se la richiesta richiede un'analisi semantica
+        e va quindi inoltrata all'agente.
+    """
+    normalized = normalize_title(query)
+    if not normalized:
+        return None
+
+    if not document.strip():
+        if LIST_SECTIONS_PATTERN.search(normalized) or SHOW_DOCUMENT_PATTERN.match(normalized):
+            return "Il documento corrente è vuoto."
+        return None
+
+    sections = build_section_index(document)
+
+    if SHOW_DOCUMENT_PATTERN.match(normalized):
+        return document
+
+    if LIST_SECTIONS_PATTERN.search(normalized):
+        if not sections:
+            return "Il documento corrente non contiene sezioni."
+        return list_sections_text(sections)
+
+    show = SHOW_SECTION_PATTERN.match(normalized)
+    if show:
+        name = LEADING_ARTICLE_PATTERN.sub("", show.group("name"))
+        section = find_section(sections, name)
+        if section:
+            return document[section.start:section.end].strip()
+        if show.group("explicit"):
+            return section_not_found_text(name, sections)
+
+    return None
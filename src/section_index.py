@@ -0,0 +1,242 @@
+import os
+import math
+import hashlib
+import threading
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, replace
+from src.sections import *
+
+# Numero di sezioni inviate all'agente di recupero e dimensione minima (caratteri) del documento per usare l'indice
+RETRIEVAL_TOP_K = int(os.getenv("RETRIEVAL_TOP_K", "4"))
+RETRIEVAL_INDEX_MIN_CHARS = int(os.getenv("RETRIEVAL_INDEX_MIN_CHARS", "8000"))
+# Cartella di un modello di embedding locale (transformers, feature-extraction); vuoto per usare solo BM25
+SECTION_EMBEDDING_MODEL = os.getenv("SECTION_EMBEDDING_MODEL", "")
+
+# Parametri standard di BM25
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Parole troppo frequenti per distinguere una sezione dall'altra
+STOP_WORDS = set("""
+a ad al alla alle allo agli ai che chi ci come con cosa da dal dalla dalle dai degli dei del della delle dello di
+do e ed gli ha hanno ho i il in la le li lo ma mi ne nei nel nella nelle nello no non o per piu quale quali quando
+quello questa questo se si sono su sul sulla sulle tra un una uno vi dice dicono documento sezione mostrami dimmi
+""".split())
+
+def tokenize(text: str) -> list[str]:
+    """
+    Parole normalizzate (minuscole, senza accenti e punteggiatura) del testo, senza le parole vuote.
+    """
+    return [word for word in normalize_title(text).split() if word not in STOP_WORDS and len(word) > 1]
+
+@dataclass
+class IndexedSection:
+    """
+    Una porzione del documento indicizzata: il titolo di una sezione e il suo testo fino al titolo successivo.
+    """
+    key: str              # hash di titolo e contenuto: se non cambia, la voce viene riutilizzata
+    title: str
+    start: int
+    end: int
+    terms: Counter
+    length: int           # numero di parole indicizzate
+    embedding: list | None = None
+
+class EmbeddingModel:
+    """
+    Modello di embedding locale, caricato da disco alla prima richiesta (transformers è un import pesante).
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self._pipeline = None
+        self._lock = threading.Lock()
+
+    def embed(self, texts: list[str]) -> list[list[float]]:
+        with self._lock:
+            if self._pipeline is None:
+                from transformers import pipeline
+
+                print(f"Caricamento del modello di embedding da '{self.path}'...")
+                self._pipeline = pipeline("feature-extraction", model=self.path, local_files_only=True)
+            outputs = self._pipeline(texts, truncation=True)
+
+        vectors = []
+        for output in outputs:
+            # Media degli embedding dei token, normalizzata per il prodotto scalare
+            tokens = output[0]
+            vector = [sum(values) / len(tokens) for values in zip(*tokens)]
+            norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+            vectors.append([v / norm for v in vector])
+        return vectors
+
+_embedding_model = None
+
+def get_embedding_model() -> EmbeddingModel | None:
+    """
+    Restituisce il modello di embedding configurato (SECTION_EMBEDDING_MODEL), oppure None.
+    """
+    global _embedding_model
+    if _embedding_model is None and SECTION_EMBEDDING_MODEL:
+        _embedding_model = EmbeddingModel(SECTION_EMBEDDING_MODEL)
+    return _embedding_model
+
+class SectionIndex:
+    """
+    Indice di ricerca sulle sezioni di un documento: BM25 sulle parole e, se è configurato
+    un modello locale, similarità tra embedding.
+    L'indice è incrementale: a ogni aggiornamento vengono analizzate solo le sezioni il cui
+    titolo o contenuto è cambiato; le altre riusano parole ed embedding già calcolati.
+    """
+    def __init__(self, embedding_model: EmbeddingModel | None = None):
+        self.embedding_model = embedding_model
+        self.entries: list[IndexedSection] = []
+        self.document_frequency = Counter()  # parola -> numero di sezioni che la contengono
+        self._lock = threading.RLock()
+
+    def update(self, document: str) -> int:
+        """
+        Allinea l'indice al documento.
+
+        Returns:
+            int: Il numero di sezioni (nuove o modificate) analizzate.
+        """
+        sections = build_section_index(document)
+        spans = []
+        if not sections or sections[0].start > 0:
+            spans.append(("", 0, sections[0].start if sections else len(document)))
+        for i, section in enumerate(sections):
+            end = sections[i + 1].start if i + 1 < len(sections) else len(document)
+            spans.append((section.title, section.start, end))
+
+        with self._lock:
+            previous = {}
+            for entry in self.entries:
+                previous.setdefault(entry.key, []).append(entry)
+
+            entries, added = [], []
+            for title, start, end in spans:
+                text = document[start:end]
+                if not text.strip():
+                    continue
+                key = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                if previous.get(key):
+                    entry = previous[key].pop()
+                    entry.start, entry.end = start, end
+                else:
+                    terms = Counter(tokenize(text) + tokenize(title))
+                    entry = IndexedSection(key, title, start, end, terms, sum(terms.values()))
+                    added.append(entry)
+                entries.append(entry)
+
+            # Le frequenze delle parole vengono aggiornate solo per le sezioni rimosse e aggiunte
+            for removed in previous.values():
+                for entry in removed:
+                    self.document_frequency.subtract(entry.terms.keys())
+            for entry in added:
+                self.document_frequency.update(entry.terms.keys())
+            self.document_frequency = +self.document_frequency
+
+            if self.embedding_model is not None and added:
+                vectors = self.embedding_model.embed([document[e.start:e.end] for e in added])
+                for entry, vector in zip(added, vectors):
+                    entry.embedding = vector
+
+            self.entries = entries
+        return len(added)
+
+    def update_and_search(self, document: str, query: str, k: int | None = None) -> tuple[int, list[IndexedSection]]:
+        """
+        Allinea l'indice al documento e cerca le sezioni pertinenti alla domanda in un'unica operazione,
+        così che gli offset restituiti si riferiscano proprio a `document` anche con ricerche concorrenti.
+
+        Returns:
+            tuple[int, list[IndexedSection]]: Il numero di sezioni analizzate e le sezioni trovate.
+        """
+        with self._lock:
+            return self.update(document), self.search(query, k)
+
+    def search(self, query: str, k: int | None = None) -> list[IndexedSection]:
+        """
+        Restituisce le `k` sezioni più pertinenti alla domanda, in ordine di pertinenza.
+        Con il modello di embedding i punteggi di BM25 e della similarità vengono combinati;
+        senza, le sezioni che non contengono nessuna parola della domanda vengono escluse.
+        Le sezioni restituite sono copie: i loro offset non cambiano con gli aggiornamenti successivi.
+        """
+        if k is None:
+            k = RETRIEVAL_TOP_K
+        with self._lock:
+            entries = [replace(e) for e in self.entries]
+            frequency = self.document_frequency
+        if not entries:
+            return []
+
+        terms = tokenize(query)
+        count = len(entries)
+        average_length = sum(e.length for e in entries) / count or 1.0
+        scores = []
+        for entry in entries:
+            score = 0.0
+            for term in terms:
+                tf = entry.terms.get(term, 0)
+                if not tf:
+                    continue
+                df = frequency.get(term, 0)
+                idf = math.log(1 + (count - df + 0.5) / (df + 0.5))
+                score += idf * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * entry.length / average_length))
+            scores.append(score)
+
+        if self.embedding_model is not None and all(e.embedding is not None for e in entries):
+            query_vector = self.embedding_model.embed([query])[0]
+            best = max(scores) or 1.0
+            # I punteggi BM25 vengono riportati tra 0 e 1 per essere sommati alla similarità del coseno
+            scores = [
+                score / best + sum(a * b for a, b in zip(query_vector, entry.embedding))
+                for score, entry in zip(scores, entries)
+            ]
+            ranked = sorted(range(count), key=lambda i: scores[i], reverse=True)
+        else:
+            ranked = sorted((i for i in range(count) if scores[i] > 0), key=lambda i: scores[i], reverse=True)
+        return [entries[i] for i in ranked[:k]]
+
+class SectionIndexCache:
+    """
+    Indici delle sezioni dei documenti usati di recente in un workspace, uno per documento.
+    """
+    def __init__(self, max_size: int = 16):
+        self.max_size = max_size
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> SectionIndex:
+        with self._lock:
+            index = self._indexes.get(name)
+            if index is None:
+                index = SectionIndex(get_embedding_model())
+                self._indexes[name] = index
+            self._indexes.move_to_end(name)
+            while len(self._indexes) > self.max_size:
+                self._indexes.popitem(last=False)
+            return index
+
+    def discard(self, name: str):
+        with self._lock:
+            self._indexes.pop(name, None)
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+def relevant_sections_text(document: str, sections: list[IndexedSection]) -> str:
+    """
+    Testo delle sezioni trovate, nell'ordine in cui compaiono nel documento, separate da "[...]" dove è stato omesso del testo.
+    """
+    parts = []
+    last_end = 0
+    for entry in sorted(sections, key=lambda e: e.start):
+        if entry.start > last_end:
+            parts.append("[...]")
+        parts.append(document[entry.start:entry.end].strip("\n"))
+        last_end = entry.end
+    if last_end < len(document.rstrip()):
+        parts.append("[...]")
+    return "\n\n".join(parts)
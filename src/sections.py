@@ -0,0 +1,215 @@
+import re
+import difflib
+import unicodedata
+from dataclasses import dataclass
+
+# Titoli ATX (`# Titolo`), fino a 3 spazi di indentazione come da CommonMark
+HEADING_PATTERN = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.+?)[ \t]*#*[ \t]*$")
+FENCE_PATTERN = re.compile(r"^ {0,3}(```|~~~)")
+
+@dataclass
+class Section:
+    """
+    Una sezione del documento markdown, individuata dal suo titolo.
+    Gli offset sono posizioni (in caratteri) nella stringa del documento.
+    """
+    level: int       # numero di '#' del titolo
+    title: str       # testo del titolo, senza '#'
+    start: int       # inizio della riga del titolo
+    body_start: int  # inizio del contenuto, subito dopo la riga del titolo
+    end: int         # fine della sezione, sotto-sezioni comprese
+    parent: int | None = None  # indice della sezione genitore nell'indice
+
+def build_section_index(document: str) -> list[Section]:
+    """
+    Costruisce l'indice delle sezioni (albero dei titoli con offset) del documento markdown.
+    I titoli all'interno dei blocchi di codice vengono ignorati.
+
+    Args:
+        document (str): Il contenuto del documento markdown.
+
+    Returns:
+        list[Section]: Le sezioni in ordine di apparizione.
+    """
+    sections = []
+    in_fence = None
+    offset = 0
+
+    for line in document.splitlines(keepends=True):
+        fence = FENCE_PATTERN.match(line)
+        if fence:
+            if in_fence is None:
+                in_fence = fence.group(1)
+            elif fence.group(1) == in_fence:
+                in_fence = None
+        elif in_fence is None:
+            heading = HEADING_PATTERN.match(line.rstrip("\r\n"))
+            if heading:
+                sections.append(Section(
+                    level=len(heading.group(1)),
+                    title=heading.group(2).strip(),
+                    start=offset,
+                    body_start=offset + len(line),
+                    end=len(document)
+                ))
+        offset += len(line)
+
+    # Una sezione termina dove inizia la successiva di livello uguale o superiore
+    stack = []
+    for i, section in enumerate(sections):
+        while stack and sections[stack[-1]].level >= section.level:
+            sections[stack.pop()].end = section.start
+        section.parent = stack[-1] if stack else None
+        stack.append(i)
+
+    return sections
+
+def format_outline(sections: list[Section]) -> str:
+    """
+    Restituisce una rappresentazione compatta dell'albero dei titoli, una riga per sezione.
+    """
+    return "\n".join(f"{'  ' * (s.level - 1)}{'#' * s.level} {s.title}" for s in sections)
+
+def normalize_title(text: str) -> str:
+    """
+    Normalizza un titolo (o un testo) per il confronto: minuscole, senza accenti,
+    senza formattazione markdown e punteggiatura, spazi compattati.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text.casefold())
+    return " ".join(text.split())
+
+def title_digits(text: str) -> list[str]:
+    """
+    Numeri contenuti in un titolo (es. "Capitolo 4" -> ["4"]): titoli con numeri diversi non sono mai equivalenti.
+    """
+    return re.findall(r"\d+", text)
+
+def find_section(sections: list[Section], name: str, cutoff: float = 0.75, fuzzy: bool = True) -> Section | None:
+    """
+    Cerca la sezione il cui titolo corrisponde meglio a `name`.
+    Prova prima il confronto esatto (normalizzato), poi, se `fuzzy` è True, quello approssimato:
+    la corrispondenza approssimata è accettata solo se è l'unica sopra la soglia e se i numeri
+    del titolo coincidono (es. "Capitolo 4" non corrisponde mai a "Capitolo 1").
+
+    Returns:
+        Section | None: La sezione trovata, oppure None se nessun titolo corrisponde senza ambiguità.
+    """
+    target = normalize_title(name)
+    if not target:
+        return None
+
+    for section in sections:
+        if normalize_title(section.title) == target:
+            return section
+    if not fuzzy:
+        return None
+
+    candidates = [
+        section for section in sections
+        if title_digits(normalize_title(section.title)) == title_digits(target)
+        and difflib.SequenceMatcher(None, normalize_title(section.title), target).ratio() > cutoff
+    ]
+    return candidates[0] if len(candidates) == 1 else None
+
+def sections_in_text(sections: list[Section], text: str) -> list[Section]:
+    """
+    Restituisce le sezioni i cui titoli sono citati nel testo (es. un comando dell'utente).
+    Le sotto-sezioni di una sezione già citata vengono escluse, perché già contenute in essa.
+    """
+    normalized_text = f" {normalize_title(text)} "
+    found = []
+    for section in sections:
+        title = normalize_title(section.title)
+        if len(title) >= 3 and f" {title} " in normalized_text:
+            found.append(section)
+
+    return [
+        s for s in found
+        if not any(o is not s and o.start <= s.start and s.end <= o.end for o in found)
+    ]
+
+def splice(document: str, start: int, end: int, replacement: str) -> str:
+    """
+    Sostituisce la porzione di documento [start, end) con `replacement`,
+    mantenendo la spaziatura che separava la porzione dal resto del documento.
+    Se `replacement` è vuoto la porzione viene rimossa.
+    """
+    replacement = replacement.strip("\n")
+    if not replacement.strip():
+        return document[:start] + document[end:]
+
+    original = document[start:end]
+    trailing = original[len(original.rstrip()):]
+    if end < len(document) and not trailing:
+        trailing = "\n"
+    return document[:start] + replacement + trailing + document[end:]
+
+def replace_heading(document: str, section: Section, new_title: str) -> str:
+    """
+    Rinomina una sezione sostituendo il solo testo del titolo; il contenuto resta invariato.
+    """
+    heading_line = document[section.start:section.body_start]
+    newline = heading_line[len(heading_line.rstrip("\r\n")):]
+    return document[:section.start] + f"{'#' * section.level} {new_title.strip()}{newline}" + document[section.body_start:]
+
+def shift_headings(block: str, min_level: int) -> str:
+    """
+    Abbassa i titoli di un blocco markdown in modo che il titolo più alto sia almeno di livello `min_level`
+    (massimo 6), mantenendo la gerarchia relativa; serve a inserire il blocco sotto una sezione esistente.
+    """
+    sections = build_section_index(block)
+    if not sections:
+        return block
+    delta = min_level - min(s.level for s in sections)
+    if delta <= 0:
+        return block
+
+    for section in reversed(sections):
+        heading_line = block[section.start:section.body_start]
+        newline = heading_line[len(heading_line.rstrip("\r\n")):]
+        level = min(6, section.level + delta)
+        block = block[:section.start] + f"{'#' * level} {section.title}{newline}" + block[section.body_start:]
+    return block
+
+def remove_section(document: str, section: Section) -> str:
+    """
+    Elimina una sezione, sotto-sezioni comprese.
+    """
+    if section.end >= len(document):
+        # Ultima sezione: si elimina anche la riga vuota che la separava dalla precedente
+        before = document[:section.start].rstrip("\n")
+        return before + "\n" if before else ""
+    return document[:section.start] + document[section.end:]
+
+def relocate_section(document: str, section: Section, target_title: str, position: str = "after") -> str:
+    """
+    Sposta una sezione (con le sue sotto-sezioni) prima o dopo la sezione `target_title`.
+
+    Raises:
+        ValueError: Se la posizione non è valida, se la sezione di destinazione non esiste
+        o se è contenuta nella sezione da spostare.
+    """
+    if position not in ("before", "after"):
+        raise ValueError(f"Posizione '{position}' non valida: usa 'before' oppure 'after'.")
+
+    block = document[section.start:section.end].rstrip("\n") + "\n\n"
+    remaining = remove_section(document, section)
+
+    # La sezione di destinazione deve corrispondere esattamente: uno spostamento non va mai indovinato
+    remaining_sections = build_section_index(remaining)
+    target = find_section(remaining_sections, target_title, fuzzy=False)
+    if target is None:
+        available = ", ".join(s.title for s in remaining_sections) or "nessuna"
+        raise ValueError(f"Sezione di destinazione '{target_title}' non trovata o contenuta nella sezione da spostare. "
+                         f"Le sezioni disponibili sono: {available}.")
+
+    insert_at = target.start if position == "before" else target.end
+    before = remaining[:insert_at]
+    if before and not before.endswith("\n\n"):
+        before = before.rstrip("\n") + "\n\n"
+    after = remaining[insert_at:]
+    if not after:
+        block = block.rstrip("\n") + "\n"
+    return before + block + after
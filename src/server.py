@@ -0,0 +1,344 @@
+"""
+API HTTP asincrona e senza interfaccia grafica sul grafo planner/executor.
+
+Endpoint (il tenant è indicato dall'header "X-Tenant-Id", di default "default"):
+- POST /sessions/{session_id}/run        {"input": ...}            -> {"answer", "document"}
+- POST /sessions/{session_id}/stream     {"input": ...}            -> eventi di ReportManager.stream in JSON lines
+- POST /sessions/{session_id}/export     {"format": "PDF"}         -> documento della sessione esportato
+- POST /export                           {"markdown", "format"}    -> testo markdown esportato
+- POST /transcribe?whisper_model=base    (corpo: file audio)       -> {"text"}
+- GET  /metrics                                                    -> metriche nel formato di Prometheus
+- GET  /health
+
+Le richieste vengono eseguite in due pool separati: uno per il lavoro legato all'LLM (esecuzioni
+del grafo, in gran parte attesa della rete) e uno per il lavoro di calcolo (trascrizione, PDF, DOCX).
+Ogni pool ha una coda limitata e un limite di richieste per tenant: oltre la coda il server
+risponde 503, oltre il limite del tenant 429, in entrambi i casi con l'header Retry-After.
+
+Esempio:
+    poetry run python -m src.server --port 8080
+"""
+import os
+import json
+import asyncio
+import argparse
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from aiohttp import web
+from src.report_manager import ReportManager, create_checkpointer
+from src.convert import export_cache
+from src.metrics import metrics
+
+# Thread per le esecuzioni del grafo e per il lavoro di calcolo
+SERVER_LLM_WORKERS = int(os.getenv("SERVER_LLM_WORKERS", "16"))
+SERVER_CPU_WORKERS = int(os.getenv("SERVER_CPU_WORKERS") or os.cpu_count() or 2)
+# Richieste in attesa per pool, richieste (in attesa o in esecuzione) per tenant e attesa massima in coda
+SERVER_MAX_QUEUE = int(os.getenv("SERVER_MAX_QUEUE", "64"))
+SERVER_TENANT_LIMIT = int(os.getenv("SERVER_TENANT_LIMIT", "8"))
+SERVER_QUEUE_TIMEOUT_S = float(os.getenv("SERVER_QUEUE_TIMEOUT_S", "30"))
+# Numero massimo di sessioni tenute in memoria (le altre vengono riprese dal checkpointer)
+SERVER_MAX_SESSIONS = int(os.getenv("SERVER_MAX_SESSIONS", "256"))
+# Dimensione massima (MB) del corpo di una richiesta: i file audio da trascrivere superano facilmente il limite di aiohttp (1 MB)
+SERVER_MAX_UPLOAD_MB = float(os.getenv("SERVER_MAX_UPLOAD_MB", "100"))
+
+EXPORT_CONTENT_TYPES = {
+    "PDF": "application/pdf",
+    "DOCX": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "HTML": "text/html; charset=utf-8",
+    "MD": "text/markdown; charset=utf-8",
+}
+
+class Overloaded(Exception):
+    """
+    Errore sollevato quando una richiesta non può essere accettata: coda piena (503) o limite del tenant (429).
+    """
+    def __init__(self, status: int, message: str, retry_after_s: int = 1):
+        super().__init__(message)
+        self.status = status
+        self.retry_after_s = retry_after_s
+
+class WorkerPool:
+    """
+    Pool di thread con controllo di ammissione: al più `workers` richieste in esecuzione,
+    al più `max_queue` in attesa e al più `tenant_limit` (in attesa o in esecuzione) per tenant.
+    """
+    def __init__(self, name: str, workers: int, max_queue: int, tenant_limit: int, queue_timeout_s: float):
+        self.name = name
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-pool")
+        self.max_queue = max_queue
+        self.tenant_limit = tenant_limit
+        self.queue_timeout_s = queue_timeout_s
+        self.waiting = 0
+        self.tenants = Counter()
+        self._slots = asyncio.Semaphore(workers)
+
+    @asynccontextmanager
+    async def admit(self, tenant: str, session_lock: asyncio.Lock | None = None):
+        """
+        Riserva un posto nel pool per la durata del blocco, attendendo in coda se necessario.
+        Con `session_lock` la richiesta attende prima il lock della sessione e solo dopo un posto nel pool:
+        le richieste in attesa della propria sessione contano come richieste in coda e non occupano posti.
+
+        Raises:
+            Overloaded: Se il tenant ha raggiunto il suo limite, la coda è piena o l'attesa supera il timeout.
+        """
+        if self.tenants[tenant] >= self.tenant_limit:
+            metrics.increment("server_rejected_total", pool=self.name, reason="tenant_limit")
+            raise Overloaded(429, f"Troppe richieste in corso per il tenant '{tenant}'.")
+        if (self._slots.locked() or (session_lock is not None and session_lock.locked())) and self.waiting >= self.max_queue:
+            metrics.increment("server_rejected_total", pool=self.name, reason="queue_full")
+            raise Overloaded(503, "Server sovraccarico: coda piena.")
+
+        async def acquire():
+            if session_lock is not None:
+                await session_lock.acquire()
+            try:
+                await self._slots.acquire()
+            except BaseException:
+                if session_lock is not None:
+                    session_lock.release()
+                raise
+
+        self.tenants[tenant] += 1
+        self.waiting += 1
+        try:
+            with metrics.timer("server_queue_seconds", pool=self.name):
+                try:
+                    await asyncio.wait_for(acquire(), self.queue_timeout_s)
+                except asyncio.TimeoutError:
+                    metrics.increment("server_rejected_total", pool=self.name, reason="queue_timeout")
+                    raise Overloaded(503, "Server sovraccarico: attesa in coda scaduta.")
+                finally:
+                    self.waiting -= 1
+            try:
+                yield self
+            finally:
+                self._slots.release()
+                if session_lock is not None:
+                    session_lock.release()
+        finally:
+            self.tenants[tenant] -= 1
+            if not self.tenants[tenant]:
+                del self.tenants[tenant]
+
+    async def run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    def describe(self) -> dict:
+        return {"waiting": self.waiting, "tenants": dict(self.tenants)}
+
+class SessionPool:
+    """
+    ReportManager delle sessioni usate di recente, uno per (tenant, sessione), con un lock ciascuno:
+    le richieste della stessa sessione vengono eseguite una alla volta.
+    Tutte le sessioni condividono lo stesso checkpointer, quindi una sessione scartata dalla memoria
+    viene ripresa dall'ultimo stato salvato alla richiesta successiva.
+    """
+    def __init__(self, max_sessions: int, checkpointer=None):
+        self.max_sessions = max_sessions
+        self.checkpointer = checkpointer or create_checkpointer()
+        self._sessions = OrderedDict() # (tenant, sessione) -> (ReportManager | None, asyncio.Lock)
+
+    def lock(self, tenant: str, session_id: str) -> asyncio.Lock:
+        key = (tenant, session_id)
+        if key not in self._sessions:
+            self._sessions[key] = (None, asyncio.Lock())
+        self._sessions.move_to_end(key)
+        self._evict()
+        return self._sessions[key][1]
+
+    async def get(self, tenant: str, session_id: str, lock: asyncio.Lock, pool: WorkerPool) -> ReportManager:
+        """
+        Restituisce il ReportManager della sessione, creandolo (nel pool) se necessario.
+        Va chiamata tenendo `lock`, il lock della sessione (vedi `WorkerPool.admit`); il dizionario delle sessioni viene modificato solo nel loop.
+        """
+        key = (tenant, session_id)
+        manager, _ = self._sessions.get(key, (None, None))
+        if manager is None:
+            # Il tenant fa parte dell'identificativo, così sessioni con lo stesso nome restano separate
+            manager = await pool.run(lambda: ReportManager(session_id=f"{tenant}:{session_id}", checkpointer=self.checkpointer))
+        # La voce viene (re)inserita con il lock già acquisito, anche se nel frattempo era stata scartata
+        self._sessions[key] = (manager, lock)
+        self._evict()
+        return manager
+
+    def _evict(self):
+        # Le sessioni con una richiesta in corso non vengono scartate
+        for key in list(self._sessions)[:-1]:
+            if len(self._sessions) <= self.max_sessions:
+                break
+            if not self._sessions[key][1].locked():
+                del self._sessions[key]
+
+    def __len__(self):
+        return len(self._sessions)
+
+def json_error(status: int, message: str, retry_after_s: int | None = None) -> web.Response:
+    headers = {"Retry-After": str(retry_after_s)} if retry_after_s else None
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+@web.middleware
+async def error_middleware(request, handler):
+    """
+    Converte gli errori di ammissione e di input in risposte JSON e misura la durata delle richieste.
+    """
+    route = request.match_info.route.resource.canonical if request.match_info.route.resource else "sconosciuta"
+    with metrics.timer("server_request_seconds", route=route):
+        try:
+            response = await handler(request)
+        except Overloaded as e:
+            response = json_error(e.status, str(e), e.retry_after_s)
+        except (ValueError, KeyError) as e:
+            response = json_error(400, f"Richiesta non valida: {e}")
+    metrics.increment("server_requests_total", route=route, status=response.status)
+    return response
+
+def tenant_of(request) -> str:
+    return request.headers.get("X-Tenant-Id", "default")
+
+async def read_json(request) -> dict:
+    """
+    Legge il corpo JSON della richiesta, che deve essere un oggetto.
+    """
+    body = await request.json()
+    if not isinstance(body, dict):
+        raise ValueError("il corpo della richiesta deve essere un oggetto JSON.")
+    return body
+
+async def read_input(request) -> str:
+    body = await read_json(request)
+    if not isinstance(body.get("input"), str) or not body["input"].strip():
+        raise ValueError("il campo 'input' è obbligatorio.")
+    return body["input"]
+
+def run_session(manager: ReportManager, prompt: str) -> dict:
+    manager.run(prompt)
+    return {"answer": manager.get_answer(), "document": manager.get_md_document()}
+
+async def handle_run(request):
+    pools, sessions = request.app["pools"], request.app["sessions"]
+    tenant, session_id = tenant_of(request), request.match_info["session_id"]
+    prompt = await read_input(request)
+    lock = sessions.lock(tenant, session_id)
+    async with pools["llm"].admit(tenant, lock) as pool:
+        manager = await sessions.get(tenant, session_id, lock, pool)
+        result = await pool.run(run_session, manager, prompt)
+    return web.json_response(result)
+
+async def handle_stream(request):
+    pools, sessions = request.app["pools"], request.app["sessions"]
+    tenant, session_id = tenant_of(request), request.match_info["session_id"]
+    prompt = await read_input(request)
+    lock = sessions.lock(tenant, session_id)
+    async with pools["llm"].admit(tenant, lock) as pool:
+        response = web.StreamResponse(headers={"Content-Type": "application/x-ndjson"})
+        await response.prepare(request)
+        manager = await sessions.get(tenant, session_id, lock, pool)
+        events = manager.stream(prompt)
+        # Il generatore viene fatto avanzare nel pool, un evento alla volta, senza bloccare il loop
+        while (event := await pool.run(next, events, None)) is not None:
+            await response.write((json.dumps(event, ensure_ascii=False, default=str) + "\n").encode("utf-8"))
+        await response.write_eof()
+    return response
+
+def export_response(data: bytes | None, format_type: str) -> web.Response:
+    if data is None:
+        return json_error(500, f"Errore durante la generazione del file {format_type}.")
+    return web.Response(body=data, content_type=EXPORT_CONTENT_TYPES.get(format_type, "text/markdown").split(";")[0],
+                        headers={"Content-Disposition": f'attachment; filename="file_esportato.{format_type.lower()}"'})
+
+async def export_markdown(request, markdown_content: str, format_type: str) -> web.Response:
+    format_type = format_type.upper()
+    data = export_cache.get(markdown_content, format_type)
+    if data is None:
+        async with request.app["pools"]["cpu"].admit(tenant_of(request)) as pool:
+            data = await pool.run(export_cache.export, markdown_content, format_type)
+    return export_response(data, format_type)
+
+async def handle_export(request):
+    body = await read_json(request)
+    if not isinstance(body.get("markdown"), str):
+        raise ValueError("il campo 'markdown' è obbligatorio.")
+    if not isinstance(body.get("format", "MD"), str):
+        raise ValueError("il campo 'format' deve essere una stringa.")
+    return await export_markdown(request, body["markdown"], body.get("format", "MD"))
+
+async def handle_session_export(request):
+    sessions = request.app["sessions"]
+    tenant, session_id = tenant_of(request), request.match_info["session_id"]
+    body = await read_json(request) if request.can_read_body else {}
+    if not isinstance(body.get("format", "MD"), str):
+        raise ValueError("il campo 'format' deve essere una stringa.")
+    lock = sessions.lock(tenant, session_id)
+    # Il ReportManager della sessione può dover essere creato nel pool: la richiesta passa dal controllo di ammissione
+    async with request.app["pools"]["llm"].admit(tenant, lock) as pool:
+        manager = await sessions.get(tenant, session_id, lock, pool)
+        document = manager.get_md_document()
+    return await export_markdown(request, document, body.get("format", "MD"))
+
+def transcribe_audio(data: bytes, whisper_model: str) -> str | None:
+    # Il modulo di trascrizione (numpy, soundfile, transformers) viene importato solo alla prima richiesta
+    from src.transcribe import read_audio_bytes, transcribe_samples
+
+    try:
+        samples, samplerate = read_audio_bytes(data)
+    except RuntimeError as e:
+        raise ValueError(f"formato audio non riconosciuto ({e}).")
+    return transcribe_samples(samples, samplerate, whisper_model)
+
+async def handle_transcribe(request):
+    data = await request.read()
+    if not data:
+        raise ValueError("il corpo della richiesta deve contenere un file audio.")
+    whisper_model = request.query.get("whisper_model", "base")
+    async with request.app["pools"]["cpu"].admit(tenant_of(request)) as pool:
+        text = await pool.run(transcribe_audio, data, whisper_model)
+    if text is None:
+        return json_error(500, "Errore durante la trascrizione.")
+    return web.json_response({"text": text})
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.to_prometheus(), content_type="text/plain")
+
+async def handle_health(request):
+    pools = request.app["pools"]
+    return web.json_response({
+        "status": "ok",
+        "sessions": len(request.app["sessions"]),
+        "pools": {name: pool.describe() for name, pool in pools.items()}
+    })
+
+async def shutdown_pools(app):
+    for pool in app["pools"].values():
+        pool.executor.shutdown(wait=False, cancel_futures=True)
+
+def create_app(checkpointer=None) -> web.Application:
+    """
+    Crea l'applicazione aiohttp con i pool di lavoro e le sessioni.
+    """
+    app = web.Application(middlewares=[error_middleware], client_max_size=int(SERVER_MAX_UPLOAD_MB * 2**20))
+    app["pools"] = {
+        "llm": WorkerPool("llm", SERVER_LLM_WORKERS, SERVER_MAX_QUEUE, SERVER_TENANT_LIMIT, SERVER_QUEUE_TIMEOUT_S),
+        "cpu": WorkerPool("cpu", SERVER_CPU_WORKERS, SERVER_MAX_QUEUE, SERVER_TENANT_LIMIT, SERVER_QUEUE_TIMEOUT_S),
+    }
+    app["sessions"] = SessionPool(SERVER_MAX_SESSIONS, checkpointer)
+    app.on_cleanup.append(shutdown_pools)
+    app.add_routes([
+        web.post("/sessions/{session_id}/run", handle_run),
+        web.post("/sessions/{session_id}/stream", handle_stream),
+        web.post("/sessions/{session_id}/export", handle_session_export),
+        web.post("/export", handle_export),
+        web.post("/transcribe", handle_transcribe),
+        web.get("/metrics", handle_metrics),
+        web.get("/health", handle_health),
+    ])
+    return app
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="API HTTP di AI Markdown Manager.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+
+    web.run_app(create_app(), host=args.host, port=args.port)
@@ -1,14 +1,60 @@
 from langchain_core.tools import tool
 from src.agents import *
+from src.sections import *
+from src.retrieval import *
+from src.patches import *
+from src.rate_limit import call_with_rate_limit
+from src.agent_cache import agent_cache, cache_key
+from src.metrics import metrics, record_llm_call
+from src.workspace import get_workspace, UNTITLED_DOCUMENT
+from src.history import undo_edits, redo_edits
+from src.chunking import is_large_document, is_document_wide_transform, map_reduce_edit, edit_last_chunk, map_reduce_answer, APPEND_COMMAND
+from src.section_index import relevant_sections_text, RETRIEVAL_INDEX_MIN_CHARS
+from collections import Counter
 from typing import Optional
-from httpx import HTTPStatusError
+import os
+import json
+import re
+import time
 
-model = get_model()
-cleaning_agent = create_cleaning_agent(model=model)
-modifier_agent = create_modifier_agent(model=model)
-organizer_agent = create_organizer_agent(model=model)
-retrieval_agent = create_retrieval_agent(model=model)
-explainer_agent = create_explainer_agent(model=model)
+def invoke_agent(agent, content: str) -> str:
+    """
+    Funzione di utilità che invia un messaggio a un agente e ne restituisce la risposta testuale.
+    Non è un tool.
+    Tutte le chiamate passano dal rate limiter condiviso del modello, con retry sugli errori 429 e 5xx.
+    Il nome dell'agente viene aggiunto ai metadati della chiamata, così che `ReportManager.stream`
+    possa attribuire i token generati all'agente corretto.
+    Latenza e token usati vengono registrati nelle metriche.
+    """
+    model_name = get_model().model
+    start = time.perf_counter()
+    result = call_with_rate_limit(
+        agent.invoke,
+        {"messages": [{"role": "user", "content": content}]},
+        config={"metadata": {"agent_name": agent.name}},
+        model_name=model_name
+    )
+    record_llm_call(agent.name, model_name, time.perf_counter() - start, result['messages'][-1])
+    return result['messages'][-1].content
+
+def invoke_cached_agent(name: str, content: str) -> str:
+    """
+    Come `invoke_agent`, ma la risposta viene cercata prima nella cache degli agenti
+    (in memoria e su disco), indicizzata su agente, versione del prompt, modello e input.
+    Non è un tool.
+    """
+    agent = get_agent(name)
+    key = cache_key(agent.name, prompt_version(name), get_model().model, content)
+    response = agent_cache.get(key)
+    metrics.increment("agent_cache_requests_total", agent=agent.name, result="miss" if response is None else "hit")
+    if response is not None:
+        print(f"Risposta di {agent.name} servita dalla cache.")
+        record_llm_call(agent.name, get_model().model, 0.0, cached=True)
+        return response
+
+    response = invoke_agent(agent, content)
+    agent_cache.put(key, agent.name, response)
+    return response
 
 def clean_text(text_to_add: str) -> str:
     """
@@ -16,24 +62,149 @@ def clean_text(text_to_add: str) -> str:
     Non è un tool.
     Viene utilizzato prima di aggiungere testo al documento markdown.
     """
-    result_cleaner = cleaning_agent.invoke({"messages": [{"role": "user", "content": text_to_add}]})
-    cleaned_text = result_cleaner['messages'][-1].content
+    cleaned_text = invoke_cached_agent("cleaning", text_to_add)
     return cleaned_text
 
-@tool
-def organize_text(current_document: str, text_to_add: str) -> str:
+# "fused": correzione e organizzazione in una sola chiamata, con inserimento locale; "serial": tre chiamate
+ORGANIZE_MODE = os.getenv("ORGANIZE_MODE", "fused")
+
+def organize_serial(current_document: str, text_to_add: str) -> str:
     """
-    Usa questo tool per organizzare in sezioni SOLAMENTE quando ricevi un testo senza indicazioni sulle sezioni
+    Funzione di utilità che corregge il testo, lo organizza in sezioni e fa riscrivere al modificatore
+    l'intero documento con il testo aggiunto (tre chiamate in sequenza).
+    Non è un tool.
     """
     input_organizer = f"TESTO:\n{clean_text(text_to_add)}"
 
-    result_cleaner = organizer_agent.invoke({"messages": [{"role": "user", "content": input_organizer}]})
-    cleaned_text = result_cleaner['messages'][-1].content
+    cleaned_text = invoke_cached_agent("organizer", input_organizer)
     
     input_modifier = f"DOCUMENTO ATTUALE:\n{current_document}\n\nCOMANDO: Aggiungi il seguente testo markdown: '{cleaned_text}'"
 
-    result_modifier = modifier_agent.invoke({"messages": [{"role": "user", "content": input_modifier}]})
-    new_document = result_modifier['messages'][-1].content
+    new_document = invoke_cached_agent("modifier", input_modifier)
+    return new_document
+
+def parse_ingestion(llm_output: str) -> tuple[str, str]:
+    """
+    Interpreta l'output dell'agente di acquisizione: titolo della sezione di destinazione e blocco da inserire.
+
+    Raises:
+        ValueError: Se l'output non è un dizionario JSON con le chiavi "heading" e "content".
+    """
+    text = llm_output.strip()
+    if text.startswith("```"):
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```")
+    result = json.loads(text, strict=False)
+    if not isinstance(result, dict) or not isinstance(result.get("content"), str) or not result["content"].strip():
+        raise ValueError(f"Output non valido: {llm_output[:80]}")
+    heading = result.get("heading") or ""
+    return heading.lstrip("#").strip(), result["content"]
+
+def insert_organized_block(current_document: str, heading: str, block: str) -> str:
+    """
+    Inserisce il blocco organizzato in fondo alla sezione `heading` (o in fondo al documento),
+    adattando il livello dei suoi titoli a quello della sezione che lo contiene.
+    """
+    sections = build_section_index(current_document)
+    anchor = find_section(sections, heading) if heading else None
+    top_level = [s for s in sections if s.parent is None]
+    if anchor is None and len(top_level) == 1 and top_level[0].level == 1:
+        # Documento con un unico titolo principale: il nuovo testo va sotto di esso
+        anchor = top_level[0]
+
+    if anchor is None:
+        return insert_block(current_document, len(current_document), block)
+    return insert_block(current_document, anchor.end, shift_headings(block.strip("\n"), anchor.level + 1))
+
+@tool
+def organize_text(current_document: str, text_to_add: str) -> str:
+    """
+    Usa questo tool per organizzare in sezioni SOLAMENTE quando ricevi un testo senza indicazioni sulle sezioni
+    """
+    if ORGANIZE_MODE != "fused":
+        return organize_serial(current_document, text_to_add)
+
+    # Una sola chiamata sul nuovo testo; il documento viene passato solo come indice dei titoli
+    outline = format_outline(build_section_index(current_document))
+    input_ingestion = f"INDICE DEL DOCUMENTO:\n{outline or '(vuoto)'}\n\nTESTO:\n{text_to_add}"
+    llm_output = invoke_cached_agent("ingestion", input_ingestion)
+
+    try:
+        heading, block = parse_ingestion(llm_output)
+    except ValueError as e:
+        print(f"Output di acquisizione non valido ({e}): organizzazione in tre passaggi.")
+        return organize_serial(current_document, text_to_add)
+
+    print(f"Testo organizzato inserito {'sotto ' + repr(heading) if heading else 'in fondo al documento'}.")
+    return insert_organized_block(current_document, heading, block)
+
+# Comandi che riguardano l'intero documento e non possono essere limitati a una sezione
+FULL_DOCUMENT_COMMAND = re.compile(r"nuovo documento|intero documento|tutto il documento|tutte le sezioni", re.IGNORECASE)
+
+def scope_command(command: str, current_document: str) -> tuple[int, int] | None:
+    """
+    Individua la porzione di documento interessata dal comando, a partire dai titoli
+    delle sezioni citati nel comando stesso.
+
+    Returns:
+        tuple[int, int] | None: Gli offset (inizio, fine) della porzione da modificare,
+        oppure None se il comando riguarda l'intero documento.
+    """
+    if FULL_DOCUMENT_COMMAND.search(command):
+        return None
+
+    targets = sections_in_text(build_section_index(current_document), command)
+    if not targets:
+        return None
+
+    start = min(s.start for s in targets)
+    end = max(s.end for s in targets)
+    if end - start >= len(current_document.strip()):
+        return None
+    return start, end
+
+# "patch": il modificatore restituisce solo le operazioni da applicare; "full": riscrive il testo
+MODIFIER_MODE = os.getenv("MODIFIER_MODE", "patch")
+
+# Contatori delle modifiche in modalità patch e dei token di output risparmiati (stimati)
+patch_stats = Counter()
+
+def regenerate(command: str, current_document: str, outline: str | None) -> str:
+    """
+    Funzione di utilità che fa riscrivere al modificatore il testo da modificare (l'intero documento,
+    oppure la sola sezione se viene passato l'indice del documento).
+    Non è un tool.
+    """
+    if outline is None:
+        input_modifier = f"DOCUMENTO ATTUALE:\n{current_document}\n\nCOMANDO:\n{command}"
+        return invoke_agent(get_agent("modifier"), input_modifier)
+
+    input_modifier = f"INDICE DEL DOCUMENTO:\n{outline}\n\nSEZIONE DA MODIFICARE:\n{current_document}\n\nCOMANDO:\n{command}"
+    return invoke_agent(get_agent("section_modifier"), input_modifier)
+
+def patch(command: str, current_document: str, outline: str | None) -> str:
+    """
+    Funzione di utilità che chiede al modificatore una patch (lista di operazioni) e la applica localmente.
+    Non è un tool.
+    Se la patch non è valida o non si applica, si ripiega sulla riscrittura completa.
+    """
+    context = f"INDICE DEL DOCUMENTO:\n{outline}\n\n" if outline else ""
+    input_patch = f"{context}DOCUMENTO ATTUALE:\n{current_document}\n\nCOMANDO:\n{command}"
+    llm_output = invoke_agent(get_agent("patch"), input_patch)
+
+    try:
+        new_document = apply_patch(current_document, parse_patch(llm_output), scoped=outline is not None)
+    except PatchError as e:
+        print(f"Patch non applicabile ({e}): riscrittura completa.")
+        patch_stats["fallback"] += 1
+        return regenerate(command, current_document, outline)
+
+    # La riscrittura completa avrebbe generato l'intero testo aggiornato
+    patch_tokens = estimate_tokens(llm_output)
+    full_tokens = estimate_tokens(new_document)
+    patch_stats["patch"] += 1
+    patch_stats["output_tokens_patch"] += patch_tokens
+    patch_stats["output_tokens_full"] += full_tokens
+    print(f"Patch applicata: ~{patch_tokens} token di output invece di ~{full_tokens} ({max(0, full_tokens - patch_tokens)} risparmiati).")
     return new_document
 
 # Tool per modificare il documento esistente
@@ -45,41 +216,235 @@ def modify_document(command: str, current_document: str) -> str:
     L'input deve essere un comando chiaro che descrive la modifica.
     """
     
-    input_modifier = f"DOCUMENTO ATTUALE:\n{current_document}\n\nCOMANDO:\n{clean_text(command)}"
+    edit = patch if MODIFIER_MODE == "patch" else regenerate
+    scope = scope_command(command, current_document)
 
-    result = modifier_agent.invoke({"messages": [{"role": "user", "content": input_modifier}]})
-    new_document = result['messages'][-1].content
+    if scope is None:
+        if is_large_document(current_document):
+            if APPEND_COMMAND.search(command):
+                # Aggiunta in fondo al documento: al modificatore arrivano l'indice e l'ultimo blocco
+                return edit_last_chunk(edit, clean_text(command), current_document)
+            if is_document_wide_transform(command):
+                # Trasformazione uniforme di un documento troppo grande per una sola chiamata: blocco per blocco
+                return map_reduce_edit(edit, clean_text(command), current_document)
+            # Il documento intero non entra in una sola chiamata: il comando deve indicare dove intervenire
+            raise ValueError(
+                f"Il documento (~{estimate_tokens(current_document)} token) è troppo grande per applicare il comando "
+                "all'intero testo. Indica la sezione da modificare, chiedi di aggiungere il testo in fondo al documento, "
+                "oppure usa un comando di traduzione o revisione dell'intero documento."
+            )
+        return edit(clean_text(command), current_document, None)
 
-    return new_document
+    # Al modificatore arrivano solo le sezioni interessate e l'indice del documento
+    start, end = scope
+    outline = format_outline(build_section_index(current_document))
+    new_section = edit(clean_text(command), current_document[start:end], outline)
+
+    return splice(current_document, start, end, new_section)
+
+# Domande che riguardano l'intero documento e non una parte (es. un riassunto)
+WHOLE_DOCUMENT_QUERY = re.compile(r"riassum|riassunto|sintesi|sintetizza|panoramica|in generale|" + FULL_DOCUMENT_COMMAND.pattern, re.IGNORECASE)
+
+def relevant_excerpt(query: str, current_document: str) -> str | None:
+    """
+    Funzione di utilità che cerca nell'indice del documento attivo (nel workspace della sessione) le sezioni pertinenti alla domanda.
+    Non è un tool.
+    L'indice viene aggiornato solo per le sezioni cambiate dall'ultima ricerca.
+
+    Returns:
+        str | None: L'indice dei titoli e il testo delle sezioni trovate, oppure None se nessuna sezione è pertinente.
+    """
+    workspace = get_workspace()
+    index = workspace.section_indexes.get(workspace.active or UNTITLED_DOCUMENT)
+    updated, hits = index.update_and_search(current_document, query)
+    metrics.increment("retrieval_index_sections_updated_total", updated)
+    if not hits:
+        return None
+    outline = format_outline(build_section_index(current_document))
+    print(f"Sezioni pertinenti ({updated} sezioni indicizzate di nuovo): {', '.join(h.title or '(introduzione)' for h in hits)}")
+    return f"INDICE DEL DOCUMENTO:\n{outline}\n\nDOCUMENTO ATTUALE:\n{relevant_sections_text(current_document, hits)}"
 
 # Tool per recuperare informazioni dal documento
 @tool
-def retrieve_document(query: str, current_document: str) -> str:
+def retrieve_document(query: str, current_document: str, mode: str = "auto") -> str:
     """
     Usa questo tool per cercare e recuperare informazioni o sezioni dal documento corrente.
     L'input deve essere una domanda (es. 'mostrami la sezione Y', 'che cosa ho scritto?, 'mostrami il documento').
+    Il parametro mode può essere "auto" (default), "strutturale" per le richieste di elenco o visualizzazione di sezioni, oppure "agente" per le domande sul contenuto.
     """
-    input_retrieval = f"DOCUMENTO ATTUALE:\n{current_document}\n\nRICHIESTA:\n{query}"
+    if mode != AGENT_PATH:
+        answer = answer_structural_query(query, current_document)
+        if answer is not None:
+            retrieval_path_counts[STRUCTURAL_PATH] += 1
+            print(f"Richiesta servita dal percorso: {STRUCTURAL_PATH}")
+            return RetrievalAnswer(answer, STRUCTURAL_PATH)
 
-    result_retrieval = retrieval_agent.invoke({"messages": [{"role": "user", "content": input_retrieval}]})
-    document_retrieved = result_retrieval['messages'][-1].content
+    def answer(query: str, text: str) -> str:
+        return invoke_cached_agent("retrieval", f"DOCUMENTO ATTUALE:\n{text}\n\nRICHIESTA:\n{query}")
+
+    excerpt = None
+    if len(current_document) >= RETRIEVAL_INDEX_MIN_CHARS and not WHOLE_DOCUMENT_QUERY.search(query):
+        # All'agente arrivano solo le sezioni più pertinenti alla domanda
+        excerpt = relevant_excerpt(query, current_document)
+
+    if excerpt is not None:
+        document_retrieved = invoke_cached_agent("retrieval", f"{excerpt}\n\nRICHIESTA:\n{query}")
+    elif is_large_document(current_document):
+        # Documento troppo grande per una sola chiamata: risposte parziali per blocco, poi combinate
+        document_retrieved = map_reduce_answer(answer, query, current_document)
+    else:
+        document_retrieved = answer(query, current_document)
+
+    retrieval_path_counts[AGENT_PATH] += 1
+    print(f"Richiesta servita dal percorso: {AGENT_PATH}")
+    return RetrievalAnswer(document_retrieved, AGENT_PATH)
+
+@tool
+def list_sections(current_document: str) -> str:
+    """
+    Usa questo tool per elencare tutte le sezioni del documento corrente (es. 'elenca le sezioni', 'quali capitoli ci sono?').
+    Non richiede argomenti.
+    """
+    sections = build_section_index(current_document)
+    if not sections:
+        return "Il documento corrente non contiene sezioni."
+    return list_sections_text(sections)
+
+@tool
+def show_section(section_title: str, current_document: str) -> str:
+    """
+    Usa questo tool per mostrare il titolo e il contenuto di una sezione del documento corrente (es. 'mostrami la sezione Introduzione').
+    L'input deve essere il titolo della sezione.
+    """
+    sections = build_section_index(current_document)
+    section = find_section(sections, section_title)
+    if section is None:
+        return section_not_found_text(section_title, sections)
+    return current_document[section.start:section.end].strip()
+
+
+def get_section(section_title: str, current_document: str) -> Section:
+    """
+    Funzione di utilità che restituisce la sezione con il titolo indicato, per i tool che modificano il documento.
+    Non è un tool.
+    Il titolo deve corrispondere esattamente (dopo la normalizzazione), così un titolo simile
+    (es. "Capitolo 4" e "Capitolo 1") non viene mai modificato al posto di quello richiesto.
+
+    Raises:
+        ValueError: Se la sezione non esiste nel documento.
+    """
+    sections = build_section_index(current_document)
+    section = find_section(sections, section_title, fuzzy=False)
+    if section is None:
+        raise ValueError(section_not_found_text(section_title, sections))
+    return section
+
+@tool
+def rename_section(section_title: str, new_title: str, current_document: str) -> str:
+    """
+    Usa questo tool per rinominare una sezione del documento corrente mantenendone il contenuto.
+    L'input deve essere il titolo attuale della sezione e il nuovo titolo.
+    """
+    return replace_heading(current_document, get_section(section_title, current_document), new_title)
 
-    return document_retrieved
+@tool
+def delete_section(section_title: str, current_document: str) -> str:
+    """
+    Usa questo tool per eliminare un'intera sezione (con le sue sotto-sezioni) dal documento corrente.
+    L'input deve essere il titolo della sezione da eliminare.
+    """
+    return remove_section(current_document, get_section(section_title, current_document))
 
+@tool
+def move_section(section_title: str, target_title: str, current_document: str, position: str = "after") -> str:
+    """
+    Usa questo tool per spostare una sezione (con le sue sotto-sezioni) prima o dopo un'altra sezione del documento corrente.
+    L'input deve essere il titolo della sezione da spostare, il titolo della sezione di riferimento e la posizione ("before" oppure "after").
+    """
+    return relocate_section(current_document, get_section(section_title, current_document), target_title, position)
     
 @tool
-def open_file(filename: str) -> str:
+def undo(current_document: str, history: dict, steps: int = 1) -> tuple:
+    """
+    Usa questo tool per annullare le ultime modifiche al documento attivo (es. 'annulla', 'annulla le ultime 3 modifiche').
+    L'input è il numero di modifiche da annullare (default 1).
+    """
+    document, history, count = undo_edits(current_document, history, steps)
+    print(f"Modifiche annullate: {count}.")
+    return document, history
+
+@tool
+def redo(current_document: str, history: dict, steps: int = 1) -> tuple:
+    """
+    Usa questo tool per ripristinare le ultime modifiche annullate sul documento attivo (es. 'ripristina', 'rifai').
+    L'input è il numero di modifiche da ripristinare (default 1).
+    """
+    document, history, count = redo_edits(current_document, history, steps)
+    print(f"Modifiche ripristinate: {count}.")
+    return document, history
+
+@tool
+def open_file(filename: str, current_document: str = "") -> str:
     """
     Usa questo tool per aprire un file di testo e leggerne il contenuto.
     L'input deve essere il nome del file.
+    Il file viene aggiunto ai documenti aperti e diventa il documento attivo; se è già aperto viene solo riattivato.
     """
+    workspace = get_workspace()
+    if filename in workspace:
+        return workspace.switch(filename, current_document)
     try:
         with open(filename, 'r', encoding='utf-8') as f:
-            return f.read()
+            content = f.read()
     except FileNotFoundError:
-        return f"Errore: File '{filename}' non trovato."
-    except Exception as e:
-        return f"Errore durante l'apertura del file: {e}"
+        raise ValueError(f"File '{filename}' non trovato.") from None
+    except (OSError, UnicodeDecodeError) as e:
+        raise ValueError(f"Errore durante l'apertura del file '{filename}': {e}") from None
+    return workspace.open(filename, content, current_document)
+
+@tool
+def list_documents() -> str:
+    """
+    Usa questo tool per elencare i documenti aperti e vedere qual è il documento attivo (es. 'quali documenti sono aperti?').
+    Non richiede argomenti.
+    """
+    documents = get_workspace().describe()
+    if not documents:
+        return "Non ci sono documenti aperti."
+    lines = []
+    for document in documents:
+        marker = " (attivo)" if document["active"] else ""
+        location = "" if document["in_memory"] else ", su disco"
+        lines.append(f"- {document['name']}{marker}: {document['size'] / 1024:.1f} KB{location}")
+    return "Documenti aperti:\n" + "\n".join(lines)
+
+@tool
+def switch_document(document_name: str, current_document: str) -> str:
+    """
+    Usa questo tool per passare a un altro documento già aperto, che diventa il documento attivo (es. 'passa al documento report.md').
+    L'input deve essere il nome del documento.
+    """
+    workspace = get_workspace()
+    names = workspace.names()
+    if document_name not in names:
+        # Si accetta anche il nome senza estensione o con maiuscole diverse
+        matches = [name for name in names if normalize_title(os.path.splitext(name)[0]) == normalize_title(os.path.splitext(document_name)[0])]
+        if len(matches) != 1:
+            raise ValueError(f"Documento '{document_name}' non aperto. Documenti aperti: {', '.join(names) or 'nessuno'}.")
+        document_name = matches[0]
+    return workspace.switch(document_name, current_document)
+
+@tool
+def close_document(document_name: str, current_document: str) -> str:
+    """
+    Usa questo tool per chiudere un documento aperto; se è quello attivo, diventa attivo il documento usato più di recente.
+    L'input deve essere il nome del documento.
+    """
+    workspace = get_workspace()
+    workspace.sync_active(current_document)
+    if document_name not in workspace:
+        raise ValueError(f"Documento '{document_name}' non aperto.")
+    return workspace.close(document_name)
 
 @tool
 def save_file(filename: str, content: str) -> str:
@@ -90,9 +455,9 @@ def save_file(filename: str, content: str) -> str:
     try:
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(content)
-        return f"File '{filename}' salvato con successo."
-    except Exception as e:
-        return f"Errore durante il salvataggio del file: {e}"
+    except OSError as e:
+        raise ValueError(f"Errore durante il salvataggio del file '{filename}': {e}") from None
+    return f"File '{filename}' salvato con successo."
     
 @tool
 def explain_capabilities(conversation: str):
@@ -101,8 +466,7 @@ def explain_capabilities(conversation: str):
     Questo tool spiega quali sono le funzioni che sei in grado di fare.
     """
     
-    explainer_result = explainer_agent.invoke({"messages": [{"role": "user", "content": conversation}]})
-    explanation = explainer_result['messages'][-1].content
+    explanation = invoke_cached_agent("explainer", conversation)
 
     return explanation
     
@@ -118,10 +482,20 @@ def get_tools():
     
     tools = [
         modify_document,
+        rename_section,
+        delete_section,
+        move_section,
         retrieve_document,
+        list_sections,
+        show_section,
         organize_text,
+        undo,
+        redo,
         explain_capabilities,
         open_file,
+        list_documents,
+        switch_document,
+        close_document,
         save_file
     ]
     
@@ -1,9 +1,210 @@
 import os
 os.environ['TF_ENABLE_ONEDNN_OPTS'] = '0'
 
-from transformers import pipeline
+from dotenv import load_dotenv
+load_dotenv(".env")
+
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from math import gcd
+import io
+import atexit
+import subprocess
+import threading
+import multiprocessing
+import numpy as np
 import soundfile as sf
 
+# Occupazione di memoria stimata (in MB, pesi fp32) dei modelli Whisper, usata prima del caricamento
+WHISPER_MODEL_SIZES_MB = {
+    "tiny": 150,
+    "base": 290,
+    "small": 970,
+    "medium": 3060,
+    "large": 6170,
+    "large-v2": 6170,
+    "large-v3": 6170,
+}
+
+class WhisperRegistry:
+    """
+    Registro process-wide delle pipeline Whisper caricate, indicizzate per dimensione del modello.
+    Le pipeline restano in memoria tra una trascrizione e l'altra; quando il budget di memoria
+    viene superato si scaricano quelle usate meno di recente (LRU).
+    """
+    def __init__(self, memory_budget_mb: int | None = None):
+        if memory_budget_mb is None:
+            memory_budget_mb = int(os.getenv("WHISPER_MEMORY_BUDGET_MB", "2048"))
+        self.memory_budget_mb = memory_budget_mb
+        self._pipelines = OrderedDict() # whisper_model -> (pipeline, memoria in MB)
+        self._lock = threading.Lock()   # protegge solo il dizionario delle pipeline
+        self._load_locks = {}           # whisper_model -> lock tenuto durante il caricamento di quel modello
+
+    def get(self, whisper_model: str = "base"):
+        """
+        Restituisce la pipeline per il modello indicato, caricandola solo se non è già in memoria.
+        Il caricamento di un modello non blocca le richieste per gli altri modelli già in memoria;
+        richieste concorrenti per lo stesso modello attendono un unico caricamento.
+        """
+        with self._lock:
+            if whisper_model in self._pipelines:
+                self._pipelines.move_to_end(whisper_model)
+                return self._pipelines[whisper_model][0]
+            load_lock = self._load_locks.setdefault(whisper_model, threading.Lock())
+
+        with load_lock:
+            with self._lock:
+                # Il modello potrebbe essere stato caricato da un'altra richiesta nel frattempo
+                if whisper_model in self._pipelines:
+                    self._pipelines.move_to_end(whisper_model)
+                    return self._pipelines[whisper_model][0]
+                self._evict(WHISPER_MODEL_SIZES_MB.get(whisper_model, 0))
+
+            transcriber, size_mb = self._load(whisper_model)
+
+            with self._lock:
+                self._pipelines[whisper_model] = (transcriber, size_mb)
+                self._evict(0)
+            return transcriber
+
+    def _load(self, whisper_model: str):
+        """
+        Carica la pipeline Whisper e ne misura la memoria occupata (in MB).
+        """
+        # transformers (e con esso torch) viene importato solo alla prima trascrizione
+        from transformers import pipeline
+
+        print(f"Inizializzazione del modello Whisper '{whisper_model}'...")
+        transcriber = pipeline("automatic-speech-recognition", model=f"openai/whisper-{whisper_model}")
+        size_mb = sum(p.numel() * p.element_size() for p in transcriber.model.parameters()) / 2**20
+        print(f"Modello caricato ({size_mb:.0f} MB).")
+        return transcriber, size_mb
+
+    def _evict(self, incoming_mb: float):
+        """
+        Scarica le pipeline meno recenti finché quelle rimanenti (più quella in arrivo) rientrano nel budget.
+        La pipeline usata più di recente non viene mai scaricata.
+        """
+        while len(self._pipelines) > 1 or (self._pipelines and incoming_mb):
+            used_mb = sum(size for _, size in self._pipelines.values())
+            if used_mb + incoming_mb <= self.memory_budget_mb:
+                break
+            evicted, _ = self._pipelines.popitem(last=False)
+            print(f"Modello Whisper '{evicted}' rimosso dalla memoria.")
+
+    def warm_up(self, whisper_models=("base",)):
+        """
+        Carica in anticipo i modelli indicati ed esegue una trascrizione di prova su un secondo
+        di silenzio, così la prima richiesta reale non paga il caricamento.
+        """
+        silence = {"raw": np.zeros(16000, dtype=np.float32), "sampling_rate": 16000}
+        for whisper_model in whisper_models:
+            self.get(whisper_model)(silence, generate_kwargs={"language": "it"})
+
+    def loaded_models(self) -> list[str]:
+        """
+        Restituisce i modelli in memoria, dal meno al più recentemente usato.
+        """
+        with self._lock:
+            return list(self._pipelines)
+
+    def clear(self):
+        with self._lock:
+            self._pipelines.clear()
+
+whisper_registry = WhisperRegistry()
+
+def get_transcriber(whisper_model: str = "base"):
+    """
+    Restituisce la pipeline Whisper condivisa per il modello indicato.
+    """
+    return whisper_registry.get(whisper_model)
+
+# Whisper lavora su audio mono a 16 kHz
+WHISPER_SAMPLING_RATE = 16000
+
+def resample_for_whisper(samples: np.ndarray, samplerate: int) -> np.ndarray:
+    """
+    Converte i campioni in mono float32 a 16 kHz, in memoria e senza processi esterni.
+
+    Args:
+        samples (np.ndarray): Campioni float, con forma (n,) oppure (n, canali).
+        samplerate (int): La frequenza di campionamento dei campioni.
+
+    Returns:
+        np.ndarray: I campioni mono a 16 kHz.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    if samples.ndim == 2:
+        samples = samples.mean(axis=1)
+    if samplerate != WHISPER_SAMPLING_RATE:
+        from scipy.signal import resample_poly # import lento, fatto solo quando serve
+
+        divisor = gcd(samplerate, WHISPER_SAMPLING_RATE)
+        samples = resample_poly(samples, WHISPER_SAMPLING_RATE // divisor, samplerate // divisor).astype(np.float32)
+    return samples
+
+def pcm_to_samples(raw_data: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """
+    Converte un buffer PCM intero (es. `AudioSegment.raw_data` del registratore) in campioni float32 in [-1, 1].
+    """
+    dtypes = {1: np.uint8, 2: np.int16, 4: np.int32}
+    if sample_width not in dtypes:
+        raise ValueError(f"Ampiezza di campione non supportata: {sample_width} byte.")
+
+    samples = np.frombuffer(raw_data, dtype=dtypes[sample_width]).astype(np.float32)
+    if sample_width == 1:
+        samples -= 128 # PCM a 8 bit è senza segno
+    samples /= 2 ** (8 * sample_width - 1)
+    return samples.reshape(-1, channels) if channels > 1 else samples
+
+def read_audio_bytes(data: bytes) -> tuple[np.ndarray, int]:
+    """
+    Decodifica in memoria un file audio (wav, flac, ogg) contenuto in un buffer di byte.
+
+    Returns:
+        tuple[np.ndarray, int]: I campioni float32 e la frequenza di campionamento.
+    """
+    samples, samplerate = sf.read(io.BytesIO(data), dtype='float32')
+    return samples, samplerate
+
+def transcribe_samples(samples: np.ndarray, samplerate: int, whisper_model: str = "base") -> str | None:
+    """
+    Trascrive dei campioni audio già in memoria, passandoli direttamente alla pipeline Whisper.
+
+    Args:
+        samples (np.ndarray): Campioni float, con forma (n,) oppure (n, canali).
+        samplerate (int): La frequenza di campionamento dei campioni.
+        whisper_model (str): La dimensione del modello Whisper da usare.
+
+    Returns:
+        str: Il testo trascritto, oppure None in caso di errore.
+    """
+    try:
+        duration = len(samples) / samplerate
+        if duration > LONG_AUDIO_THRESHOLD_S:
+            # Audio lungo: trascrizione a blocchi
+            segments = transcribe_long_audio(samples, whisper_model, samplerate=samplerate)
+            text = "".join(segment["text"] for segment in segments)
+            return text.strip() or None
+
+        transcriber = get_transcriber(whisper_model)
+        print("Trascrizione in corso...")
+
+        audio = {"raw": resample_for_whisper(samples, samplerate), "sampling_rate": WHISPER_SAMPLING_RATE}
+        result = transcriber(audio, generate_kwargs={"language": "it"})
+
+        if result and "text" in result:
+            return result["text"]
+        else:
+            print("Nessun testo trovato nel risultato della trascrizione.")
+            return None
+
+    except Exception as e:
+        print(f"Si è verificato un errore durante la trascrizione: {e}")
+        return None
+
 def convert_audio_to_text(audio_filepath,whisper_model="base"):
     """
     Converte un file audio .wav in testo utilizzando il modello Whisper passato.
@@ -33,45 +234,251 @@ def convert_audio_to_text(audio_filepath,whisper_model="base"):
             print(f"Canali: {channels}")
             print(f"Durata: {duration:.2f} secondi")
 
-        print(f"Inizializzazione del modello Whisper '{whisper_model}'...")
-        transcriber = pipeline("automatic-speech-recognition", model=f"openai/whisper-{whisper_model}")
-        print("Modello caricato. Trascrizione in corso...")
-
         # Esegui la trascrizione
-        result = transcriber(audio_filepath,generate_kwargs={"language": "it"})
+        if duration > LONG_AUDIO_THRESHOLD_S:
+            # Audio lungo: trascrizione a blocchi, senza caricare l'intera forma d'onda in memoria
+            text = "".join(segment["text"] for segment in transcribe_long_audio(audio_filepath, whisper_model))
+            return text.strip() or None
 
-        if result and "text" in result:
-            return result["text"]
-        else:
-            print("Nessun testo trovato nel risultato della trascrizione.")
-            return None
+        samples, samplerate = sf.read(audio_filepath, dtype='float32')
+        return transcribe_samples(samples, samplerate, whisper_model)
 
     except Exception as e:
         print(f"Si è verificato un errore durante la trascrizione: {e}")
         return None
     
-import subprocess
+# Oltre questa durata (in secondi) si usa la trascrizione a blocchi
+LONG_AUDIO_THRESHOLD_S = 60.0
+
+def find_silence_cut(samples: np.ndarray, samplerate: int, search_s: float = 5.0, frame_s: float = 0.03) -> int:
+    """
+    Cerca il punto di taglio più silenzioso negli ultimi `search_s` secondi dei campioni,
+    così che nessuna parola venga spezzata tra due blocchi.
+
+    Returns:
+        int: L'indice del campione in cui tagliare.
+    """
+    frame_len = max(1, int(frame_s * samplerate))
+    search_start = max(0, len(samples) - int(search_s * samplerate))
+    window = samples[search_start:]
+    n_frames = len(window) // frame_len
+    if n_frames < 2:
+        return len(samples)
+
+    frames = window[:n_frames * frame_len].reshape(n_frames, frame_len)
+    energy = np.sqrt(np.mean(frames ** 2, axis=1))
+    quietest = int(np.argmin(energy))
+    return search_start + quietest * frame_len + frame_len // 2
+
+def split_at_silences(blocks, samplerate: int, max_chunk_s: float = 28.0, search_s: float = 5.0):
+    """
+    Suddivide un flusso di blocchi di campioni mono in segmenti di al più `max_chunk_s` secondi,
+    tagliati in corrispondenza dei silenzi. In memoria resta solo il segmento corrente.
+
+    Yields:
+        tuple[float, np.ndarray, int]: Offset del segmento in secondi, campioni float32 e frequenza di campionamento.
+    """
+    max_len = int(max_chunk_s * samplerate)
+    buffer = np.empty(0, dtype=np.float32)
+    offset = 0
+
+    for block in blocks:
+        buffer = np.concatenate([buffer, block])
+        while len(buffer) >= max_len:
+            cut = find_silence_cut(buffer[:max_len], samplerate, search_s)
+            yield offset / samplerate, buffer[:cut], samplerate
+            buffer = buffer[cut:]
+            offset += cut
+
+    if len(buffer):
+        yield offset / samplerate, buffer, samplerate
+
+def iter_audio_chunks(audio_filepath: str, max_chunk_s: float = 28.0, search_s: float = 5.0):
+    """
+    Legge il file audio a blocchi e lo suddivide in segmenti ai silenzi (vedi `split_at_silences`).
+    """
+    with sf.SoundFile(audio_filepath, 'r') as f:
+        blocks = (block.mean(axis=1) for block in f.blocks(blocksize=f.samplerate * 5, dtype='float32', always_2d=True))
+        yield from split_at_silences(blocks, f.samplerate, max_chunk_s, search_s)
+
+def shift_timestamps(result: dict, offset_s: float, duration_s: float) -> dict:
+    """
+    Riporta i timestamp del risultato di un segmento sulla linea temporale dell'intero file.
+    """
+    chunks = []
+    for chunk in result.get("chunks", []):
+        start, end = chunk["timestamp"]
+        start = offset_s + (start or 0.0)
+        end = offset_s + (end if end is not None else duration_s)
+        chunks.append({"timestamp": (start, end), "text": chunk["text"]})
+    return {
+        "start": offset_s,
+        "end": offset_s + duration_s,
+        "text": result.get("text", ""),
+        "chunks": chunks
+    }
+
+def transcribe_chunk_batch(batch: list, whisper_model: str = "base") -> list[dict]:
+    """
+    Trascrive un gruppo di segmenti con una sola chiamata batch alla pipeline.
+    Viene eseguita sia nel processo principale che nei processi del pool.
+    """
+    transcriber = get_transcriber(whisper_model)
+    inputs = [
+        {"raw": resample_for_whisper(samples, samplerate), "sampling_rate": WHISPER_SAMPLING_RATE}
+        for _, samples, samplerate in batch
+    ]
+    results = transcriber(inputs, batch_size=len(inputs), return_timestamps=True, generate_kwargs={"language": "it"})
+    return [
+        shift_timestamps(result, offset_s, len(samples) / samplerate)
+        for (offset_s, samples, samplerate), result in zip(batch, results)
+    ]
+
+def warm_up_worker(whisper_model: str):
+    """
+    Inizializzatore dei processi del pool: carica il modello prima del primo segmento.
+    """
+    whisper_registry.warm_up([whisper_model])
+
+def worker_loaded_models() -> list[str]:
+    return whisper_registry.loaded_models()
+
+# Pool di processi per la trascrizione a blocchi, uno per (modello, numero di processi), riusati tra le chiamate
+_process_pools = {}
+_process_pools_lock = threading.Lock()
+
+def get_process_pool(whisper_model: str, workers: int) -> ProcessPoolExecutor:
+    """
+    Restituisce il pool di processi per il modello indicato, creandolo alla prima richiesta.
+    I processi vengono avviati con "spawn" (non ereditano lo stato di torch del processo principale)
+    e caricano il modello all'avvio; restano attivi fino alla chiusura del programma.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get((whisper_model, workers))
+        if pool is None:
+            pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=warm_up_worker,
+                initargs=(whisper_model,)
+            )
+            _process_pools[(whisper_model, workers)] = pool
+        return pool
+
+def warm_up_process_pool(whisper_model: str = "base", workers: int = 2):
+    """
+    Avvia tutti i processi del pool e attende che abbiano caricato il modello.
+    """
+    pool = get_process_pool(whisper_model, workers)
+    for future in [pool.submit(worker_loaded_models) for _ in range(workers)]:
+        future.result()
+
+def shutdown_process_pools():
+    with _process_pools_lock:
+        pools = list(_process_pools.values())
+        _process_pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+atexit.register(shutdown_process_pools)
+
+def iter_batches(chunks, batch_size: int):
+    batch = []
+    for chunk in chunks:
+        batch.append(chunk)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def transcribe_long_audio(audio, whisper_model: str = "base", batch_size: int = 4, workers: int = 1, max_chunk_s: float = 28.0, samplerate: int | None = None):
+    """
+    Trascrive un audio lungo (il percorso di un file, oppure un array di campioni
+    con la relativa `samplerate`) suddividendolo in segmenti ai silenzi.
+    I segmenti vengono trascritti a gruppi di `batch_size`, nel processo corrente oppure,
+    se `workers` > 1, nel pool di processi condiviso (ognuno con il proprio modello in memoria,
+    caricato all'avvio del processo: vedi `get_process_pool`).
+    I risultati vengono restituiti in ordine man mano che sono pronti, con i timestamp
+    riferiti all'inizio del file.
+
+    Yields:
+        dict: Per ogni segmento, le chiavi "start", "end", "text" e "chunks" (testo con timestamp).
+    """
+    if isinstance(audio, str):
+        chunks = iter_audio_chunks(audio, max_chunk_s)
+    else:
+        samples = np.asarray(audio, dtype=np.float32)
+        if samples.ndim == 2:
+            samples = samples.mean(axis=1)
+        chunks = split_at_silences([samples], samplerate, max_chunk_s)
+    batches = iter_batches(chunks, batch_size)
+
+    if workers <= 1:
+        for batch in batches:
+            yield from transcribe_chunk_batch(batch, whisper_model)
+        return
+
+    executor = get_process_pool(whisper_model, workers)
+    # Al più due gruppi in coda per processo, per non tenere in memoria l'intero file
+    pending = deque()
+    try:
+        for batch in batches:
+            pending.append(executor.submit(transcribe_chunk_batch, batch, whisper_model))
+            if len(pending) >= workers * 2:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+    except BrokenProcessPool:
+        # Un processo è terminato in modo anomalo: il pool viene ricreato alla prossima chiamata
+        with _process_pools_lock:
+            if _process_pools.get((whisper_model, workers)) is executor:
+                del _process_pools[(whisper_model, workers)]
+        raise
+    finally:
+        for future in pending:
+            future.cancel()
 
 def convert_to_whisper_format(input_path: str, output_path: str = "converted_for_whisper.wav"):
     """
     Converte un file audio in formato WAV mono, 16 kHz, 16-bit PCM.
+    I formati letti da soundfile (wav, flac, ogg, ...) vengono ricampionati in memoria;
+    per gli altri (m4a, mp4, webm, aac, ...) si ripiega su ffmpeg.
     """
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"File non trovato: {input_path}")
 
+    print(f"Converto {input_path} → {output_path}")
+    try:
+        samples, samplerate = sf.read(input_path, dtype='float32')
+    except RuntimeError as e:
+        print(f"Formato non supportato da soundfile ({e}): conversione con ffmpeg.")
+        convert_with_ffmpeg(input_path, output_path)
+    else:
+        sf.write(output_path, resample_for_whisper(samples, samplerate), WHISPER_SAMPLING_RATE, subtype='PCM_16')
+    print("Conversione completata.")
+
+def convert_with_ffmpeg(input_path: str, output_path: str):
+    """
+    Converte un file audio in WAV mono, 16 kHz, 16-bit PCM con ffmpeg.
+
+    Raises:
+        RuntimeError: Se ffmpeg non è installato.
+        subprocess.CalledProcessError: Se ffmpeg non riesce a convertire il file.
+    """
     command = [
         "ffmpeg",
         "-i", input_path,
         "-ac", "1",           # mono
-        "-ar", "16000",       # 16 kHz
+        "-ar", str(WHISPER_SAMPLING_RATE),  # 16 kHz
         "-acodec", "pcm_s16le",  # WAV PCM 16-bit little endian
         output_path,
         "-y"  # sovrascrive se esiste
     ]
-
-    print(f"Converto {input_path} → {output_path}")
-    subprocess.run(command, check=True)
-    print("Conversione completata.")
+    try:
+        subprocess.run(command, check=True)
+    except FileNotFoundError:
+        raise RuntimeError("ffmpeg non è installato: è necessario per convertire questo formato audio.") from None
 
 if __name__ == '__main__':
     print("--- Trascrizione Audio Esempio ---")
@@ -0,0 +1,218 @@
+import os
+import shutil
+import hashlib
+import tempfile
+import threading
+import weakref
+from collections import OrderedDict
+from contextvars import ContextVar
+from dataclasses import dataclass
+from src.section_index import SectionIndexCache
+
+# Nome del documento creato da zero, prima di essere salvato o aperto da file
+UNTITLED_DOCUMENT = "documento_senza_titolo.md"
+
+@dataclass
+class OpenDocument:
+    """
+    Un documento aperto nel workspace. Se `content` è None il documento è stato
+    scaricato su disco (in `spill_path`) e viene ricaricato al primo accesso.
+    """
+    name: str
+    content: str | None
+    size: int                      # byte occupati dal contenuto (UTF-8)
+    spill_path: str | None = None  # copia su disco, aggiornata se `dirty` è False
+    dirty: bool = True             # il contenuto in memoria è cambiato dall'ultima copia su disco
+
+class Workspace:
+    """
+    Insieme dei documenti aperti in una sessione, con un documento attivo.
+    I documenti sono ordinati dal meno al più recentemente usato: quando la memoria occupata
+    supera `memory_budget_mb`, i documenti meno recenti (mai quello attivo) vengono scaricati
+    su disco e ricaricati solo quando servono di nuovo.
+    Ogni workspace ha i propri indici di ricerca delle sezioni, così sessioni diverse non si
+    scambiano gli offset di documenti con lo stesso nome.
+    """
+    def __init__(self, memory_budget_mb: float | None = None, spill_dir: str | None = None):
+        if memory_budget_mb is None:
+            memory_budget_mb = float(os.getenv("WORKSPACE_MEMORY_MB", "64"))
+        if spill_dir is None:
+            spill_dir = os.getenv("WORKSPACE_SPILL_DIR") or None
+        self.memory_budget = int(memory_budget_mb * 2**20)
+        self.active: str | None = None
+        self._documents = OrderedDict() # nome -> OpenDocument
+        self.section_indexes = SectionIndexCache()
+        self._spill_base = spill_dir
+        self._spill_dir = None
+        self._lock = threading.RLock()
+
+    # --- Accesso ai documenti ---
+
+    def names(self) -> list[str]:
+        with self._lock:
+            return list(self._documents)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._documents
+
+    def get(self, name: str) -> str:
+        """
+        Restituisce il contenuto di un documento, ricaricandolo dal disco se necessario.
+
+        Raises:
+            KeyError: Se il documento non è aperto.
+        """
+        with self._lock:
+            document = self._documents[name]
+            self._documents.move_to_end(name)
+            if document.content is None:
+                with open(document.spill_path, encoding="utf-8") as f:
+                    document.content = f.read()
+                print(f"Documento '{name}' ricaricato dal disco.")
+                self._evict()
+            return document.content
+
+    def put(self, name: str, content: str):
+        """
+        Aggiunge un documento o ne aggiorna il contenuto, segnandolo come usato di recente.
+        """
+        with self._lock:
+            document = self._documents.get(name)
+            if document is None:
+                self._documents[name] = OpenDocument(name, content, len(content.encode("utf-8")))
+            elif document.content != content:
+                document.content = content
+                document.size = len(content.encode("utf-8"))
+                document.dirty = True
+            self._documents.move_to_end(name)
+            self._evict()
+
+    def open(self, name: str, content: str, current_content: str | None = None) -> str:
+        """
+        Apre un documento e lo rende attivo. Il contenuto del documento attivo (`current_content`)
+        viene prima salvato nel workspace; un documento senza titolo e vuoto viene scartato.
+        """
+        with self._lock:
+            self.sync_active(current_content)
+            if self.active == UNTITLED_DOCUMENT and not self._documents[UNTITLED_DOCUMENT].content:
+                self.close(UNTITLED_DOCUMENT)
+            self.active = name
+            self.put(name, content)
+            return content
+
+    def switch(self, name: str, current_content: str | None = None) -> str:
+        """
+        Rende attivo un documento già aperto e ne restituisce il contenuto.
+
+        Raises:
+            KeyError: Se il documento non è aperto.
+        """
+        with self._lock:
+            if name not in self._documents:
+                raise KeyError(name)
+            self.sync_active(current_content)
+            self.active = name
+            return self.get(name)
+
+    def close(self, name: str) -> str:
+        """
+        Chiude un documento (eliminandone la copia su disco). Se era quello attivo,
+        diventa attivo il documento usato più di recente.
+
+        Returns:
+            str: Il contenuto del nuovo documento attivo (vuoto se non ne resta nessuno).
+        """
+        with self._lock:
+            document = self._documents.pop(name)
+            self.section_indexes.discard(name)
+            if document.spill_path and os.path.exists(document.spill_path):
+                os.remove(document.spill_path)
+            if self.active == name:
+                self.active = next(reversed(self._documents), None)
+            return self.get(self.active) if self.active else ""
+
+    def sync_active(self, content: str | None):
+        """
+        Salva nel workspace il contenuto attuale del documento attivo (o di un nuovo documento senza titolo).
+        """
+        if content is None:
+            return
+        with self._lock:
+            if self.active is None:
+                if not content:
+                    return
+                self.active = UNTITLED_DOCUMENT
+            self.put(self.active, content)
+
+    def inactive_documents(self) -> dict[str, str]:
+        """
+        Restituisce il contenuto dei documenti aperti diversi da quello attivo, dal meno al più recentemente usato.
+        I documenti scaricati su disco vengono letti senza ricaricarli in memoria.
+        """
+        with self._lock:
+            documents = {}
+            for name, document in self._documents.items():
+                if name == self.active:
+                    continue
+                if document.content is None:
+                    with open(document.spill_path, encoding="utf-8") as f:
+                        documents[name] = f.read()
+                else:
+                    documents[name] = document.content
+            return documents
+
+    # --- Memoria e disco ---
+
+    def memory_used(self) -> int:
+        with self._lock:
+            return sum(d.size for d in self._documents.values() if d.content is not None)
+
+    def describe(self) -> list[dict]:
+        """
+        Restituisce nome, dimensione, stato (in memoria o su disco) e documento attivo di ogni documento aperto.
+        """
+        with self._lock:
+            return [
+                {"name": d.name, "size": d.size, "in_memory": d.content is not None, "active": d.name == self.active}
+                for d in self._documents.values()
+            ]
+
+    def _spill_path(self, name: str) -> str:
+        if self._spill_dir is None:
+            if self._spill_base:
+                os.makedirs(self._spill_base, exist_ok=True)
+            self._spill_dir = tempfile.mkdtemp(prefix="workspace_", dir=self._spill_base)
+            # La cartella viene eliminata quando il workspace non è più referenziato
+            weakref.finalize(self, shutil.rmtree, self._spill_dir, True)
+        return os.path.join(self._spill_dir, hashlib.sha256(name.encode("utf-8")).hexdigest()[:16] + ".md")
+
+    def _evict(self):
+        """
+        Scarica su disco i documenti meno recenti finché la memoria occupata rientra nel budget.
+        Il documento attivo e quello usato più di recente restano sempre in memoria.
+        """
+        used = self.memory_used()
+        for name in list(self._documents)[:-1]:
+            if used <= self.memory_budget:
+                break
+            document = self._documents[name]
+            if document.content is None or name == self.active:
+                continue
+            if document.dirty or document.spill_path is None:
+                document.spill_path = document.spill_path or self._spill_path(name)
+                with open(document.spill_path, "w", encoding="utf-8") as f:
+                    f.write(document.content)
+                document.dirty = False
+            document.content = None
+            used -= document.size
+            print(f"Documento '{name}' scaricato su disco ({document.size / 1024:.1f} KB).")
+
+# Workspace della sessione in corso: impostato da ReportManager durante l'esecuzione del grafo
+current_workspace = ContextVar("current_workspace", default=None)
+_default_workspace = Workspace()
+
+def get_workspace() -> Workspace:
+    """
+    Restituisce il workspace della sessione in corso (o quello di default del processo, fuori da una sessione).
+    """
+    return current_workspace.get() or _default_workspace
@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if project_root not in sys.path:
+    sys.path.insert(0, project_root)
+
+# Nessuna cache e nessuna sessione su disco durante i test (vanno impostate prima degli import)
+os.environ["AGENT_CACHE_PATH"] = ""
+os.environ["CHECKPOINT_PATH"] = ""
+# Nessun rate limit per il modello locale dei test
+os.environ.setdefault("MISTRAL_RATE_LIMITS", "fake-local=1000:1000")
+
+@pytest.fixture
+def fake_model():
+    """
+    Sostituisce Mistral con il modello locale dei benchmark, senza latenza.
+    Le cache di piani e agenti vengono svuotate prima e dopo il test.
+    """
+    from benchmarks.fake_model import FakeChatModel
+    from src.agents import set_model
+    from src.agent_cache import agent_cache
+    from src.intents import plan_cache
+
+    model = FakeChatModel(latency_s=0, tokens_per_s=1e6)
+    agent_cache.clear()
+    plan_cache.clear()
+    set_model(model)
+    yield model
+    set_model(None)
+    agent_cache.clear()
+    plan_cache.clear()
@@ -0,0 +1,36 @@
+import time
+from src import tools
+from src.agent_cache import AgentCache, cache_key
+
+def test_disk_cache_survives_a_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    key = cache_key("CleaningAgent", "v1", "modello", "testo")
+    AgentCache(path=path).put(key, "CleaningAgent", "Testo.")
+
+    restarted = AgentCache(path=path)
+    assert restarted.get(key) == "Testo."
+    assert restarted.get(key) == "Testo."
+    assert restarted.stats()["disk_hits"] == 1
+    assert restarted.stats()["memory_hits"] == 1
+
+def test_key_changes_with_prompt_version_and_model():
+    key = cache_key("CleaningAgent", "v1", "modello", "testo")
+    assert key != cache_key("CleaningAgent", "v2", "modello", "testo")
+    assert key != cache_key("CleaningAgent", "v1", "altro-modello", "testo")
+
+def test_expired_and_evicted_responses_are_misses(tmp_path, monkeypatch):
+    cache = AgentCache(path=str(tmp_path / "cache.sqlite"), max_entries=1, max_rows=1, ttl_s=60)
+    cache.put("a", "Agente", "A")
+    cache.put("b", "Agente", "B")
+    assert cache.get("a") is None
+
+    now = time.time()
+    monkeypatch.setattr("src.agent_cache.time.time", lambda: now + 120)
+    assert cache.get("b") is None
+    assert cache.stats()["misses"] == 2
+
+def test_repeated_call_is_served_from_cache(fake_model):
+    tools.clean_text("testo da corregere")
+    tools.clean_text("testo da corregere")
+
+    assert fake_model.stats()["CleaningAgent"]["calls"] == 1
@@ -0,0 +1,48 @@
+import os
+from src import bulk_convert
+from src.bulk_convert import MANIFEST_NAME
+
+def write(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+def make_sources(tmp_path):
+    source = tmp_path / "reports"
+    write(str(source / "uno.md"), "# Uno\n")
+    write(str(source / "sotto" / "due.md"), "# Due\n")
+    return str(source), str(tmp_path / "export")
+
+def test_second_run_skips_unchanged_files(tmp_path):
+    source, output = make_sources(tmp_path)
+
+    first = bulk_convert.bulk_convert(source, output, ["html"])
+    assert (first["converted"], first["skipped"]) == (2, 0)
+    assert os.path.exists(os.path.join(output, "sotto", "due.html"))
+    assert os.path.exists(os.path.join(output, MANIFEST_NAME))
+
+    second = bulk_convert.bulk_convert(source, output, ["html"])
+    assert (second["converted"], second["skipped"]) == (0, 2)
+
+def test_changed_or_deleted_exports_are_converted_again(tmp_path):
+    source, output = make_sources(tmp_path)
+    bulk_convert.bulk_convert(source, output, ["html"])
+
+    write(os.path.join(source, "uno.md"), "# Uno, modificato\n")
+    os.remove(os.path.join(output, "sotto", "due.html"))
+    summary = bulk_convert.bulk_convert(source, output, ["html"])
+
+    assert (summary["converted"], summary["skipped"]) == (2, 0)
+    assert bulk_convert.bulk_convert(source, output, ["html"], force=True)["converted"] == 2
+
+def test_failed_conversion_is_not_recorded(tmp_path, monkeypatch):
+    source, output = make_sources(tmp_path)
+    # Il pool usa fork: i processi figli vedono la funzione sostituita
+    monkeypatch.setattr(bulk_convert, "render_export", lambda markdown_content, format_type: None)
+
+    summary = bulk_convert.bulk_convert(source, output, ["html"])
+    assert (summary["converted"], summary["failed"]) == (0, 2)
+    assert not any(bulk_convert.load_manifest(output).values())
+
+    monkeypatch.undo()
+    assert bulk_convert.bulk_convert(source, output, ["html"])["converted"] == 2
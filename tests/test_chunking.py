@@ -0,0 +1,60 @@
+import pytest
+from benchmarks.offline_graph import make_document
+from src import tools
+from src.chunking import split_into_chunks
+
+def recording_edit(calls):
+    def edit(command, text, outline):
+        calls.append(text)
+        return text.rstrip("\n") + "\n\n## Conclusioni\n\nFine.\n"
+    return edit
+
+@pytest.mark.parametrize("command", [
+    "aggiungi in fondo una sezione Conclusioni",
+    "aggiungi in fondo una sezione Revisioni",
+    "aggiungi alla fine una sezione sullo stile di vita",
+    "aggiungi alla fine una sezione Traduzioni",
+])
+def test_append_command_on_large_document_is_applied_once(monkeypatch, command):
+    document = make_document(200)
+    assert len(split_into_chunks(document)) > 1
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", recording_edit(calls))
+
+    new_document = tools.modify_document.invoke({"command": command, "current_document": document})
+
+    assert len(calls) == 1
+    assert new_document.count("## Conclusioni") == 1
+    assert new_document.startswith(document.rstrip("\n"))
+
+def test_other_commands_on_large_document_are_refused(monkeypatch):
+    document = make_document(200)
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", recording_edit(calls))
+
+    with pytest.raises(ValueError, match="troppo grande"):
+        tools.modify_document.invoke({"command": "aggiungi una sezione sul tono del discorso", "current_document": document})
+    assert calls == []
+
+def test_small_documents_are_sent_whole(monkeypatch):
+    document = make_document(3)
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", recording_edit(calls))
+
+    tools.modify_document.invoke({"command": "aggiungi una sezione Conclusioni", "current_document": document})
+
+    assert calls == [document]
+
+def test_document_wide_transform_is_applied_per_chunk(monkeypatch):
+    document = make_document(200)
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", lambda command, text, outline: calls.append(text) or text.upper())
+
+    new_document = tools.modify_document.invoke({"command": "traduci il documento in inglese", "current_document": document})
+
+    assert len(calls) == len(split_into_chunks(document))
+    assert new_document == document.upper()
@@ -0,0 +1,17 @@
+from src import convert
+from src.convert import ExportCache, render_export
+
+def failing_writer(markdown_content):
+    raise RuntimeError("writer non disponibile")
+
+def test_failed_docx_export_is_not_cached(monkeypatch):
+    monkeypatch.setattr(convert, "markdown_to_docx", failing_writer)
+    cache = ExportCache()
+
+    assert render_export("# Titolo", "DOCX") is None
+    assert cache.export("# Titolo", "DOCX") is None
+    assert cache.get("# Titolo", "DOCX") is None
+
+def test_failed_html_export_returns_none(monkeypatch):
+    monkeypatch.setattr(convert.markdown, "markdown", failing_writer)
+    assert render_export("# Titolo", "HTML") is None
@@ -0,0 +1,40 @@
+from langgraph.checkpoint.memory import InMemorySaver
+from src.nodes import executor_node
+from src.report_manager import ReportManager
+
+def run_plan(document, plan):
+    state = {"plan": plan, "document_content": document, "history": {}, "past_steps": []}
+    while state["plan"]:
+        update = executor_node(state)
+        state = {**state, **update, "past_steps": state["past_steps"] + update["past_steps"]}
+    return state
+
+def test_save_status_is_reported_without_replacing_the_document(tmp_path):
+    path = tmp_path / "report.md"
+    state = run_plan("# Report\n", [{"tool_name": "save_file", "args": {"filename": str(path)}}])
+
+    assert state["document_content"] == "# Report\n"
+    assert path.read_text(encoding="utf-8") == "# Report\n"
+    assert state["past_steps"][-1][1] == f"File '{path}' salvato con successo."
+
+def test_missing_file_is_an_error_not_the_new_document(tmp_path):
+    missing = tmp_path / "mancante.md"
+    state = run_plan("# Report\n", [{"tool_name": "open_file", "args": {"filename": str(missing)}}])
+
+    assert state["document_content"] == "# Report\n"
+    assert "non trovato" in state["response"]
+
+def test_resumed_session_keeps_all_open_documents(tmp_path):
+    first, second = tmp_path / "primo.md", tmp_path / "secondo.md"
+    first.write_text("# Primo\n", encoding="utf-8")
+    second.write_text("# Secondo\n", encoding="utf-8")
+    checkpointer = InMemorySaver()
+
+    manager = ReportManager(session_id="documenti", checkpointer=checkpointer)
+    manager.run(f"apri {first}")
+    manager.run(f"apri {second}")
+
+    resumed = ReportManager(session_id="documenti", checkpointer=checkpointer)
+    assert resumed.workspace.names() == [str(first), str(second)]
+    assert resumed.workspace.active == str(second)
+    assert resumed.workspace.get(str(first)) == "# Primo\n"
@@ -0,0 +1,60 @@
+import io
+from docx import Document
+from src.docx_writer import markdown_to_docx, CODE_FONT
+
+MARKDOWN = """# Relazione
+
+Testo con **grassetto**, *corsivo* e `codice`.
+
+## Elenco
+
+- primo
+- secondo
+    - annidato
+
+1. uno
+2. due
+
+| Nome | Valore |
+|------|--------|
+| a    | 1      |
+
+```python
+x = 1 < 2
+print(x)
+```
+"""
+
+def read_docx(data: bytes):
+    return Document(io.BytesIO(data))
+
+def test_headings_and_inline_formatting():
+    document = read_docx(markdown_to_docx(MARKDOWN))
+    paragraphs = document.paragraphs
+
+    assert (paragraphs[0].style.name, paragraphs[0].text) == ("Heading 1", "Relazione")
+    assert any(p.style.name == "Heading 2" and p.text == "Elenco" for p in paragraphs)
+
+    body = paragraphs[1]
+    assert body.text == "Testo con grassetto, corsivo e codice."
+    runs = {run.text: run for run in body.runs}
+    assert runs["grassetto"].bold and runs["corsivo"].italic
+    assert runs["codice"].font.name == CODE_FONT
+
+def test_lists_keep_type_and_nesting():
+    styles = {p.text: p.style.name for p in read_docx(markdown_to_docx(MARKDOWN)).paragraphs}
+
+    assert styles["primo"] == "List Bullet"
+    assert styles["annidato"] == "List Bullet 2"
+    assert styles["uno"] == "List Number"
+
+def test_table_and_code_block():
+    document = read_docx(markdown_to_docx(MARKDOWN))
+
+    [table] = document.tables
+    assert [[cell.text for cell in row.cells] for row in table.rows] == [["Nome", "Valore"], ["a", "1"]]
+    assert table.cell(0, 0).paragraphs[0].runs[0].bold
+
+    code = next(p for p in document.paragraphs if p.text.startswith("x = 1"))
+    assert code.text == "x = 1 < 2\nprint(x)"
+    assert all(run.font.name == CODE_FONT for run in code.runs)
@@ -0,0 +1,45 @@
+import asyncio
+from src.nodes import executor_node, next_batch_size
+from src.workspace import Workspace, current_workspace
+
+DOCUMENT = """# Report
+
+## Introduzione
+
+Testo introduttivo.
+
+## Conclusioni
+
+Testo finale.
+"""
+
+def parallel_plan():
+    return [
+        {"tool_name": "show_section", "args": {"section_title": "Introduzione"}},
+        {"tool_name": "show_section", "args": {"section_title": "Conclusioni"}},
+        {"tool_name": "list_documents", "args": {}},
+    ]
+
+def test_independent_steps_run_together_in_plan_order():
+    plan = parallel_plan()
+    assert next_batch_size(plan) == 3
+
+    update = executor_node({"plan": plan, "document_content": DOCUMENT})
+
+    (_, first), (_, second), (_, documents) = update["past_steps"]
+    assert "Testo introduttivo." in first and "Testo finale." in second
+    assert update["plan"] == []
+
+def test_parallel_steps_run_inside_a_running_event_loop():
+    workspace = Workspace()
+    workspace.open("report.md", DOCUMENT)
+
+    async def scenario():
+        # Come con app.ainvoke: il nodo viene eseguito mentre un event loop è già attivo
+        current_workspace.set(workspace)
+        return executor_node({"plan": parallel_plan(), "document_content": DOCUMENT})
+
+    update = asyncio.run(scenario())
+
+    assert len(update["past_steps"]) == 3
+    assert "report.md" in update["past_steps"][2][1]
@@ -0,0 +1,46 @@
+from src import convert
+from src.convert import ExportCache
+
+def counting_render(calls):
+    def render(markdown_content, format_type):
+        calls.append((markdown_content, format_type))
+        return markdown_content.encode("utf-8")
+    return render
+
+def test_same_content_is_rendered_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(convert, "render_export", counting_render(calls))
+    cache = ExportCache(max_entries=4, max_mb=1)
+
+    assert cache.export("# Uno", "HTML") == b"# Uno"
+    assert cache.export("# Uno", "HTML") == b"# Uno"
+    cache.export("# Uno", "MD")
+
+    assert calls == [("# Uno", "HTML"), ("# Uno", "MD")]
+    assert (cache.hits, cache.misses) == (1, 2)
+
+def test_least_recently_used_entry_is_evicted(monkeypatch):
+    monkeypatch.setattr(convert, "render_export", counting_render([]))
+    cache = ExportCache(max_entries=2, max_mb=1)
+
+    cache.export("# Uno", "MD")
+    cache.export("# Due", "MD")
+    cache.get("# Uno", "MD")
+    cache.export("# Tre", "MD")
+
+    assert cache.get("# Uno", "MD") is not None
+    assert cache.get("# Due", "MD") is None
+    assert cache.get("# Tre", "MD") is not None
+
+def test_memory_limit_keeps_the_newest_export(monkeypatch):
+    monkeypatch.setattr(convert, "render_export", counting_render([]))
+    cache = ExportCache(max_entries=10, max_mb=1 / 1024)
+    small, large = "a" * 600, "b" * 2000
+
+    cache.export(small, "MD")
+    cache.export(small + "c", "MD")
+    assert cache.get(small, "MD") is None
+
+    assert cache.export(large, "MD") == large.encode("utf-8")
+    assert cache.get(large, "MD") is not None
+    assert cache.get(small + "c", "MD") is None
@@ -0,0 +1,32 @@
+from benchmarks.offline_graph import make_document, run_command
+from src.report_manager import ReportManager
+
+COMMAND = "aggiungi alla Sezione 1 una frase sui tempi di risposta"
+PLAN = [{"tool_name": "modify_document", "args": {"command": COMMAND}}]
+
+def test_local_intent_makes_no_llm_call(fake_model):
+    result = run_command(fake_model, make_document(5), "elenca le sezioni", warm_cache=False)
+    assert result["llm_calls"] == 0
+
+def test_planned_command_is_deterministic(fake_model):
+    fake_model.plans = {COMMAND: PLAN}
+    document = make_document(5)
+
+    first = run_command(fake_model, document, COMMAND, warm_cache=False)
+    second = run_command(fake_model, document, COMMAND, warm_cache=False)
+
+    assert first["agents"] == second["agents"]
+    assert first["tokens_in"] == second["tokens_in"] and first["tokens_out"] == second["tokens_out"]
+    assert first["agents"]["Planner"] == 1
+    assert first["agents"]["PatchAgent"] == 1
+
+def test_agents_are_recognized_while_streaming(fake_model):
+    fake_model.plans = {COMMAND: PLAN}
+    manager = ReportManager()
+    manager.current_state["document_content"] = make_document(5)
+
+    events = list(manager.stream(COMMAND))
+
+    assert "Sconosciuto" not in fake_model.stats()
+    assert "ModifierAgent" not in fake_model.stats()
+    assert "Paragrafo aggiunto: " in events[-1]["document"]
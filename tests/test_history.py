@@ -0,0 +1,27 @@
+from src.history import empty_history, record_edit
+from src.nodes import executor_node, next_batch_size, active_document_name
+
+def test_history_steps_are_never_batched():
+    undo = {"tool_name": "undo", "args": {}}
+    read = {"tool_name": "list_sections", "args": {}}
+    assert next_batch_size([undo, undo, undo]) == 1
+    assert next_batch_size([read, undo]) == 1
+
+def test_three_undos_revert_three_edits():
+    versions = ["Uno\n", "Uno\nDue\n", "Uno\nDue\nTre\n", "Uno\nDue\nTre\nQuattro\n"]
+    history = empty_history()
+    for old, new in zip(versions, versions[1:]):
+        history = record_edit(history, old, new)
+
+    state = {
+        "plan": [{"tool_name": "undo", "args": {}} for _ in range(3)],
+        "document_content": versions[-1],
+        "history": {active_document_name(): history},
+        "past_steps": []
+    }
+    while state["plan"]:
+        update = executor_node(state)
+        state = {**state, **update, "past_steps": state["past_steps"] + update["past_steps"]}
+
+    assert state["document_content"] == versions[0]
+    assert len(state["past_steps"]) == 3
@@ -0,0 +1,18 @@
+from src.intents import match_intent, normalize_input, PlanCache
+
+def test_commands_on_several_sections_are_left_to_the_planner():
+    assert match_intent("mostrami la Sezione 1 e la Sezione 2") is None
+    assert match_intent("elimina la sezione Note e la sezione Appendice") is None
+    assert match_intent("elimina il capitolo Note e il capitolo Appendice") is None
+    assert match_intent("mostrami la sezione Note e riferimenti") == [
+        {"tool_name": "show_section", "args": {"section_title": "Note e riferimenti"}}
+    ]
+
+def test_plan_cache_keeps_case():
+    assert normalize_input("  salva   come Report.md ") == "salva come Report.md"
+
+    cache = PlanCache()
+    plan = [{"tool_name": "save_file", "args": {"filename": "Report.md"}}]
+    cache.put("salva come Report.md", plan)
+    assert cache.get("salva come report.md") is None
+    assert cache.get("salva  come Report.md") == plan
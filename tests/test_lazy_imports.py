@@ -0,0 +1,30 @@
+import os
+import sys
+import subprocess
+from src import agents
+
+project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def imported_modules(code: str) -> set[str]:
+    """
+    Esegue `code` in un nuovo interprete e restituisce i moduli caricati al termine.
+    """
+    script = f"{code}\nimport sys\nprint('\\n'.join(sys.modules))"
+    result = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True, cwd=project_root)
+    return set(result.stdout.split())
+
+def test_importing_the_app_modules_does_not_load_heavy_dependencies():
+    modules = imported_modules("import src.report_manager, src.convert, src.transcribe")
+    for heavy in ["transformers", "torch", "xhtml2pdf", "pdf2docx", "scipy.signal", "langchain_mistralai"]:
+        assert heavy not in modules
+
+def test_agents_are_created_once_on_first_use(fake_model, monkeypatch):
+    created = []
+    factory = agents.AGENT_FACTORIES["explainer"]
+    monkeypatch.setitem(agents.AGENT_FACTORIES, "explainer", lambda model: created.append(model) or factory(model=model))
+
+    first = agents.get_agent("explainer")
+    second = agents.get_agent("explainer")
+
+    assert first is second
+    assert created == [fake_model]
@@ -0,0 +1,20 @@
+import re
+from src.metrics import Metrics
+
+# Una riga di campione del formato testuale di Prometheus, con valori delle etichette tra virgolette ed escape
+SAMPLE_LINE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\[\\"n]|[^\\"\n])*",?)*\})? \S+$')
+
+def test_prometheus_export_escapes_label_values():
+    metrics = Metrics()
+    metrics.increment("tool_failures_total", tool="open_file", reason='file "report.md"\nnon trovato in C:\\dati')
+    metrics.observe("tool_seconds", 0.5, tool="open_file")
+    metrics.observe("tool_seconds", 1.5, tool="open_file")
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert 'tool_failures_total{reason="file \\"report.md\\"\\nnon trovato in C:\\\\dati",tool="open_file"} 1' in lines
+    assert 'tool_seconds_count{tool="open_file"} 2' in lines
+    assert 'tool_seconds_sum{tool="open_file"} 2.000000' in lines
+    assert 'tool_seconds_max{tool="open_file"} 1.500000' in lines
+    for line in lines:
+        assert line.startswith("# TYPE ") or SAMPLE_LINE.match(line), line
@@ -0,0 +1,57 @@
+import pytest
+from src import tools
+from src.tools import parse_ingestion, insert_organized_block
+
+DOCUMENT = """# Relazione
+
+## Metodi
+
+Descrizione dei metodi.
+
+## Risultati
+
+Tabella dei risultati.
+"""
+
+def test_parse_ingestion_accepts_fenced_json():
+    output = '```json\n{"heading": "## Metodi", "content": "# Campione\\n\\nDieci persone."}\n```'
+    assert parse_ingestion(output) == ("Metodi", "# Campione\n\nDieci persone.")
+
+@pytest.mark.parametrize("output", ["non è json", '["lista"]', '{"heading": "Metodi"}', '{"heading": "", "content": "  "}'])
+def test_parse_ingestion_rejects_invalid_output(output):
+    with pytest.raises(ValueError):
+        parse_ingestion(output)
+
+def test_block_goes_under_the_section_with_shifted_headings():
+    new_document = insert_organized_block(DOCUMENT, "Metodi", "# Campione\n\nDieci persone.")
+
+    assert "Descrizione dei metodi.\n\n### Campione\n\nDieci persone.\n\n## Risultati" in new_document
+
+def test_unknown_heading_goes_under_the_main_title():
+    new_document = insert_organized_block(DOCUMENT, "Inesistente", "# Note\n\nUna nota.")
+
+    assert new_document.rstrip("\n").endswith("## Note\n\nUna nota.")
+
+def test_invalid_ingestion_output_falls_back_to_serial(monkeypatch):
+    calls = []
+    def fake_agent(name, content):
+        calls.append(name)
+        return "non è json" if name == "ingestion" else DOCUMENT + "\nTesto aggiunto.\n"
+    monkeypatch.setattr(tools, "invoke_cached_agent", fake_agent)
+
+    new_document = tools.organize_text.invoke({"current_document": DOCUMENT, "text_to_add": "testo aggiunto"})
+
+    assert calls == ["ingestion", "cleaning", "organizer", "modifier"]
+    assert new_document.endswith("Testo aggiunto.\n")
+
+def test_fused_mode_makes_a_single_call(monkeypatch):
+    calls = []
+    def fake_agent(name, content):
+        calls.append(name)
+        return '{"heading": "Risultati", "content": "Nuovo risultato."}'
+    monkeypatch.setattr(tools, "invoke_cached_agent", fake_agent)
+
+    new_document = tools.organize_text.invoke({"current_document": DOCUMENT, "text_to_add": "nuovo risultato"})
+
+    assert calls == ["ingestion"]
+    assert new_document.rstrip("\n").endswith("Tabella dei risultati.\n\nNuovo risultato.")
@@ -0,0 +1,70 @@
+import json
+import pytest
+from src import tools
+from src.patches import PatchError, apply_patch, parse_patch
+
+DOCUMENT = """# Report
+
+## Introduzione
+
+Testo introduttivo.
+
+## Conclusioni
+
+Testo finale.
+"""
+
+def test_operations_are_applied_in_order():
+    operations = parse_patch("""```json
+    [
+        {"op": "replace_text", "old": "Testo introduttivo.", "new": "Nuova introduzione."},
+        {"op": "insert_after", "heading": "## Introduzione", "content": "## Metodo\\n\\nDescrizione."},
+        {"op": "delete_section", "heading": "Conclusioni"}
+    ]
+    ```""")
+    assert apply_patch(DOCUMENT, operations) == "# Report\n\n## Introduzione\n\nNuova introduzione.\n\n## Metodo\n\nDescrizione.\n"
+
+@pytest.mark.parametrize("llm_output", [
+    "non è json",
+    "{}",
+    "[]",
+    '[{"op": "replace_section", "heading": "Introduzione"}]',
+    '[{"op": "riscrivi"}]',
+])
+def test_invalid_patches_are_rejected(llm_output):
+    with pytest.raises(PatchError):
+        parse_patch(llm_output)
+
+def test_ambiguous_or_missing_anchors_are_rejected():
+    with pytest.raises(PatchError):
+        apply_patch(DOCUMENT, [{"op": "replace_text", "old": "Testo", "new": "X"}])
+    with pytest.raises(PatchError):
+        apply_patch(DOCUMENT, [{"op": "delete_section", "heading": "Metodo"}])
+
+def test_replace_document_is_rejected_on_a_section():
+    operation = {"op": "replace_document", "content": "# Altro"}
+    assert apply_patch(DOCUMENT, [operation]) == "# Altro\n"
+    with pytest.raises(PatchError):
+        apply_patch(DOCUMENT, [operation], scoped=True)
+
+@pytest.mark.parametrize("llm_output, outline", [
+    ("[]", None),
+    (json.dumps([{"op": "replace_document", "content": "# Altro"}]), "- Introduzione"),
+])
+def test_unusable_patches_fall_back_to_a_full_rewrite(monkeypatch, llm_output, outline):
+    rewrites = []
+    monkeypatch.setattr(tools, "invoke_agent", lambda agent, text: llm_output)
+    monkeypatch.setattr(tools, "regenerate", lambda command, document, outline: rewrites.append(command) or "riscritto")
+    fallbacks = tools.patch_stats["fallback"]
+
+    assert tools.patch("aggiungi una sezione", DOCUMENT, outline) == "riscritto"
+    assert rewrites == ["aggiungi una sezione"]
+    assert tools.patch_stats["fallback"] == fallbacks + 1
+
+def test_valid_patch_is_applied_and_counted(monkeypatch):
+    llm_output = json.dumps([{"op": "replace_text", "old": "Testo finale.", "new": "Fine."}])
+    monkeypatch.setattr(tools, "invoke_agent", lambda agent, text: llm_output)
+    patches = tools.patch_stats["patch"]
+
+    assert tools.patch("accorcia la conclusione", DOCUMENT, None) == DOCUMENT.replace("Testo finale.", "Fine.")
+    assert tools.patch_stats["patch"] == patches + 1
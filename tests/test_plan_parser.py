@@ -0,0 +1,34 @@
+from src.plan_parser import IncrementalPlanParser
+from src.nodes import can_prefetch
+
+PLAN = """```json
+[
+    {"tool_name": "retrieve_document", "args": {"query": "mostrami la sezione \\"Costi {2024}\\""}},
+    {"tool_name": "save_file", "args": {"filename": "report.md"}}
+]
+```"""
+
+def test_steps_are_returned_as_soon_as_they_are_closed():
+    parser = IncrementalPlanParser()
+    emitted = []
+    for position, char in enumerate(PLAN):
+        for step in parser.feed(char):
+            emitted.append((position, step))
+
+    assert [step["tool_name"] for _, step in emitted] == ["retrieve_document", "save_file"]
+    assert emitted[0][1]["args"]["query"] == 'mostrami la sezione "Costi {2024}"'
+    # Il primo passo è disponibile prima che il secondo inizi
+    assert emitted[0][0] < PLAN.index('{"tool_name": "save_file"')
+    assert parser.finished
+
+def test_invalid_steps_and_text_after_the_plan_are_ignored():
+    parser = IncrementalPlanParser()
+    steps = parser.feed('Ecco il piano: [{"tool_name": }, {"tool_name": "list_sections", "args": {}}')
+    steps += parser.feed('] [{"tool_name": "undo"}]')
+    assert steps == [{"tool_name": "list_sections", "args": {}}]
+
+def test_only_steps_without_side_effects_are_prefetched():
+    assert can_prefetch({"tool_name": "retrieve_document", "args": {}})
+    assert not can_prefetch({"tool_name": "save_file", "args": {}})
+    assert not can_prefetch({"tool_name": "tool_inesistente"})
+    assert not can_prefetch({"tool_name": "list_sections", "depends_on": [1]})
@@ -0,0 +1,97 @@
+import httpx
+import pytest
+from src import rate_limit
+from src.rate_limit import TokenBucket, RetryPolicy, call_with_rate_limit, stream_with_rate_limit, parse_rate_limits, parse_retry_after
+
+def http_error(status: int, retry_after: str | None = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "https://api.mistral.ai/v1/chat/completions")
+    headers = {"Retry-After": retry_after} if retry_after else {}
+    return httpx.HTTPStatusError("errore", request=request, response=httpx.Response(status, headers=headers, request=request))
+
+def fake_clock(monkeypatch) -> list:
+    """
+    Sostituisce orologio e attese del rate limiter: ogni attesa viene registrata e fa avanzare l'orologio.
+    """
+    clock, sleeps = [0.0], []
+    def sleep(seconds):
+        sleeps.append(seconds)
+        clock[0] += seconds
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(rate_limit.time, "sleep", sleep)
+    return sleeps
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = fake_clock(monkeypatch)
+    monkeypatch.setattr(rate_limit, "retry_policy", RetryPolicy(max_retries=2, base_delay=1.0))
+    monkeypatch.setattr(rate_limit, "_buckets", {"test": TokenBucket(1000.0, 100)})
+    return sleeps
+
+def failing(errors, result="ok"):
+    calls = []
+    def function():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return result
+    return function, calls
+
+def test_429_is_retried_after_retry_after_and_slows_the_bucket(sleeps):
+    function, calls = failing([http_error(429, "2")])
+
+    assert call_with_rate_limit(function, model_name="test") == "ok"
+
+    assert len(calls) == 2
+    assert 2.0 in sleeps
+    assert rate_limit._buckets["test"].rate < 1000.0
+
+def test_server_errors_use_exponential_backoff_with_jitter(sleeps):
+    function, calls = failing([http_error(503), http_error(503)])
+
+    assert call_with_rate_limit(function, model_name="test") == "ok"
+
+    assert len(calls) == 3
+    assert 0 <= sleeps[0] <= 1.0 and 0 <= sleeps[1] <= 2.0
+
+def test_client_errors_and_exhausted_retries_are_raised(sleeps):
+    function, calls = failing([http_error(400)])
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_rate_limit(function, model_name="test")
+    assert len(calls) == 1 and not sleeps
+
+    function, calls = failing([http_error(429)] * 3)
+    with pytest.raises(httpx.HTTPStatusError):
+        call_with_rate_limit(function, model_name="test")
+    assert len(calls) == 3
+
+def test_streams_are_retried_only_before_the_first_chunk(sleeps):
+    attempts = []
+    def stream():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise http_error(429, "1")
+        yield "a"
+        yield "b"
+    assert list(stream_with_rate_limit(stream, model_name="test")) == ["a", "b"]
+    assert len(attempts) == 2
+
+    def broken_stream():
+        yield "a"
+        raise http_error(503)
+    with pytest.raises(httpx.HTTPStatusError):
+        list(stream_with_rate_limit(broken_stream, model_name="test"))
+
+def test_bucket_allows_a_burst_then_waits(monkeypatch):
+    sleeps = fake_clock(monkeypatch)
+
+    bucket = TokenBucket(rate=2.0, capacity=3)
+    for _ in range(4):
+        bucket.acquire()
+
+    assert sleeps == [pytest.approx(0.5)]
+
+def test_configuration_parsing():
+    assert parse_rate_limits("a=2:10, b=0.5,rotto=x:1") == {"a": (2.0, 10), "b": (0.5, 1)}
+    assert parse_retry_after("3") == 3.0
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    assert parse_retry_after("non valido") is None
@@ -0,0 +1,32 @@
+from src.retrieval import answer_structural_query, STRUCTURAL_PATH
+from src.tools import retrieve_document, show_section
+from src.nodes import apply_step_results
+
+DOCUMENT = """# Report
+
+## Capitolo 1
+
+Primo.
+
+## Capitolo 2
+
+Secondo.
+"""
+
+def test_show_missing_numbered_section_reports_not_found():
+    answer = answer_structural_query("mostrami la sezione Capitolo 7", DOCUMENT)
+    assert answer.startswith("Non ho trovato la sezione 'capitolo 7'")
+    assert "Primo" not in answer
+
+    answer = show_section.invoke({"section_title": "Capitolo 7", "current_document": DOCUMENT})
+    assert answer.startswith("Non ho trovato la sezione 'Capitolo 7'")
+
+def test_retrieval_path_is_reported_in_the_executed_step():
+    answer = retrieve_document.invoke({"query": "mostrami la sezione Capitolo 2", "current_document": DOCUMENT})
+    assert answer.path == STRUCTURAL_PATH
+
+    step = {"tool_name": "retrieve_document", "args": {"query": "mostrami la sezione Capitolo 2"}}
+    update = apply_step_results({"document_content": DOCUMENT}, [step], [answer], [])
+    (executed, result), = update["past_steps"]
+    assert executed["path"] == STRUCTURAL_PATH
+    assert type(result) is str and "Secondo" in result
@@ -0,0 +1,51 @@
+from src import tools
+
+DOCUMENT = """# Relazione
+
+## Introduzione
+
+Testo introduttivo.
+
+## Metodi
+
+Descrizione dei metodi.
+
+## Risultati
+
+Tabella dei risultati.
+"""
+
+def recording_edit(calls):
+    def edit(command, text, outline):
+        calls.append((text, outline))
+        return text.replace("Descrizione dei metodi.", "Metodi rivisti.")
+    return edit
+
+def test_scope_command_finds_cited_section():
+    start, end = tools.scope_command("riscrivi la sezione Metodi", DOCUMENT)
+    assert DOCUMENT[start:end].strip() == "## Metodi\n\nDescrizione dei metodi."
+
+def test_scope_command_on_whole_document():
+    assert tools.scope_command("riscrivi tutto il documento sui Metodi", DOCUMENT) is None
+    assert tools.scope_command("aggiungi una conclusione", DOCUMENT) is None
+
+def test_modify_document_sends_only_the_section(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", recording_edit(calls))
+
+    new_document = tools.modify_document.invoke({"command": "riscrivi la sezione Metodi", "current_document": DOCUMENT})
+
+    [(text, outline)] = calls
+    assert "Introduzione" not in text and "Risultati" not in text
+    assert "Metodi" in outline and "Risultati" in outline
+    assert new_document == DOCUMENT.replace("Descrizione dei metodi.", "Metodi rivisti.")
+
+def test_modify_document_without_scope_sends_whole_document(monkeypatch):
+    calls = []
+    monkeypatch.setattr(tools, "clean_text", lambda command: command)
+    monkeypatch.setattr(tools, "patch", recording_edit(calls))
+
+    tools.modify_document.invoke({"command": "aggiungi una conclusione", "current_document": DOCUMENT})
+
+    assert calls == [(DOCUMENT, None)]
@@ -0,0 +1,42 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import copy_context
+from src.section_index import SectionIndex
+from src.tools import relevant_excerpt
+from src.workspace import Workspace, current_workspace
+
+def document(topic: str, padding: int) -> str:
+    sections = [f"## Premessa\n\n{'Testo introduttivo. ' * padding}"]
+    sections += [f"## Capitolo {i}\n\nQuesto capitolo parla di {topic} numero {i}." for i in range(1, 6)]
+    return "# Report\n\n" + "\n\n".join(sections) + "\n"
+
+def excerpt_in(workspace: Workspace, query: str, text: str) -> str:
+    token = current_workspace.set(workspace)
+    try:
+        return relevant_excerpt(query, text)
+    finally:
+        current_workspace.reset(token)
+
+def test_sessions_with_the_same_document_name_use_separate_indexes():
+    first, second = Workspace(), Workspace()
+    first.open("report.md", "")
+    second.open("report.md", "")
+    first_document, second_document = document("mele", 5), document("pere", 200)
+
+    def search(workspace, text, topic):
+        return copy_context().run(excerpt_in, workspace, f"cosa dice sulle {topic}?", text)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        futures = [pool.submit(search, first, first_document, "mele") if i % 2 else pool.submit(search, second, second_document, "pere")
+                   for i in range(40)]
+        excerpts = [f.result() for f in futures]
+
+    for i, excerpt in enumerate(excerpts):
+        topic = "mele" if i % 2 else "pere"
+        assert f"Questo capitolo parla di {topic} numero 1." in excerpt
+
+def test_search_results_keep_their_offsets_after_an_update():
+    index = SectionIndex()
+    short, long = document("mele", 1), document("mele", 50)
+    _, hits = index.update_and_search(short, "mele numero 3")
+    index.update(long)
+    assert hits and all(short[h.start:h.end].startswith("## ") for h in hits)
@@ -0,0 +1,59 @@
+import pytest
+from src.sections import build_section_index, find_section, relocate_section
+from src.patches import PatchError, apply_patch
+from src.tools import delete_section, rename_section, move_section
+
+NUMBERED_DOCUMENT = """# Report
+
+## Capitolo 1
+
+Primo.
+
+## Capitolo 2
+
+Secondo.
+
+## Capitolo 3
+
+Terzo.
+"""
+
+def test_find_section_does_not_match_a_different_number():
+    sections = build_section_index(NUMBERED_DOCUMENT)
+    assert find_section(sections, "Capitolo 4") is None
+    assert find_section(sections, "capitolo 2").title == "Capitolo 2"
+
+def test_find_section_accepts_a_unique_typo():
+    sections = build_section_index("# Introduzione\n\nTesto.\n\n# Metodologia\n\nTesto.\n")
+    assert find_section(sections, "Introduzone").title == "Introduzione"
+    assert find_section(sections, "Introduzone", fuzzy=False) is None
+
+def test_find_section_rejects_ambiguous_fuzzy_matches():
+    sections = build_section_index("# Risultati A\n\nx\n\n# Risultati B\n\ny\n")
+    assert find_section(sections, "Risultati C") is None
+
+def test_mutating_tools_refuse_a_missing_numbered_section():
+    for tool, args in [
+        (delete_section, {"section_title": "Capitolo 4"}),
+        (rename_section, {"section_title": "Capitolo 4", "new_title": "Nuovo"}),
+        (move_section, {"section_title": "Capitolo 4", "target_title": "Capitolo 1"}),
+    ]:
+        with pytest.raises(ValueError, match="Capitolo 4.*Capitolo 1, Capitolo 2, Capitolo 3"):
+            tool.invoke({**args, "current_document": NUMBERED_DOCUMENT})
+
+def test_delete_section_requires_an_exact_title():
+    with pytest.raises(ValueError):
+        delete_section.invoke({"section_title": "Capitol 2", "current_document": NUMBERED_DOCUMENT})
+    document = delete_section.invoke({"section_title": "capitolo 2", "current_document": NUMBERED_DOCUMENT})
+    assert "Secondo" not in document and "Primo" in document and "Terzo" in document
+
+def test_relocate_section_target_must_match_exactly():
+    section = find_section(build_section_index(NUMBERED_DOCUMENT), "Capitolo 3")
+    with pytest.raises(ValueError, match="Capitolo 5"):
+        relocate_section(NUMBERED_DOCUMENT, section, "Capitolo 5", "before")
+
+def test_patch_anchor_must_match_exactly():
+    with pytest.raises(PatchError):
+        apply_patch(NUMBERED_DOCUMENT, [{"op": "delete_section", "heading": "## Capitolo 4"}])
+    document = apply_patch(NUMBERED_DOCUMENT, [{"op": "delete_section", "heading": "## Capitolo 3"}])
+    assert "Terzo" not in document and "Secondo" in document
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+from src.server import WorkerPool, Overloaded, create_app
+
+def test_requests_waiting_for_their_session_do_not_hold_pool_slots():
+    async def scenario():
+        pool = WorkerPool("llm", workers=2, max_queue=8, tenant_limit=8, queue_timeout_s=1)
+        first_session, second_session = asyncio.Lock(), asyncio.Lock()
+        release = asyncio.Event()
+        order = []
+
+        async def request(name, lock):
+            async with pool.admit("tenant", lock):
+                order.append(name)
+                await release.wait()
+
+        first = asyncio.create_task(request("a1", first_session))
+        await asyncio.sleep(0.01)
+        queued = asyncio.create_task(request("a2", first_session))
+        await asyncio.sleep(0.01)
+        assert pool.waiting == 1
+
+        # Il secondo posto del pool resta libero per un'altra sessione
+        other = asyncio.create_task(request("b1", second_session))
+        await asyncio.sleep(0.01)
+        assert order == ["a1", "b1"]
+
+        release.set()
+        await asyncio.gather(first, queued, other)
+        assert order == ["a1", "b1", "a2"]
+        assert pool.waiting == 0 and not pool.tenants
+
+    asyncio.run(scenario())
+
+def test_session_waiters_count_towards_the_queue():
+    async def scenario():
+        pool = WorkerPool("llm", workers=4, max_queue=1, tenant_limit=8, queue_timeout_s=1)
+        lock = asyncio.Lock()
+        await lock.acquire()
+        waiting = asyncio.create_task(pool.admit("tenant", lock).__aenter__())
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as error:
+            async with pool.admit("tenant", lock):
+                pass
+        assert error.value.status == 503
+        waiting.cancel()
+
+    asyncio.run(scenario())
+
+def post(path, **kwargs):
+    async def scenario():
+        async with TestClient(TestServer(create_app())) as client:
+            response = await client.post(path, **kwargs)
+            return response.status, await response.text()
+    return asyncio.run(scenario())
+
+def test_json_bodies_that_are_not_objects_are_rejected():
+    for path in ("/export", "/sessions/prova/run", "/sessions/prova/stream", "/sessions/prova/export"):
+        status, text = post(path, json=["non", "un", "oggetto"])
+        assert status == 400, (path, text)
+    assert post("/export", json={"markdown": "# Titolo", "format": 3})[0] == 400
+
+def test_large_uploads_are_accepted():
+    # Più del limite predefinito di aiohttp (1 MB): arriva alla trascrizione, che rifiuta l'audio non valido
+    status, text = post("/transcribe", data=b"\x01" * (3 * 2**20))
+    assert status == 400 and "formato audio" in text
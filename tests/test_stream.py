@@ -0,0 +1,33 @@
+from src.report_manager import ReportManager
+
+DOCUMENT = "# Relazione\n\n## Introduzione\n\nTesto introduttivo.\n"
+COMMAND = "aggiungi una frase sui tempi di risposta"
+PLAN = [{"tool_name": "modify_document", "args": {"command": COMMAND}}]
+
+def test_stream_yields_planner_tokens_steps_and_end(fake_model):
+    fake_model.plans = {COMMAND: PLAN}
+    manager = ReportManager()
+    manager.current_state["document_content"] = DOCUMENT
+
+    events = list(manager.stream(COMMAND))
+    types = [event["type"] for event in events]
+
+    assert types[0] == "token" and events[0]["agent"] == "Planner"
+    assert types.index("planner") < types.index("step") < types.index("end")
+    assert types[-1] == "end"
+    assert next(e for e in events if e["type"] == "planner")["plan"] == PLAN
+    assert {e["agent"] for e in events if e["type"] == "token"} >= {"Planner", "PatchAgent"}
+
+    end = events[-1]
+    assert end["document"] == manager.get_md_document()
+    assert end["document"].startswith(DOCUMENT.rstrip("\n"))
+
+def test_stream_without_llm_for_local_intents(fake_model):
+    manager = ReportManager()
+    manager.current_state["document_content"] = DOCUMENT
+
+    events = list(manager.stream("elenca le sezioni"))
+
+    assert all(event["type"] != "token" for event in events)
+    assert [e["type"] for e in events] == ["planner", "step", "end"]
+    assert "Introduzione" in events[-1]["answer"]
@@ -0,0 +1,67 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import soundfile as sf
+from src import transcribe
+from src.transcribe import convert_to_whisper_format, WhisperRegistry, WHISPER_SAMPLING_RATE
+
+def test_wav_is_converted_in_memory(tmp_path, monkeypatch):
+    source, target = tmp_path / "voce.wav", tmp_path / "whisper.wav"
+    sf.write(source, np.zeros((44100, 2), dtype=np.float32), 44100)
+    monkeypatch.setattr(transcribe.subprocess, "run", None)  # ffmpeg non deve essere invocato
+
+    convert_to_whisper_format(str(source), str(target))
+
+    info = sf.info(target)
+    assert (info.samplerate, info.channels, info.subtype) == (WHISPER_SAMPLING_RATE, 1, "PCM_16")
+
+def test_unsupported_formats_fall_back_to_ffmpeg(tmp_path, monkeypatch):
+    source, target = tmp_path / "voce.m4a", tmp_path / "whisper.wav"
+    source.write_bytes(b"ftypM4A non decodificabile da soundfile")
+    commands = []
+    monkeypatch.setattr(transcribe.subprocess, "run", lambda command, check: commands.append(command))
+
+    convert_to_whisper_format(str(source), str(target))
+
+    command, = commands
+    assert command[0] == "ffmpeg" and command[command.index("-i") + 1] == str(source)
+    assert command[command.index("-ar") + 1] == str(WHISPER_SAMPLING_RATE) and str(target) in command
+
+class FakeRegistry(WhisperRegistry):
+    """
+    Registro con un caricamento finto: il modello "lento" resta in caricamento finché `release` non viene impostato.
+    """
+    def __init__(self, memory_budget_mb: int = 2048):
+        super().__init__(memory_budget_mb)
+        self.loads = []
+        self.loading = threading.Event()
+        self.release = threading.Event()
+
+    def _load(self, whisper_model):
+        self.loads.append(whisper_model)
+        if whisper_model == "lento":
+            self.loading.set()
+            self.release.wait(5)
+        return f"pipeline-{whisper_model}", 100
+
+def test_loading_a_model_does_not_block_loaded_models():
+    registry = FakeRegistry()
+    assert registry.get("base") == "pipeline-base"
+
+    with ThreadPoolExecutor(max_workers=3) as pool:
+        slow = [pool.submit(registry.get, "lento") for _ in range(2)]
+        assert registry.loading.wait(5)
+        # Mentre "lento" viene caricato, il modello già in memoria resta disponibile
+        assert pool.submit(registry.get, "base").result(timeout=1) == "pipeline-base"
+        registry.release.set()
+        assert [future.result(timeout=5) for future in slow] == ["pipeline-lento"] * 2
+
+    assert registry.loads == ["base", "lento"]
+
+def test_least_recently_used_models_are_evicted_over_budget():
+    registry = FakeRegistry(memory_budget_mb=250)
+    registry.get("base")
+    registry.get("small")
+    registry.get("base")
+    registry.get("tiny")
+    assert registry.loaded_models() == ["base", "tiny"]
@@ -0,0 +1,66 @@
+import os
+from src.workspace import Workspace, UNTITLED_DOCUMENT
+
+KB = "x" * 1024
+
+def in_memory(workspace):
+    return {d["name"]: d["in_memory"] for d in workspace.describe()}
+
+def make_workspace(tmp_path):
+    # Budget di 2,5 KB: due documenti da 1 KB entrano in memoria, il terzo fa scaricare il meno recente
+    return Workspace(memory_budget_mb=2.5 / 1024, spill_dir=str(tmp_path))
+
+def test_least_recently_used_document_is_spilled_and_reloaded(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.open("a.md", "A" + KB)
+    workspace.open("b.md", "B" + KB)
+    workspace.open("c.md", "C" + KB)
+
+    assert in_memory(workspace) == {"a.md": False, "b.md": True, "c.md": True}
+    assert workspace.memory_used() <= workspace.memory_budget
+
+    assert workspace.get("a.md") == "A" + KB
+    assert in_memory(workspace)["a.md"] is True
+    assert in_memory(workspace)["b.md"] is False
+
+def test_active_document_is_never_spilled(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.open("attivo.md", "A" + KB)
+    workspace.put("b.md", "B" + KB)
+    workspace.put("c.md", "C" + KB)
+
+    assert in_memory(workspace)["attivo.md"] is True
+    assert in_memory(workspace)["b.md"] is False
+
+def test_inactive_documents_are_read_without_reloading(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.open("a.md", "A" + KB)
+    workspace.open("b.md", "B" + KB)
+    workspace.open("c.md", "C" + KB)
+
+    assert workspace.inactive_documents() == {"a.md": "A" + KB, "b.md": "B" + KB}
+    assert in_memory(workspace)["a.md"] is False
+
+def test_closing_a_spilled_document_removes_its_file(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.open("a.md", "A" + KB)
+    workspace.open("b.md", "B" + KB)
+    workspace.open("c.md", "C" + KB)
+    [spill_dir] = os.listdir(tmp_path)
+    assert len(os.listdir(tmp_path / spill_dir)) == 1
+
+    assert workspace.close("c.md") == "B" + KB
+    workspace.close("a.md")
+
+    assert os.listdir(tmp_path / spill_dir) == []
+    assert workspace.names() == ["b.md"] and workspace.active == "b.md"
+
+def test_empty_untitled_document_is_discarded_on_open(tmp_path):
+    workspace = make_workspace(tmp_path)
+    workspace.sync_active("")
+    workspace.open("a.md", "# A\n", current_content="")
+    assert UNTITLED_DOCUMENT not in workspace
+
+    workspace.switch("a.md", current_content="# A modificato\n")
+    workspace.open("b.md", "# B\n", current_content="# A modificato\n")
+    assert workspace.get("a.md") == "# A modificato\n"